@@ -124,14 +124,14 @@ def create_sample_deliveries():
                 ('delivered', 'Package successfully delivered'),
             ]
         
-        # Create status entries
+        # Create status entries (history only - the delivery already has its final status)
         for status_code, description in status_history:
-            DeliveryStatus.objects.create(
+            DeliveryStatus(
                 delivery=delivery_obj,
                 status=status_code,
                 description=description,
                 timestamp=datetime.now() - timedelta(days=len(status_history) - status_history.index((status_code, description)))
-            )
+            ).save(sync_delivery=False)
         
         deliveries_created += 1
         print(f"✅ Created delivery {i:2d}: {customer['name']} - {status.upper()}")
@@ -168,18 +168,16 @@ def create_deliveries():
             created_by=staff_user
         )
         
-        # Create status updates based on current status
+        # Create status updates based on current status (history only - the delivery already has its final status)
         for j in range(status_index + 1):
             status_info = status_data[j]
-            created_time = datetime.now() - timedelta(days=random.randint(0, 5), hours=random.randint(0, 23))
             
-            DeliveryStatus.objects.create(
+            DeliveryStatus(
                 delivery=delivery,
                 status=status_info['status'],
                 location=status_info['location'],
-                description=status_info['description'],
-                created_at=created_time
-            )
+                description=status_info['description']
+            ).save(sync_delivery=False)
         
         print(f"✅ Created delivery for {customer['name']} - Status: {current_status}")
         print(f"   Tracking Number: {delivery.tracking_number}")
@@ -49,6 +49,26 @@ app.conf.update(
             'task': 'investments.tasks.update_investment_item_prices',
             'schedule': 120.0,  # Every 2 minutes
         },
+        'update-price-statistics': {
+            'task': 'investments.tasks.update_price_statistics',
+            'schedule': 3600.0,  # Every hour
+        },
+        'rollup-price-candles': {
+            'task': 'investments.tasks.rollup_price_candles',
+            'schedule': 60.0,  # Every 60 seconds
+        },
+        'flush-dirty-portfolios': {
+            'task': 'investments.tasks.flush_dirty_portfolios',
+            'schedule': 10.0,  # Every 10 seconds
+        },
+        'process-gps-fixes': {
+            'task': 'tracking.tasks.process_gps_fixes',
+            'schedule': 5.0,  # Every 5 seconds
+        },
+        'reconcile-delivery-status-counters': {
+            'task': 'tracking.tasks.reconcile_status_counters',
+            'schedule': 3600.0,  # Every hour
+        },
     },
 )
 
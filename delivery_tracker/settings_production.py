@@ -108,6 +108,21 @@ else:
         },
     }
 
+# Cache (shared live price snapshots) - Redis when available, per-process memory otherwise
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Celery Configuration
 CELERY_BROKER_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
@@ -127,6 +142,26 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'investments.tasks.update_investment_item_prices',
         'schedule': 120.0,  # Every 2 minutes
     },
+    'update-price-statistics': {
+        'task': 'investments.tasks.update_price_statistics',
+        'schedule': 3600.0,  # Every hour
+    },
+    'rollup-price-candles': {
+        'task': 'investments.tasks.rollup_price_candles',
+        'schedule': 60.0,  # Every 60 seconds
+    },
+    'flush-dirty-portfolios': {
+        'task': 'investments.tasks.flush_dirty_portfolios',
+        'schedule': 10.0,  # Every 10 seconds
+    },
+    'process-gps-fixes': {
+        'task': 'tracking.tasks.process_gps_fixes',
+        'schedule': 5.0,  # Every 5 seconds
+    },
+    'reconcile-delivery-status-counters': {
+        'task': 'tracking.tasks.reconcile_status_counters',
+        'schedule': 3600.0,  # Every hour
+    },
 }
 
 # Database
@@ -242,6 +277,31 @@ SESSION_COOKIE_SAMESITE = 'Lax'
 TRACKING_LINK_EXPIRY_DAYS = 30
 TRACKING_LINK_SECRET_LENGTH = 32
 
+# Tracking numbers - key of the tracking number permutation (defaults to one derived from SECRET_KEY;
+# never change it once numbers have been issued) and how many numbers a process reserves at a time
+TRACKING_ID_KEY = config('TRACKING_ID_KEY', default='')
+TRACKING_ID_BLOCK_SIZE = config('TRACKING_ID_BLOCK_SIZE', default=100, cast=int)
+
+# GPS ingestion - fixes are queued and persisted in batches every GPS_INGEST_INTERVAL seconds
+GPS_INGEST_INTERVAL = config('GPS_INGEST_INTERVAL', default=2, cast=int)
+GPS_INGEST_BATCH_SIZE = config('GPS_INGEST_BATCH_SIZE', default=5000, cast=int)
+
+# Simplified route polylines are cached per delivery and zoom level for this many seconds
+ROUTE_GEOMETRY_CACHE_TIMEOUT = config('ROUTE_GEOMETRY_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Public tracking documents are cached per tracking number until the next status or location write, at most this many seconds
+TRACKING_DOCUMENT_CACHE_TIMEOUT = config('TRACKING_DOCUMENT_CACHE_TIMEOUT', default=300, cast=int)
+
+# Tracking number lookups - cached number -> secret mappings, negative entries for unknown numbers,
+# and how often each process rebuilds its Bloom filter of existing numbers (seconds)
+TRACKING_LOOKUP_CACHE_TIMEOUT = config('TRACKING_LOOKUP_CACHE_TIMEOUT', default=3600, cast=int)
+TRACKING_LOOKUP_NEGATIVE_TIMEOUT = config('TRACKING_LOOKUP_NEGATIVE_TIMEOUT', default=60, cast=int)
+TRACKING_LOOKUP_FILTER_REFRESH = config('TRACKING_LOOKUP_FILTER_REFRESH', default=900, cast=int)
+
+# ETA prediction - speed assumed before a delivery has moved, and road distance / great-circle distance
+ETA_DEFAULT_SPEED_KMH = config('ETA_DEFAULT_SPEED_KMH', default=30, cast=float)
+ETA_ROAD_FACTOR = config('ETA_ROAD_FACTOR', default=1.3, cast=float)
+
 # Authentication settings
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/'
@@ -250,6 +310,16 @@ LOGOUT_REDIRECT_URL = '/accounts/login/'
 # Investment System Settings
 SITE_URL = config('SITE_URL', default='https://meridian-asset-logistics.up.railway.app')
 
+# Live price feeds - deadline (seconds) for each upstream price provider
+PRICE_PROVIDER_TIMEOUT = config('PRICE_PROVIDER_TIMEOUT', default=10, cast=int)
+# Live price snapshot - how often (seconds) workers check the shared cache for a newer version
+PRICE_SNAPSHOT_CHECK_INTERVAL = config('PRICE_SNAPSHOT_CHECK_INTERVAL', default=1.0, cast=float)
+# Live price ticker - seconds between upstream refreshes, and whether ASGI workers stand for election
+PRICE_TICKER_INTERVAL = config('PRICE_TICKER_INTERVAL', default=60, cast=int)
+PRICE_TICKER_IN_ASGI = config('PRICE_TICKER_IN_ASGI', default=True, cast=bool)
+# Portfolios - seconds a dirty portfolio waits so bursts of writes coalesce into one recompute
+PORTFOLIO_RECOMPUTE_INTERVAL = config('PORTFOLIO_RECOMPUTE_INTERVAL', default=5, cast=int)
+
 # Google Maps API Key for live tracking
 GOOGLE_MAPS_API_KEY = config('GOOGLE_MAPS_API_KEY', default='')
 
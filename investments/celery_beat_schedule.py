@@ -43,6 +43,18 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'investments.tasks.update_investment_item_prices',
         'schedule': crontab(minute='*/2'),  # Every 2 minutes
     },
+    
+    # Roll raw price ticks into OHLCV candles every minute
+    'rollup-price-candles': {
+        'task': 'investments.tasks.rollup_price_candles',
+        'schedule': crontab(minute='*'),  # Every minute
+    },
+    
+    # Recompute portfolios marked dirty by writes
+    'flush-dirty-portfolios': {
+        'task': 'investments.tasks.flush_dirty_portfolios',
+        'schedule': 10.0,  # Every 10 seconds
+    },
 }
 
 # Timezone for Celery Beat
@@ -1,8 +1,10 @@
 import json
 import logging
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.apps import apps
+from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
@@ -111,6 +113,10 @@ class PriceFeedConsumer(AsyncWebsocketConsumer):
         """Handle WebSocket connection"""
         try:
             self.room_group_name = 'price_feeds'
+            # Last snapshot version this socket has seen; clients that subscribe with a
+            # sequence number get deltas, everyone else gets full snapshots
+            self.last_seq = None
+            self.delta_mode = False
             logger.info(f"WebSocket connection attempt from {self.scope.get('client', ['unknown'])[0]}")
             
             # Join room group
@@ -122,87 +128,22 @@ class PriceFeedConsumer(AsyncWebsocketConsumer):
             await self.accept()
             logger.info("WebSocket connection accepted successfully")
             
-            # FORCE UPDATE PRICES FROM APIs IMMEDIATELY
-            await self.force_update_prices_from_apis()
+            # Make sure this worker is a candidate for the singleton price ticker;
+            # the socket itself only ever subscribes
+            from .price_ticker import price_ticker
+            price_ticker.ensure_started()
             
-            # Send initial price data immediately
-            await self.send_price_data()
-            
-            # Start periodic updates every 30 seconds
-            await self.start_periodic_updates()
+            # Delta clients (?delta=1) say where they are with their first subscribe;
+            # legacy clients expect the full snapshot straight away
+            query = parse_qs(self.scope.get('query_string', b'').decode())
+            if query.get('delta') != ['1']:
+                await self.send_price_data()
             
         except Exception as e:
             logger.error(f"Error in WebSocket connect: {e}")
             if hasattr(self, 'channel_name'):
                 await self.close()
     
-    @database_sync_to_async
-    def force_update_prices_from_apis(self):
-        """Force update prices from APIs with graceful error handling"""
-        try:
-            logger.info("🔄 FORCING PRICE UPDATE FROM APIs...")
-            
-            # Try to import and use price service, but handle failures gracefully
-            try:
-                from investments.price_services import price_service
-                updated_count = price_service.update_all_prices()
-                logger.info(f"✅ Updated {updated_count} prices from APIs successfully")
-            except Exception as api_error:
-                logger.warning(f"API price update failed: {api_error}")
-                # Continue with existing data instead of failing completely
-                updated_count = 0
-            
-            # Log current major prices (even if API update failed)
-            major_cryptos = ['BTC', 'ETH', 'ADA', 'SOL']
-            logger.info("💰 Current prices in database:")
-            for symbol in major_cryptos:
-                try:
-                    from investments.models import RealTimePriceFeed
-                    feed = RealTimePriceFeed.objects.filter(symbol=symbol).first()
-                    if feed:
-                        logger.info(f"   {feed.name}: ${feed.current_price:,.2f} ({feed.price_change_percentage_24h:+.2f}%)")
-                except Exception as e:
-                    logger.warning(f"Could not log price for {symbol}: {e}")
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"❌ Price update process failed: {e}")
-            # Return True to continue with existing data rather than failing completely
-            return True
-    
-    async def start_periodic_updates(self):
-        """Start periodic price updates every 60 seconds to avoid rate limits"""
-        import asyncio
-        
-        async def periodic_update():
-            while True:
-                try:
-                    await asyncio.sleep(60)  # Wait 60 seconds (reduced from 30 to avoid rate limits)
-                    logger.info("🔄 Running periodic price update...")
-                    
-                    # Force update prices from APIs (with error handling)
-                    try:
-                        await self.force_update_prices_from_apis()
-                    except Exception as update_error:
-                        logger.warning(f"Periodic price update failed: {update_error}")
-                        # Continue to send existing data
-                    
-                    # Send updated price data (even if update failed)
-                    try:
-                        await self.send_price_data()
-                    except Exception as send_error:
-                        logger.warning(f"Failed to send price data: {send_error}")
-                    
-                except Exception as e:
-                    logger.error(f"Error in periodic update: {e}")
-                    # Don't break the loop, just continue
-                    await asyncio.sleep(60)  # Wait before retrying
-        
-        # Start the periodic update task
-        asyncio.create_task(periodic_update())
-        logger.info("✅ Periodic updates started (every 60 seconds)")
-    
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
         try:
@@ -222,15 +163,19 @@ class PriceFeedConsumer(AsyncWebsocketConsumer):
             text_data_json = json.loads(text_data)
             message_type = text_data_json.get('type', 'message')
             
-            if message_type == 'get_prices':
+            if message_type == 'subscribe':
+                # Delta protocol: resume from the client's last sequence number
+                self.delta_mode = True
+                last_seq = text_data_json.get('last_seq')
+                version, message = await self.get_catch_up_message(last_seq)
+                self.last_seq = version
+                if message:
+                    await self.send(text_data=message)
+                else:
+                    await self.send(text_data=json.dumps({'type': 'in_sync', 'seq': version}))
+            elif message_type in ('get_prices', 'force_update'):
+                # Served from the latest snapshot; only the price ticker talks to upstream APIs
                 logger.info("Client requested price data")
-                # Force update prices from APIs before sending
-                await self.force_update_prices_from_apis()
-                await self.send_price_data()
-            elif message_type == 'force_update':
-                logger.info("Client requested force price update")
-                # Force update prices from APIs
-                await self.force_update_prices_from_apis()
                 await self.send_price_data()
             else:
                 logger.info(f"Unknown message type: {message_type}")
@@ -249,47 +194,13 @@ class PriceFeedConsumer(AsyncWebsocketConsumer):
             }))
     
     async def send_price_data(self):
-        """Send current price data to client with movement statistics"""
+        """Send the current full price snapshot to the client"""
         try:
-            logger.info("Fetching price data from database...")
-            
-            # Get price data using sync_to_async
-            price_data = await self.get_price_data()
-            
-            # Calculate movement statistics
-            increases = 0
-            decreases = 0
-            unchanged = 0
+            snapshot = await self.get_snapshot()
+            self.last_seq = snapshot.version
             
-            for price in price_data:
-                change = price.get('price_change_percentage_24h', 0)
-                if change > 0:
-                    increases += 1
-                elif change < 0:
-                    decreases += 1
-                else:
-                    unchanged += 1
-            
-            movement_stats = {
-                'increases': increases,
-                'decreases': decreases,
-                'unchanged': unchanged,
-                'total': increases + decreases
-            }
-            
-            response_data = {
-                'type': 'price_data',
-                'prices': price_data,
-                'movement_stats': movement_stats,
-                'update_count': len(price_data),
-                'timestamp': await self.get_current_timestamp(),
-                'total_items': len(price_data)
-            }
-            
-            logger.info(f"Sending price data: {len(price_data)} items")
-            logger.info(f"Movement stats: {increases} increases, {decreases} decreases, {unchanged} unchanged")
-            await self.send(text_data=json.dumps(response_data))
-            logger.info("Price data sent successfully")
+            logger.info(f"Sending price snapshot {snapshot.version}: {len(snapshot.price_data)} items")
+            await self.send(text_data=snapshot.full_message_json())
             
         except Exception as e:
             logger.error(f"Error sending price data: {e}")
@@ -300,112 +211,37 @@ class PriceFeedConsumer(AsyncWebsocketConsumer):
             await self.send(text_data=json.dumps(error_response))
     
     @database_sync_to_async
-    def get_price_data(self):
-        """Get price data from database - wrapped in sync_to_async"""
-        try:
-            # Get models dynamically to avoid import issues
-            RealTimePriceFeed = apps.get_model('investments', 'RealTimePriceFeed')
-            InvestmentItem = apps.get_model('investments', 'InvestmentItem')
-            
-            # Get all active price feeds
-            feeds = RealTimePriceFeed.objects.filter(is_active=True)
-            logger.info(f"Found {feeds.count()} active price feeds")
-            
-            # Get all active investment items
-            items = InvestmentItem.objects.filter(is_active=True)
-            logger.info(f"Found {items.count()} active investment items")
-            
-            price_data = []
-            
-            # First, add price feeds data
-            for feed in feeds:
-                price_data.append({
-                    'symbol': feed.symbol,
-                    'name': feed.name,
-                    'current_price': float(feed.current_price),
-                    'price_change_24h': float(feed.price_change_24h),
-                    'price_change_percentage_24h': float(feed.price_change_percentage_24h),
-                    'last_updated': feed.last_updated.isoformat() if feed.last_updated else None,
-                    'source': 'price_feed'
-                })
-                logger.info(f"Added price feed data for {feed.name}: ${feed.current_price}")
-            
-            # Then, add investment items data (these are the actual items users can invest in)
-            for item in items:
-                # Try to find matching price feed
-                matching_feed = None
-                for feed in feeds:
-                    # Check if names match (e.g., "Bitcoin (BTC)" matches "Bitcoin (BTC)")
-                    if feed.name == item.name:
-                        matching_feed = feed
-                        break
-                    # Check if symbols match (e.g., "BTC" matches "BTC")
-                    elif feed.symbol and item.symbol and feed.symbol == item.symbol:
-                        matching_feed = feed
-                        break
-                
-                if matching_feed:
-                    # Use price feed data for real-time updates
-                    price_data.append({
-                        'symbol': item.symbol or matching_feed.symbol,
-                        'name': item.name,
-                        'current_price': float(matching_feed.current_price),
-                        'price_change_24h': float(matching_feed.price_change_24h),
-                        'price_change_percentage_24h': float(matching_feed.price_change_percentage_24h),
-                        'last_updated': matching_feed.last_updated.isoformat() if matching_feed.last_updated else None,
-                        'source': 'investment_item',
-                        'item_id': item.id,
-                        'minimum_investment': float(item.minimum_investment) if item.minimum_investment else None,
-                        'investment_type': item.investment_type
-                    })
-                    logger.info(f"Added investment item data for {item.name}: ${matching_feed.current_price}")
-                else:
-                    # Use item's own price data if no matching feed
-                    price_data.append({
-                        'symbol': item.symbol,
-                        'name': item.name,
-                        'current_price': float(item.current_price_usd),
-                        'price_change_24h': float(item.price_change_24h) if item.price_change_24h else 0,
-                        'price_change_percentage_24h': float(item.price_change_percentage_24h) if item.price_change_percentage_24h else 0,
-                        'last_updated': getattr(item, 'last_price_update', item.updated_at).isoformat() if hasattr(item, 'last_price_update') and item.last_price_update else item.updated_at.isoformat(),
-                        'source': 'investment_item_static',
-                        'item_id': item.id,
-                        'minimum_investment': float(item.minimum_investment) if item.minimum_investment else None,
-                        'investment_type': item.investment_type
-                    })
-                    logger.info(f"Added static investment item data for {item.name}: ${item.current_price_usd}")
-            
-            return price_data
-            
-        except Exception as e:
-            logger.error(f"Error getting price data: {e}")
-            return []
+    def get_snapshot(self, min_version=None):
+        """Get the shared price snapshot - wrapped in sync_to_async"""
+        from .price_snapshot import price_snapshot
+        return price_snapshot.get(min_version=min_version)
     
     @database_sync_to_async
-    def get_current_timestamp(self):
-        """Get current timestamp - wrapped in sync_to_async"""
-        from django.utils import timezone
-        return timezone.now().isoformat()
+    def get_catch_up_message(self, last_seq):
+        """Get the delta (or full snapshot) bringing a client at last_seq up to date"""
+        from .price_snapshot import price_snapshot
+        message = price_snapshot.catch_up_message_json(last_seq)
+        return price_snapshot.get().version, message
     
-    async def price_update(self, event):
-        """Handle price update events from channel layer"""
+    async def price_delta(self, event):
+        """Handle a new snapshot version announced on the channel layer"""
         try:
-            logger.info(f"Broadcasting price update to {self.channel_name}")
-            
-            # Enhanced price update with movement stats
-            update_data = {
-                'type': 'price_update',
-                'price_data': event.get('price_data', []),
-                'movement_stats': event.get('movement_stats', {}),
-                'update_count': event.get('update_count', 0),
-                'timestamp': timezone.now().isoformat(),
-                'total_items': len(event.get('price_data', []))
-            }
+            snapshot = await self.get_snapshot(min_version=event.get('seq'))
+            
+            if self.last_seq is not None and snapshot.version is not None and self.last_seq >= snapshot.version:
+                return
+            if not self.delta_mode:
+                message = snapshot.update_message_json
+            elif self.last_seq is not None and self.last_seq == snapshot.base_version:
+                message = snapshot.delta_message_json
+            else:
+                # Gap in the sequence: resynchronise with a full snapshot
+                message = snapshot.full_message_json()
             
-            await self.send(text_data=json.dumps(update_data))
-            logger.info(f"Successfully broadcasted enhanced price update with {len(update_data['price_data'])} items")
+            self.last_seq = snapshot.version
+            await self.send(text_data=message)
         except Exception as e:
-            logger.error(f"Error broadcasting price update: {e}")
+            logger.error(f"Error sending price delta: {e}")
     
     async def portfolio_update(self, event):
         """Handle portfolio update events"""
@@ -418,23 +254,6 @@ class PriceFeedConsumer(AsyncWebsocketConsumer):
             }))
         except Exception as e:
             logger.error(f"Error broadcasting portfolio update: {e}")
-    
-    @classmethod
-    async def broadcast_price_update(cls, price_data):
-        """Broadcast price update to all connected clients"""
-        try:
-            from channels.layers import get_channel_layer
-            channel_layer = get_channel_layer()
-            await channel_layer.group_send(
-                'price_feeds',
-                {
-                    'type': 'price_update',
-                    'price_data': price_data
-                }
-            )
-            logger.info("Price update broadcasted successfully")
-        except Exception as e:
-            logger.error(f"Error broadcasting price update: {e}")
 
 
 class PortfolioConsumer(AsyncWebsocketConsumer):
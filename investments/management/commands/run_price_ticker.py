@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+import logging
+from investments.price_ticker import PriceTicker
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Run the singleton live price ticker (only the elected leader writes prices)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=None,
+            help='Update interval in seconds (default: PRICE_TICKER_INTERVAL)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run one cycle if this process wins the election, then exit'
+        )
+
+    def handle(self, *args, **options):
+        ticker = PriceTicker(interval=options['interval'])
+        
+        if options['once']:
+            updated_count = ticker.tick_if_leader()
+            ticker.release_leadership()
+            if updated_count is None:
+                self.stdout.write(self.style.WARNING('⏳ Another process holds the price ticker lease'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✅ Updated {updated_count} prices'))
+            return
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'🚀 Price ticker {ticker.instance_id} running (interval: {ticker.interval}s)')
+        )
+        self.stdout.write('Press Ctrl+C to stop')
+        
+        try:
+            ticker.run_forever()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\n⏹️  Price ticker stopped by user'))
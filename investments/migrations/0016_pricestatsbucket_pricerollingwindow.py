@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0015_fix_title_length_final'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceStatsBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+                ('price_count', models.PositiveIntegerField(default=0)),
+                ('price_min', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('price_max', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('increases', models.PositiveIntegerField(default=0)),
+                ('decreases', models.PositiveIntegerField(default=0)),
+                ('unchanged', models.PositiveIntegerField(default=0)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_stats_buckets', to='investments.investmentitem')),
+            ],
+            options={
+                'verbose_name_plural': 'Price Statistics Buckets',
+                'ordering': ['-bucket_start'],
+                'indexes': [models.Index(fields=['bucket_start'], name='investments_bucket__a0512a_idx')],
+                'unique_together': {('item', 'bucket_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PriceRollingWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('24h', 'Last 24 Hours'), ('7d', 'Last 7 Days'), ('30d', 'Last 30 Days')], max_length=3)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+                ('price_count', models.PositiveIntegerField(default=0)),
+                ('price_min', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('price_max', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('increases', models.PositiveIntegerField(default=0)),
+                ('decreases', models.PositiveIntegerField(default=0)),
+                ('unchanged', models.PositiveIntegerField(default=0)),
+                ('expired_before', models.DateTimeField()),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rolling_windows', to='investments.investmentitem')),
+            ],
+            options={
+                'verbose_name_plural': 'Price Rolling Windows',
+                'unique_together': {('item', 'window')},
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0016_pricestatsbucket_pricerollingwindow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceCandle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('1m', '1 Minute'), ('1h', '1 Hour'), ('1d', '1 Day')], max_length=2)),
+                ('bucket_start', models.DateTimeField()),
+                ('open_price', models.DecimalField(decimal_places=8, max_digits=20)),
+                ('high_price', models.DecimalField(decimal_places=8, max_digits=20)),
+                ('low_price', models.DecimalField(decimal_places=8, max_digits=20)),
+                ('close_price', models.DecimalField(decimal_places=8, max_digits=20)),
+                ('volume', models.DecimalField(blank=True, decimal_places=8, max_digits=30, null=True)),
+                ('tick_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Price Candles',
+                'ordering': ['-bucket_start'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='realtimepricehistory',
+            index=models.Index(fields=['price_feed', 'timestamp'], name='investments_price_f_98301b_idx'),
+        ),
+        migrations.AddField(
+            model_name='pricecandle',
+            name='item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='candles', to='investments.investmentitem'),
+        ),
+        migrations.AddField(
+            model_name='pricecandle',
+            name='price_feed',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='candles', to='investments.realtimepricefeed'),
+        ),
+        migrations.AddIndex(
+            model_name='pricecandle',
+            index=models.Index(fields=['resolution', 'bucket_start'], name='investments_resolut_8130a0_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='pricecandle',
+            unique_together={('price_feed', 'resolution', 'bucket_start'), ('item', 'resolution', 'bucket_start')},
+        ),
+    ]
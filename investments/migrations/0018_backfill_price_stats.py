@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import migrations
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncHour
+
+WINDOWS = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+}
+
+
+def backfill_price_stats(apps, schema_editor):
+    """Rebuild hourly buckets and rolling windows from the last 30 days of PriceHistory"""
+    PriceHistory = apps.get_model('investments', 'PriceHistory')
+    PriceStatsBucket = apps.get_model('investments', 'PriceStatsBucket')
+    PriceRollingWindow = apps.get_model('investments', 'PriceRollingWindow')
+
+    current_bucket = datetime.now(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    oldest_cutoff = current_bucket - max(WINDOWS.values()) + timedelta(hours=1)
+
+    # Every recorded tick is also in PriceHistory, so rebuilding replaces rather than adds
+    PriceStatsBucket.objects.all().delete()
+    PriceRollingWindow.objects.all().delete()
+
+    hourly = (
+        PriceHistory.objects.order_by()
+        .filter(timestamp__gte=oldest_cutoff)
+        .annotate(hour=TruncHour('timestamp', tzinfo=dt_timezone.utc))
+        .values('item_id', 'hour')
+        .annotate(
+            sum_price=Sum('price'), count=Count('id'),
+            min_price=Min('price'), max_price=Max('price'),
+            increases=Count('id', filter=Q(movement_type='increase')),
+            decreases=Count('id', filter=Q(movement_type='decrease')),
+            unchanged=Count('id', filter=~Q(movement_type__in=['increase', 'decrease'])),
+        )
+    )
+    PriceStatsBucket.objects.bulk_create([
+        PriceStatsBucket(
+            item_id=row['item_id'],
+            bucket_start=row['hour'],
+            price_sum=row['sum_price'],
+            price_count=row['count'],
+            price_min=row['min_price'],
+            price_max=row['max_price'],
+            increases=row['increases'],
+            decreases=row['decreases'],
+            unchanged=row['unchanged'],
+        )
+        for row in hourly
+    ], batch_size=1000)
+
+    for name, length in WINDOWS.items():
+        cutoff = current_bucket - length + timedelta(hours=1)
+        totals = PriceStatsBucket.objects.order_by().filter(bucket_start__gte=cutoff).values('item_id').annotate(
+            sum_price=Sum('price_sum'), sum_count=Sum('price_count'),
+            min_price=Min('price_min'), max_price=Max('price_max'),
+            sum_increases=Sum('increases'), sum_decreases=Sum('decreases'),
+            sum_unchanged=Sum('unchanged'),
+        )
+        PriceRollingWindow.objects.bulk_create([
+            PriceRollingWindow(
+                item_id=row['item_id'],
+                window=name,
+                price_sum=row['sum_price'] or 0,
+                price_count=row['sum_count'] or 0,
+                price_min=row['min_price'],
+                price_max=row['max_price'],
+                increases=row['sum_increases'] or 0,
+                decreases=row['sum_decreases'] or 0,
+                unchanged=row['sum_unchanged'] or 0,
+                expired_before=cutoff,
+            )
+            for row in totals
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0017_pricecandle_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_price_stats, migrations.RunPython.noop),
+    ]
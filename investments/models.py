@@ -134,30 +134,8 @@ class InvestmentItem(models.Model):
         
         # Update movement statistics
         try:
-            stats = PriceMovementStats.get_or_create_today_stats(self)
-            stats.increment_movement(movement_type)
-            
-            # Update 24h price statistics
-            if not stats.highest_price_24h or new_price > stats.highest_price_24h:
-                stats.highest_price_24h = new_price
-            if not stats.lowest_price_24h or new_price < stats.lowest_price_24h:
-                stats.lowest_price_24h = new_price
-            
-            # Calculate average price for 24h
-            from django.db.models import Avg
-            from datetime import timedelta
-            end_time = timezone.now()
-            start_time = end_time - timedelta(hours=24)
-            
-            avg_price = PriceHistory.objects.filter(
-                item=self,
-                timestamp__range=(start_time, end_time)
-            ).aggregate(avg=Avg('price'))['avg']
-            
-            if avg_price:
-                stats.average_price_24h = avg_price
-            
-            stats.save()
+            from .rolling_stats import rolling_price_stats
+            rolling_price_stats.record_ticks({self.pk: (new_price, movement_type)})
             
         except Exception as e:
             # Log error but don't fail the price update
@@ -321,13 +299,36 @@ class PriceMovementStats(models.Model):
     
     def increment_movement(self, movement_type):
         """Increment movement counter"""
+        self.count_movement(movement_type)
+        self.save()
+    
+    def count_movement(self, movement_type):
+        """Increment movement counter without saving"""
         if movement_type == 'increase':
             self.increases_today += 1
         elif movement_type == 'decrease':
             self.decreases_today += 1
         else:
             self.unchanged_today += 1
-        self.save()
+    
+    def apply_rolling_windows(self, windows):
+        """Copy {window: PriceRollingWindow} totals onto the weekly/monthly counters and 24h prices"""
+        if '24h' in windows:
+            day = windows['24h']
+            self.highest_price_24h = day.price_max
+            self.lowest_price_24h = day.price_min
+            self.average_price_24h = day.average_price
+        if '7d' in windows:
+            week = windows['7d']
+            self.increases_this_week = week.increases
+            self.decreases_this_week = week.decreases
+            self.unchanged_this_week = week.unchanged
+        if '30d' in windows:
+            month = windows['30d']
+            self.increases_this_month = month.increases
+            self.decreases_this_month = month.decreases
+            self.unchanged_this_month = month.unchanged
+        self.last_updated = timezone.now()
     
     @property
     def total_movements_today(self):
@@ -340,6 +341,71 @@ class PriceMovementStats(models.Model):
         return self.increases_today - self.decreases_today
 
 
+class PriceStatsBucket(models.Model):
+    """Hourly price aggregates per item, feeding the rolling 24h/7d/30d windows"""
+    item = models.ForeignKey(InvestmentItem, on_delete=models.CASCADE, related_name='price_stats_buckets')
+    bucket_start = models.DateTimeField()
+    
+    price_sum = models.DecimalField(max_digits=24, decimal_places=2, default=0)
+    price_count = models.PositiveIntegerField(default=0)
+    price_min = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    price_max = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    
+    increases = models.PositiveIntegerField(default=0)
+    decreases = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['item', 'bucket_start']
+        ordering = ['-bucket_start']
+        verbose_name_plural = 'Price Statistics Buckets'
+        indexes = [
+            models.Index(fields=['bucket_start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.item.name} - {self.bucket_start} ({self.price_count} ticks)"
+
+
+class PriceRollingWindow(models.Model):
+    """Running totals for one item over a rolling window, maintained incrementally per tick"""
+    
+    WINDOW_CHOICES = [
+        ('24h', 'Last 24 Hours'),
+        ('7d', 'Last 7 Days'),
+        ('30d', 'Last 30 Days'),
+    ]
+    
+    item = models.ForeignKey(InvestmentItem, on_delete=models.CASCADE, related_name='rolling_windows')
+    window = models.CharField(max_length=3, choices=WINDOW_CHOICES)
+    
+    price_sum = models.DecimalField(max_digits=24, decimal_places=2, default=0)
+    price_count = models.PositiveIntegerField(default=0)
+    price_min = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    price_max = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    
+    increases = models.PositiveIntegerField(default=0)
+    decreases = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    
+    # Buckets starting before this time have already been subtracted from the totals
+    expired_before = models.DateTimeField()
+    last_updated = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['item', 'window']
+        verbose_name_plural = 'Price Rolling Windows'
+    
+    def __str__(self):
+        return f"{self.item.name} - {self.window}"
+    
+    @property
+    def average_price(self):
+        if not self.price_count:
+            return None
+        return (self.price_sum / self.price_count).quantize(Decimal('0.01'))
+
+
 class UserInvestment(models.Model):
     """User's investment in a specific item"""
     
@@ -519,18 +585,27 @@ class InvestmentPortfolio(models.Model):
     
     def update_portfolio_summary(self):
         """Update portfolio summary based on current investments"""
-        active_investments = self.user.investments.filter(status='active')
-        
-        self.total_invested = sum(inv.investment_amount_usd for inv in active_investments)
-        self.current_value = sum(inv.current_value_usd for inv in active_investments)
+        active = models.Q(status='active')
+        totals = self.user.investments.aggregate(
+            invested=models.Sum('investment_amount_usd', filter=active),
+            value=models.Sum('current_value_usd', filter=active),
+            active_count=models.Count('id', filter=active),
+            total_count=models.Count('id')
+        )
+        self.apply_totals(**totals)
+        self.save()
+    
+    def apply_totals(self, invested, value, active_count, total_count):
+        """Set the summary fields from aggregated investment totals (no save)"""
+        self.total_invested = invested or 0
+        self.current_value = value or 0
         self.total_return = self.current_value - self.total_invested
         
         if self.total_invested > 0:
-            self.total_return_percentage = (self.total_return / self.total_invested) * 100
+            self.total_return_percentage = ((self.total_return / self.total_invested) * 100).quantize(Decimal('0.01'))
         
-        self.active_investments_count = active_investments.count()
-        self.total_investments_count = self.user.investments.count()
-        self.save()
+        self.active_investments_count = active_count or 0
+        self.total_investments_count = total_count or 0
     
     @property
     def is_profitable(self):
@@ -691,8 +766,8 @@ class RealTimePriceFeed(models.Model):
     def __str__(self):
         return f"{self.name} - {self.get_asset_type_display()} ({self.base_currency})"
     
-    def update_price(self, new_price, price_change_24h=None, price_change_percentage_24h=None, volume_24h=None, market_cap=None):
-        """Update the current price and calculate changes"""
+    def apply_price(self, new_price, price_change_24h=None, price_change_percentage_24h=None, volume_24h=None, market_cap=None):
+        """Apply a new price in memory and return the matching (unsaved) history record"""
         if price_change_24h is None:
             price_change_24h = new_price - self.current_price
         if price_change_percentage_24h is None and self.current_price > 0:
@@ -713,17 +788,31 @@ class RealTimePriceFeed(models.Model):
             self.volume_24h = volume_24h
         if market_cap is not None:
             self.market_cap = market_cap
-            
-        self.save()
         
-        # Create price history record
-        RealTimePriceHistory.objects.create(
+        # Set explicitly so bulk_update (which skips auto_now) persists it too
+        self.last_updated = timezone.now()
+        
+        return RealTimePriceHistory(
             price_feed=self,
             price=new_price,
             change_amount=price_change_24h,
             change_percentage=price_change_percentage_24h or 0,
-            timestamp=timezone.now()
+            timestamp=self.last_updated
+        )
+    
+    def update_price(self, new_price, price_change_24h=None, price_change_percentage_24h=None, volume_24h=None, market_cap=None):
+        """Update the current price and calculate changes"""
+        history = self.apply_price(
+            new_price,
+            price_change_24h,
+            price_change_percentage_24h,
+            volume_24h=volume_24h,
+            market_cap=market_cap
         )
+        self.save()
+        
+        # Create price history record
+        history.save()
 
 
 class RealTimePriceHistory(models.Model):
@@ -737,11 +826,53 @@ class RealTimePriceHistory(models.Model):
     class Meta:
         ordering = ['-timestamp']
         verbose_name_plural = 'Real Time Price History'
+        indexes = [
+            models.Index(fields=['price_feed', 'timestamp']),
+        ]
     
     def __str__(self):
         return f"{self.price_feed.name} - {self.price} at {self.timestamp}"
 
 
+class PriceCandle(models.Model):
+    """OHLCV candle rolled up from raw price ticks for a price feed or an investment item"""
+    
+    RESOLUTION_CHOICES = [
+        ('1m', '1 Minute'),
+        ('1h', '1 Hour'),
+        ('1d', '1 Day'),
+    ]
+    
+    # Exactly one source is set: feed candles come from RealTimePriceHistory, item candles from PriceHistory
+    price_feed = models.ForeignKey(RealTimePriceFeed, on_delete=models.CASCADE, related_name='candles', blank=True, null=True)
+    item = models.ForeignKey(InvestmentItem, on_delete=models.CASCADE, related_name='candles', blank=True, null=True)
+    resolution = models.CharField(max_length=2, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+    
+    open_price = models.DecimalField(max_digits=20, decimal_places=8)
+    high_price = models.DecimalField(max_digits=20, decimal_places=8)
+    low_price = models.DecimalField(max_digits=20, decimal_places=8)
+    close_price = models.DecimalField(max_digits=20, decimal_places=8)
+    # Last reported 24h volume in the bucket (the feeds only publish rolling volume)
+    volume = models.DecimalField(max_digits=30, decimal_places=8, blank=True, null=True)
+    tick_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-bucket_start']
+        verbose_name_plural = 'Price Candles'
+        unique_together = [
+            ['price_feed', 'resolution', 'bucket_start'],
+            ['item', 'resolution', 'bucket_start'],
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'bucket_start']),
+        ]
+    
+    def __str__(self):
+        source = self.price_feed.symbol if self.price_feed_id else self.item.name
+        return f"{source} {self.resolution} @ {self.bucket_start}"
+
+
 class CurrencyConversion(models.Model):
     """Currency conversion rates"""
     
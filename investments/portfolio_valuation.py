@@ -0,0 +1,217 @@
+"""
+Batched revaluation of user holdings and portfolio summaries.
+
+Holdings are revalued from one joined query and written back with bulk_update;
+portfolio summaries are refreshed with one aggregate query per batch of users.
+Bulk writes don't emit post_save, and the per-save portfolio signals are
+suppressed for the duration of the job so nothing recomputes row by row.
+
+Individual writes don't recompute their portfolio either: they mark the user
+dirty (a Redis set when REDIS_URL is configured, a process-local set
+otherwise) and a debounced coalescer refreshes each dirty portfolio at most
+once per PORTFOLIO_RECOMPUTE_INTERVAL.
+"""
+import logging
+import os
+import threading
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import InvestmentPortfolio, UserInvestment
+from .signals import suppress_portfolio_signals
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+
+
+class PortfolioRevaluationService:
+    """Revalues every active holding and portfolio in a constant number of queries per batch"""
+
+    def __init__(self, batch_size=2000, user_batch_size=500):
+        self.batch_size = batch_size
+        self.user_batch_size = user_batch_size
+
+    def revalue_holdings(self):
+        """Recompute value and return of all active holdings; returns (updated_count, touched user ids)"""
+        rows = UserInvestment.objects.filter(status='active').values_list(
+            'id', 'user_id', 'quantity', 'investment_amount_usd', 'item__current_price_usd',
+            'current_value_usd', 'total_return_usd', 'total_return_percentage'
+        ).order_by('id')
+
+        now = timezone.now()
+        changed = []
+        user_ids = set()
+        updated_count = 0
+        for inv_id, user_id, quantity, invested, price, old_value, old_return, old_percentage in rows.iterator(chunk_size=self.batch_size):
+            current_value = (quantity * price).quantize(CENT)
+            total_return = current_value - invested
+            total_return_percentage = (total_return / invested * 100).quantize(CENT) if invested > 0 else old_percentage
+
+            if (current_value, total_return, total_return_percentage) == (old_value, old_return, old_percentage):
+                continue
+            changed.append(UserInvestment(
+                id=inv_id,
+                current_value_usd=current_value,
+                total_return_usd=total_return,
+                total_return_percentage=total_return_percentage,
+                updated_at=now
+            ))
+            user_ids.add(user_id)
+
+            if len(changed) >= self.batch_size:
+                updated_count += self._write_holdings(changed)
+                changed = []
+
+        updated_count += self._write_holdings(changed)
+        return updated_count, user_ids
+
+    def _write_holdings(self, holdings):
+        if not holdings:
+            return 0
+        UserInvestment.objects.bulk_update(holdings, [
+            'current_value_usd', 'total_return_usd', 'total_return_percentage', 'updated_at'
+        ])
+        return len(holdings)
+
+    def refresh_portfolios(self, user_ids=None):
+        """Refresh portfolio summaries with one aggregate query per batch of users"""
+        portfolios = InvestmentPortfolio.objects.order_by('user_id')
+        if user_ids is not None:
+            portfolios = portfolios.filter(user_id__in=user_ids)
+        portfolios = list(portfolios)
+
+        refreshed = 0
+        for start in range(0, len(portfolios), self.user_batch_size):
+            batch = portfolios[start:start + self.user_batch_size]
+            refreshed += self._refresh_batch(batch)
+        return refreshed
+
+    def _refresh_batch(self, portfolios):
+        active = Q(status='active')
+        totals = {
+            row['user_id']: row
+            for row in UserInvestment.objects.filter(
+                user_id__in=[portfolio.user_id for portfolio in portfolios]
+            ).values('user_id').annotate(
+                invested=Sum('investment_amount_usd', filter=active),
+                value=Sum('current_value_usd', filter=active),
+                active_count=Count('id', filter=active),
+                total_count=Count('id')
+            )
+        }
+
+        now = timezone.now()
+        for portfolio in portfolios:
+            row = totals.get(portfolio.user_id, {})
+            portfolio.apply_totals(row.get('invested'), row.get('value'), row.get('active_count'), row.get('total_count'))
+            portfolio.last_updated = now
+
+        InvestmentPortfolio.objects.bulk_update(portfolios, [
+            'total_invested', 'current_value', 'total_return', 'total_return_percentage',
+            'active_investments_count', 'total_investments_count', 'last_updated'
+        ])
+        return len(portfolios)
+
+    def revalue_all(self):
+        """Revalue holdings, then refresh the portfolios of users whose holdings moved"""
+        with suppress_portfolio_signals(), transaction.atomic():
+            updated_count, user_ids = self.revalue_holdings()
+            refreshed = self.refresh_portfolios(user_ids) if user_ids else 0
+        logger.info(f"Revalued {updated_count} holdings and {refreshed} portfolios")
+        return updated_count
+
+
+class DirtyPortfolioCoalescer:
+    """Collects users whose portfolios need recomputing and refreshes them in debounced batches"""
+
+    DIRTY_KEY = 'investments:portfolio:dirty'
+
+    def __init__(self, interval=None):
+        self.interval = interval if interval is not None else getattr(settings, 'PORTFOLIO_RECOMPUTE_INTERVAL', 5)
+        self._local_dirty = set()
+        self._lock = threading.Lock()
+        self._timer = None
+        self._redis = None
+
+    def _get_redis(self):
+        redis_url = getattr(settings, 'REDIS_URL', None) or os.environ.get('REDIS_URL')
+        if not redis_url:
+            return None
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url)
+        return self._redis
+
+    def mark(self, user_id):
+        """Mark a user's portfolio dirty once the surrounding transaction commits"""
+        transaction.on_commit(lambda: self._mark_now(user_id))
+
+    def _mark_now(self, user_id):
+        try:
+            client = self._get_redis()
+            if client is not None:
+                client.sadd(self.DIRTY_KEY, user_id)
+            else:
+                with self._lock:
+                    self._local_dirty.add(user_id)
+        except Exception as e:
+            logger.warning(f"Could not mark portfolio {user_id} dirty in Redis: {e}")
+            with self._lock:
+                self._local_dirty.add(user_id)
+        self._schedule()
+
+    def _schedule(self):
+        """Start one flush timer per interval; marks arriving meanwhile ride along"""
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.interval, self._timer_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timer_flush(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+    def drain(self, limit=5000):
+        """Atomically take up to limit dirty user ids"""
+        with self._lock:
+            user_ids = set(self._local_dirty)
+            self._local_dirty.clear()
+        try:
+            client = self._get_redis()
+            if client is not None:
+                user_ids.update(int(user_id) for user_id in client.spop(self.DIRTY_KEY, limit) or [])
+        except Exception as e:
+            logger.warning(f"Could not drain dirty portfolios from Redis: {e}")
+        return user_ids
+
+    def flush(self):
+        """Recompute every dirty portfolio once with database-side aggregates"""
+        user_ids = self.drain()
+        if not user_ids:
+            return 0
+        try:
+            refreshed = portfolio_revaluation.refresh_portfolios(user_ids)
+            logger.info(f"Recomputed {refreshed} dirty portfolios")
+            return refreshed
+        except Exception as e:
+            logger.error(f"Error recomputing dirty portfolios: {e}")
+            # Put them back so the next flush retries
+            for user_id in user_ids:
+                self._mark_now(user_id)
+            return 0
+
+
+# Global instances
+portfolio_revaluation = PortfolioRevaluationService()
+dirty_portfolios = DirtyPortfolioCoalescer()
@@ -0,0 +1,294 @@
+"""
+Concurrent price fetching engine built on asyncio/aiohttp.
+
+Every asset class queries all of its providers at the same time and keeps the
+first provider that returns usable prices, so a full refresh cycle is bounded
+by the slowest single provider instead of the sum of all of them.
+"""
+import asyncio
+import logging
+import random
+from decimal import Decimal
+
+import aiohttp
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CRYPTO_SYMBOLS = ['BTC', 'ETH', 'ADA', 'SOL', 'LINK', 'DOT', 'AVAX', 'MATIC']
+
+COINGECKO_IDS = {
+    'bitcoin': 'BTC',
+    'ethereum': 'ETH',
+    'cardano': 'ADA',
+    'solana': 'SOL',
+    'chainlink': 'LINK',
+    'polkadot': 'DOT',
+    'avalanche-2': 'AVAX',
+    'polygon': 'MATIC',
+}
+
+# Metals ETFs used as a proxy for spot prices, with rough ETF-to-metal ratios
+METAL_ETFS = {
+    'GLD': ('XAU', 10),   # SPDR Gold Trust
+    'SLV': ('XAG', 50),   # iShares Silver Trust
+    'PPLT': ('XPT', 5),   # Aberdeen Standard Platinum ETF
+}
+
+
+def parse_coingecko(data):
+    """Parse a CoinGecko simple/price payload"""
+    prices = {}
+    for coin_id, price_data in data.items():
+        if coin_id in COINGECKO_IDS:
+            prices[COINGECKO_IDS[coin_id]] = {
+                'price': Decimal(str(price_data['usd'])),
+                'change_24h': Decimal(str(price_data.get('usd_24h_change', 0))),
+                'volume_24h': Decimal(str(price_data.get('usd_24h_vol', 0))),
+                'market_cap': Decimal(str(price_data.get('usd_market_cap', 0)))
+            }
+    return prices
+
+
+def parse_coinpaprika(data):
+    """Parse a CoinPaprika tickers payload"""
+    prices = {}
+    for coin in data:
+        if coin['symbol'] in CRYPTO_SYMBOLS:
+            usd = coin['quotes']['USD']
+            prices[coin['symbol']] = {
+                'price': Decimal(str(usd['price'])),
+                'change_24h': Decimal(str(usd['percent_change_24h'])),
+                'volume_24h': Decimal(str(usd['volume_24h'])),
+                'market_cap': Decimal(str(usd['market_cap']))
+            }
+    return prices
+
+
+def parse_cryptocompare(data):
+    """Parse a CryptoCompare pricemultifull payload"""
+    prices = {}
+    for symbol, usd_data in data.get('RAW', {}).items():
+        if 'USD' in usd_data:
+            usd = usd_data['USD']
+            prices[symbol] = {
+                'price': Decimal(str(usd['PRICE'])),
+                'change_24h': Decimal(str(usd['CHANGE24HOUR'])),
+                'volume_24h': Decimal(str(usd['TOTALVOLUME24H'])),
+                'market_cap': Decimal(str(usd['MKTCAP']))
+            }
+    return prices
+
+
+def parse_binance(data):
+    """Parse a Binance 24hr ticker payload"""
+    prices = {}
+    target_pairs = {f'{symbol}USDT' for symbol in CRYPTO_SYMBOLS}
+    for ticker in data:
+        if ticker['symbol'] in target_pairs:
+            prices[ticker['symbol'].replace('USDT', '')] = {
+                'price': Decimal(str(ticker['lastPrice'])),
+                'change_24h': Decimal(str(ticker['priceChange'])),
+                'volume_24h': Decimal(str(ticker['volume'])),
+                'market_cap': Decimal('0')  # Binance doesn't provide market cap
+            }
+    return prices
+
+
+def parse_metals_live(data):
+    """Parse a metals.live spot payload"""
+    prices = {}
+    metals = data.get('metals', {}) if isinstance(data, dict) else {}
+    for metal, symbol in (('gold', 'XAU'), ('silver', 'XAG'), ('platinum', 'XPT')):
+        if metal in metals:
+            prices[symbol] = {
+                'price': Decimal(str(metals[metal])),
+                'change_24h': Decimal('0'),
+                'volume_24h': Decimal('0'),
+                'market_cap': Decimal('0')
+            }
+    return prices
+
+
+def parse_yahoo_meta(data):
+    """Extract the quote metadata from a Yahoo Finance chart payload"""
+    result = (data.get('chart') or {}).get('result')
+    if result and 'meta' in result[0]:
+        return result[0]['meta']
+    return None
+
+
+class AsyncPriceFetcher:
+    """Fetches all asset classes concurrently with per-provider deadlines"""
+
+    def __init__(self, provider_timeout=None):
+        self.provider_timeout = provider_timeout or getattr(settings, 'PRICE_PROVIDER_TIMEOUT', 10)
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        }
+
+    async def _get_json(self, session, url, params=None):
+        async with session.get(url, params=params) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def _first_good(self, label, providers):
+        """Run providers concurrently and return the first non-empty result"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.provider_timeout
+        tasks = [asyncio.ensure_future(provider()) for provider in providers]
+        pending = set(tasks)
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception():
+                        logger.warning(f"{label} provider failed: {task.exception()}")
+                    elif task.result():
+                        return task.result()
+            if pending:
+                logger.warning(f"{label} providers timed out after {self.provider_timeout}s")
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return {}
+
+    # Crypto providers
+
+    async def _coingecko(self, session):
+        data = await self._get_json(session, "https://api.coingecko.com/api/v3/simple/price", {
+            'ids': ','.join(COINGECKO_IDS),
+            'vs_currencies': 'usd',
+            'include_24hr_change': 'true',
+            'include_24hr_vol': 'true',
+            'include_market_cap': 'true'
+        })
+        return parse_coingecko(data)
+
+    async def _coinpaprika(self, session):
+        data = await self._get_json(session, "https://api.coinpaprika.com/v1/tickers")
+        return parse_coinpaprika(data)
+
+    async def _cryptocompare(self, session):
+        data = await self._get_json(session, "https://min-api.cryptocompare.com/data/pricemultifull", {
+            'fsyms': ','.join(CRYPTO_SYMBOLS),
+            'tsyms': 'USD'
+        })
+        return parse_cryptocompare(data)
+
+    async def _binance(self, session):
+        data = await self._get_json(session, "https://api.binance.com/api/v3/ticker/24hr")
+        return parse_binance(data)
+
+    # Metals providers
+
+    async def _metals_live(self, session):
+        data = await self._get_json(session, "https://api.metals.live/v1/spot")
+        return parse_metals_live(data)
+
+    async def _yahoo_metals(self, session):
+        async def fetch_etf(etf, metal, ratio):
+            data = await self._get_json(session, f"https://query1.finance.yahoo.com/v8/finance/chart/{etf}")
+            meta = parse_yahoo_meta(data)
+            if not meta:
+                return None
+            current_price = meta.get('regularMarketPrice', 0)
+            previous_close = meta.get('previousClose', current_price)
+            return metal, {
+                'price': Decimal(str(current_price * ratio)),
+                'change_24h': Decimal(str((current_price - previous_close) * 10)),
+                'volume_24h': None,
+                'market_cap': None
+            }
+
+        results = await asyncio.gather(
+            *(fetch_etf(etf, metal, ratio) for etf, (metal, ratio) in METAL_ETFS.items()),
+            return_exceptions=True
+        )
+        return dict(result for result in results if isinstance(result, tuple))
+
+    # Real estate providers
+
+    async def _yahoo_reit(self, session):
+        data = await self._get_json(session, "https://query1.finance.yahoo.com/v8/finance/chart/VNQ")
+        meta = parse_yahoo_meta(data)
+        if not meta:
+            return {}
+        current_price = meta.get('regularMarketPrice', 0)
+        previous_close = meta.get('previousClose', current_price)
+        return {
+            'REIT_INDEX': {
+                'price': Decimal(str(current_price)),
+                'change_24h': Decimal(str(current_price - previous_close)),
+                'volume_24h': Decimal(str(meta.get('regularMarketVolume', 0))),
+                'market_cap': None
+            }
+        }
+
+    async def fetch_crypto_prices(self, session):
+        return await self._first_good('Crypto', [
+            lambda: self._coingecko(session),
+            lambda: self._coinpaprika(session),
+            lambda: self._cryptocompare(session),
+            lambda: self._binance(session),
+        ])
+
+    async def fetch_metals_prices(self, session):
+        return await self._first_good('Metals', [
+            lambda: self._metals_live(session),
+            lambda: self._yahoo_metals(session),
+        ])
+
+    async def fetch_real_estate_prices(self, session):
+        prices = await self._first_good('Real estate', [
+            lambda: self._yahoo_reit(session),
+        ])
+
+        # Luxury property has no public feed, keep the simulated index
+        base_price = 2500.00
+        change_amount = base_price * (random.uniform(-1.0, 1.0) / 100)
+        prices['LUXURY_PROPERTY'] = {
+            'price': Decimal(str(base_price + change_amount)),
+            'change_24h': Decimal(str(change_amount)),
+            'volume_24h': None,
+            'market_cap': None
+        }
+        return prices
+
+    async def fetch_all(self):
+        """Fetch every asset class concurrently, returning one dict per class"""
+        timeout = aiohttp.ClientTimeout(total=self.provider_timeout)
+        async with aiohttp.ClientSession(headers=self.headers, timeout=timeout) as session:
+            crypto, metals, real_estate = await asyncio.gather(
+                self.fetch_crypto_prices(session),
+                self.fetch_metals_prices(session),
+                self.fetch_real_estate_prices(session),
+            )
+        return {
+            'crypto': crypto,
+            'metals': metals,
+            'real_estate': real_estate,
+        }
+
+    def fetch_all_sync(self):
+        """Run fetch_all from synchronous code (Celery tasks, commands, sync_to_async threads)"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.fetch_all())
+
+        # Called from inside a running loop: run the engine on its own thread
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.fetch_all()).result()
+
+
+# Global instance
+price_fetcher = AsyncPriceFetcher()
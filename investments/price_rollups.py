@@ -0,0 +1,192 @@
+"""
+Downsampling of raw price ticks into OHLCV candles.
+
+Raw RealTimePriceHistory (per feed) and PriceHistory (per item) ticks are rolled
+into 1-minute candles, 1-minute candles into 1-hour candles and 1-hour candles
+into 1-day candles. Chart reads pick the coarsest resolution that still gives a
+useful number of points for the requested range, and old history is kept at
+coarse resolution after the raw ticks are cleaned up.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import PriceCandle, PriceHistory, RealTimePriceHistory
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = ['1m', '1h', '1d']
+
+# How long each resolution is kept; daily candles are kept forever
+CANDLE_RETENTION = {
+    '1m': timedelta(days=7),
+    '1h': timedelta(days=365),
+    '1d': None,
+}
+
+# Raw tick sources: candle FK field -> (tick model, tick FK field, tick volume field)
+TICK_SOURCES = {
+    'price_feed': (RealTimePriceHistory, 'price_feed_id', None),
+    'item': (PriceHistory, 'item_id', 'volume_24h'),
+}
+
+CANDLE_FIELDS = ['open_price', 'high_price', 'low_price', 'close_price', 'volume', 'tick_count']
+
+
+def truncate(moment, resolution):
+    """Start of the candle of the given resolution containing moment"""
+    moment = moment.replace(second=0, microsecond=0)
+    if resolution in ('1h', '1d'):
+        moment = moment.replace(minute=0)
+    if resolution == '1d':
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def resolution_for_range(days):
+    """Pick the candle resolution that fits a chart range"""
+    if days <= 1:
+        return '1m'
+    if days <= 30:
+        return '1h'
+    return '1d'
+
+
+def _fold(candles, key, open_price, high_price, low_price, close_price, volume, tick_count):
+    """Merge one tick or finer candle (in time order) into the candle at key"""
+    candle = candles.get(key)
+    if candle is None:
+        candles[key] = {
+            'open_price': open_price,
+            'high_price': high_price,
+            'low_price': low_price,
+            'close_price': close_price,
+            'volume': volume,
+            'tick_count': tick_count,
+        }
+        return
+    candle['high_price'] = max(candle['high_price'], high_price)
+    candle['low_price'] = min(candle['low_price'], low_price)
+    candle['close_price'] = close_price
+    if volume is not None:
+        candle['volume'] = volume
+    candle['tick_count'] += tick_count
+
+
+class PriceRollupService:
+    """Builds, prunes and reads OHLCV candles"""
+
+    def rollup(self):
+        """Roll new ticks into every resolution; returns the number of candles written (errors propagate)"""
+        written = 0
+        for source_field in TICK_SOURCES:
+            written += self._rollup_ticks(source_field)
+            for finer, coarser in zip(RESOLUTIONS, RESOLUTIONS[1:]):
+                written += self._rollup_candles(source_field, finer, coarser)
+        return written
+
+    def rolled_up_before(self, source_field):
+        """Ticks older than this are already in candles (None when nothing is rolled up yet)"""
+        return self._watermark(source_field, '1m')
+
+    def _watermark(self, source_field, resolution):
+        """Start of the newest candle, which is rebuilt because it may still be open"""
+        return PriceCandle.objects.filter(
+            resolution=resolution, **{f'{source_field}__isnull': False}
+        ).aggregate(latest=Max('bucket_start'))['latest']
+
+    def _rollup_ticks(self, source_field):
+        model, tick_field, volume_field = TICK_SOURCES[source_field]
+        watermark = self._watermark(source_field, '1m')
+
+        ticks = model.objects.all()
+        if watermark:
+            ticks = ticks.filter(timestamp__gte=watermark)
+        fields = [tick_field, 'timestamp', 'price'] + ([volume_field] if volume_field else [])
+
+        candles = {}
+        for row in ticks.order_by(tick_field, 'timestamp').values_list(*fields).iterator():
+            source_id, timestamp, price = row[:3]
+            volume = row[3] if volume_field else None
+            _fold(candles, (source_id, truncate(timestamp, '1m')), price, price, price, price, volume, 1)
+        return self._store(source_field, '1m', candles)
+
+    def _rollup_candles(self, source_field, finer, coarser):
+        watermark = self._watermark(source_field, coarser)
+
+        rows = PriceCandle.objects.filter(resolution=finer, **{f'{source_field}__isnull': False})
+        if watermark:
+            rows = rows.filter(bucket_start__gte=watermark)
+
+        candles = {}
+        source_column = f'{source_field}_id'
+        for row in rows.order_by(source_column, 'bucket_start').values_list(
+            source_column, 'bucket_start', *CANDLE_FIELDS
+        ).iterator():
+            source_id, bucket_start = row[:2]
+            _fold(candles, (source_id, truncate(bucket_start, coarser)), *row[2:])
+        return self._store(source_field, coarser, candles)
+
+    def _store(self, source_field, resolution, candles):
+        """Upsert built candles with one read, one bulk_update and one bulk_create"""
+        if not candles:
+            return 0
+        source_column = f'{source_field}_id'
+        existing = {
+            (getattr(candle, source_column), candle.bucket_start): candle
+            for candle in PriceCandle.objects.filter(
+                resolution=resolution,
+                bucket_start__gte=min(bucket_start for _, bucket_start in candles),
+                **{f'{source_column}__in': {source_id for source_id, _ in candles}}
+            )
+        }
+
+        to_update, to_create = [], []
+        for (source_id, bucket_start), values in candles.items():
+            candle = existing.get((source_id, bucket_start))
+            if candle is None:
+                to_create.append(PriceCandle(
+                    resolution=resolution, bucket_start=bucket_start,
+                    **{source_column: source_id}, **values
+                ))
+            else:
+                for field, value in values.items():
+                    setattr(candle, field, value)
+                to_update.append(candle)
+
+        with transaction.atomic():
+            PriceCandle.objects.bulk_update(to_update, CANDLE_FIELDS, batch_size=1000)
+            PriceCandle.objects.bulk_create(to_create, batch_size=1000)
+        return len(candles)
+
+    def prune(self, now=None):
+        """Drop candles past their resolution's retention"""
+        now = now or timezone.now()
+        deleted = 0
+        for resolution, retention in CANDLE_RETENTION.items():
+            if retention is None:
+                continue
+            deleted += PriceCandle.objects.filter(
+                resolution=resolution, bucket_start__lt=now - retention
+            ).delete()[0]
+        return deleted
+
+    def get_candles(self, start_date, end_date, resolution, price_feed=None, item=None):
+        """Candles for one feed or item in [start_date, end_date], oldest first"""
+        candles = PriceCandle.objects.filter(
+            resolution=resolution,
+            bucket_start__gte=truncate(start_date, resolution),
+            bucket_start__lte=end_date,
+        )
+        if price_feed is not None:
+            candles = candles.filter(price_feed=price_feed)
+        else:
+            candles = candles.filter(item=item)
+        return candles.order_by('bucket_start')
+
+
+# Global instance
+price_rollups = PriceRollupService()
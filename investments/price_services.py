@@ -2,13 +2,46 @@ import requests
 import json
 import logging
 from decimal import Decimal
+from django.db import transaction
 from django.utils import timezone
 from datetime import datetime, timedelta
 import random
-from .models import RealTimePriceFeed, InvestmentItem, PriceHistory, RealTimePriceHistory
+from .models import (
+    RealTimePriceFeed, InvestmentItem, PriceHistory, RealTimePriceHistory
+)
+from .rolling_stats import rolling_price_stats
+from .price_rollups import price_rollups, resolution_for_range
+from .price_snapshot import price_snapshot
+from .price_fetcher import (
+    price_fetcher, parse_coingecko, parse_coinpaprika, parse_cryptocompare, parse_binance
+)
 
 logger = logging.getLogger(__name__)
 
+# Items created before InvestmentItem.symbol existed are matched to feeds by name
+LEGACY_ITEM_FEED_SYMBOLS = {
+    'Bitcoin (BTC)': 'BTC',
+    'Ethereum (ETH)': 'ETH',
+    'Cardano (ADA)': 'ADA',
+    'Solana (SOL)': 'SOL',
+    'Chainlink (LINK)': 'LINK',
+    'Polkadot (DOT)': 'DOT',
+    'Avalanche (AVAX)': 'AVAX',
+    'Polygon (MATIC)': 'MATIC',
+    'Gold Bullion (1 oz)': 'XAU',
+    'Silver Bullion (1 oz)': 'XAG',
+    'Platinum Bullion (1 oz)': 'XPT',
+    'Real Estate Investment Trust': 'REIT_INDEX',
+    'Luxury Property Fund': 'LUXURY_PROPERTY',
+}
+
+
+def fits_decimal_field(model, field_name, value):
+    """Whether value fits a DecimalField's max_digits, so one bad row can't fail a bulk write"""
+    field = model._meta.get_field(field_name)
+    return abs(value) < Decimal(10) ** (field.max_digits - field.decimal_places)
+
+
 class RealTimePriceService:
     """Service for fetching real-time prices from external APIs"""
     
@@ -39,27 +72,7 @@ class RealTimePriceService:
             response.raise_for_status()
             data = response.json()
             
-            prices = {}
-            coin_mapping = {
-                'bitcoin': 'BTC',
-                'ethereum': 'ETH', 
-                'cardano': 'ADA',
-                'solana': 'SOL',
-                'chainlink': 'LINK',
-                'polkadot': 'DOT',
-                'avalanche-2': 'AVAX',
-                'polygon': 'MATIC'
-            }
-            
-            for coin_id, price_data in data.items():
-                if coin_id in coin_mapping:
-                    symbol = coin_mapping[coin_id]
-                    prices[symbol] = {
-                        'price': Decimal(str(price_data['usd'])),
-                        'change_24h': Decimal(str(price_data.get('usd_24h_change', 0))),
-                        'volume_24h': Decimal(str(price_data.get('usd_24h_vol', 0))),
-                        'market_cap': Decimal(str(price_data.get('usd_market_cap', 0)))
-                    }
+            prices = parse_coingecko(data)
             
             # If we got some prices, return them
             if prices:
@@ -105,20 +118,7 @@ class RealTimePriceService:
         response.raise_for_status()
         data = response.json()
         
-        prices = {}
-        target_coins = ['BTC', 'ETH', 'ADA', 'SOL', 'LINK', 'DOT', 'AVAX', 'MATIC']
-        
-        for coin in data:
-            if coin['symbol'] in target_coins:
-                symbol = coin['symbol']
-                prices[symbol] = {
-                    'price': Decimal(str(coin['quotes']['USD']['price'])),
-                    'change_24h': Decimal(str(coin['quotes']['USD']['percent_change_24h'])),
-                    'volume_24h': Decimal(str(coin['quotes']['USD']['volume_24h'])),
-                    'market_cap': Decimal(str(coin['quotes']['USD']['market_cap']))
-                }
-        
-        return prices
+        return parse_coinpaprika(data)
     
     def _try_cryptocompare_api(self):
         """Try CryptoCompare API"""
@@ -131,19 +131,7 @@ class RealTimePriceService:
         response.raise_for_status()
         data = response.json()
         
-        prices = {}
-        if 'RAW' in data:
-            for symbol, usd_data in data['RAW'].items():
-                if 'USD' in usd_data:
-                    usd = usd_data['USD']
-                    prices[symbol] = {
-                        'price': Decimal(str(usd['PRICE'])),
-                        'change_24h': Decimal(str(usd['CHANGE24HOUR'])),
-                        'volume_24h': Decimal(str(usd['TOTALVOLUME24H'])),
-                        'market_cap': Decimal(str(usd['MKTCAP']))
-                    }
-        
-        return prices
+        return parse_cryptocompare(data)
     
     def _try_binance_api(self):
         """Try Binance API"""
@@ -152,20 +140,7 @@ class RealTimePriceService:
         response.raise_for_status()
         data = response.json()
         
-        prices = {}
-        target_pairs = ['BTCUSDT', 'ETHUSDT', 'ADAUSDT', 'SOLUSDT', 'LINKUSDT', 'DOTUSDT', 'AVAXUSDT', 'MATICUSDT']
-        
-        for ticker in data:
-            if ticker['symbol'] in target_pairs:
-                symbol = ticker['symbol'].replace('USDT', '')
-                prices[symbol] = {
-                    'price': Decimal(str(ticker['lastPrice'])),
-                    'change_24h': Decimal(str(ticker['priceChange'])),
-                    'volume_24h': Decimal(str(ticker['volume'])),
-                    'market_cap': Decimal('0')  # Binance doesn't provide market cap
-                }
-        
-        return prices
+        return parse_binance(data)
     
     def _get_default_crypto_prices(self):
         """Get default crypto prices when all APIs fail"""
@@ -492,54 +467,85 @@ class RealTimePriceService:
         
         return prices
     
+    def fetch_all_prices_concurrently(self):
+        """Fetch every asset class at once through the async engine"""
+        try:
+            results = price_fetcher.fetch_all_sync()
+        except Exception as e:
+            logger.error(f"Concurrent price fetch failed, falling back to sequential fetch: {e}")
+            return (
+                self.fetch_crypto_prices(),
+                self.fetch_gold_silver_prices(),
+                self.fetch_real_estate_indices(),
+            )
+
+        # Fill any asset class where every provider failed with default prices
+        crypto_prices = results['crypto'] or self._get_default_crypto_prices()
+        metals_prices = results['metals'] or self._get_default_metals_prices()
+        real_estate_prices = results['real_estate']
+        if 'REIT_INDEX' not in real_estate_prices:
+            real_estate_prices = {**self._fetch_real_estate_fallback(), **real_estate_prices}
+
+        return crypto_prices, metals_prices, real_estate_prices
+
+    def ingest_prices(self, all_prices):
+        """Apply a {symbol: price_data} map to the price feeds in a constant number of queries"""
+        feeds_by_symbol = {}
+        for feed in RealTimePriceFeed.objects.filter(symbol__in=list(all_prices)).order_by('pk'):
+            # Keep the first feed per symbol, matching the old .first() lookup
+            feeds_by_symbol.setdefault(feed.symbol, feed)
+        
+        updated_feeds = []
+        history_records = []
+        for symbol, price_data in all_prices.items():
+            feed = feeds_by_symbol.get(symbol)
+            if not feed:
+                continue
+            try:
+                old_price = feed.current_price
+                new_price = price_data['price']
+                change_amount = price_data['change_24h']
+                change_percentage = (change_amount / old_price * 100) if old_price > 0 else 0
+                
+                history_records.append(feed.apply_price(
+                    new_price,
+                    change_amount,
+                    change_percentage,
+                    volume_24h=price_data.get('volume_24h'),
+                    market_cap=price_data.get('market_cap')
+                ))
+                updated_feeds.append(feed)
+                logger.info(f"Updated {symbol}: ${new_price} ({change_percentage:+.2f}%)")
+            except Exception as e:
+                logger.error(f"Error updating {symbol}: {e}")
+        
+        if updated_feeds:
+            with transaction.atomic():
+                RealTimePriceFeed.objects.bulk_update(updated_feeds, [
+                    'current_price', 'price_change_24h', 'price_change_percentage_24h',
+                    'volume_24h', 'market_cap', 'last_updated'
+                ])
+                RealTimePriceHistory.objects.bulk_create(history_records)
+        
+        return len(updated_feeds)
+    
     def update_all_prices(self):
         """Update all price feeds with real-time data"""
         try:
-            # Fetch prices from all sources
-            crypto_prices = self.fetch_crypto_prices()
-            metals_prices = self.fetch_gold_silver_prices()
-            real_estate_prices = self.fetch_real_estate_indices()
-            
+            # Fetch prices from all sources concurrently
+            crypto_prices, metals_prices, real_estate_prices = self.fetch_all_prices_concurrently()
+
             # Combine all prices
             all_prices = {**crypto_prices, **metals_prices, **real_estate_prices}
             
-            # Update price feeds
-            updated_count = 0
-            for symbol, price_data in all_prices.items():
-                try:
-                    feed = RealTimePriceFeed.objects.filter(symbol=symbol).first()
-                    if feed:
-                        old_price = feed.current_price
-                        new_price = price_data['price']
-                        change_amount = price_data['change_24h']
-                        change_percentage = (change_amount / old_price * 100) if old_price > 0 else 0
-                        
-                        # Update the feed with enhanced data
-                        feed.update_price(
-                            new_price, 
-                            change_amount, 
-                            change_percentage,
-                            volume_24h=price_data.get('volume_24h'),
-                            market_cap=price_data.get('market_cap')
-                        )
-                        
-                        # Create price history record for RealTimePriceFeed
-                        RealTimePriceHistory.objects.create(
-                            price_feed=feed,
-                            price=new_price,
-                            change_amount=change_amount,
-                            change_percentage=change_percentage,
-                            timestamp=timezone.now()
-                        )
-                        
-                        updated_count += 1
-                        logger.info(f"Updated {symbol}: ${new_price} ({change_percentage:+.2f}%)")
-                        
-                except Exception as e:
-                    logger.error(f"Error updating {symbol}: {e}")
+            # Persist all feed changes in one batch
+            updated_count = self.ingest_prices(all_prices)
             
             # Update investment item prices based on price feeds
-            self.update_investment_item_prices()
+            self.update_investment_item_prices(publish=False)
+            
+            # One snapshot per update cycle for every live price reader
+            price_snapshot.publish()
             
             logger.info(f"Updated {updated_count} price feeds")
             return updated_count
@@ -548,110 +554,138 @@ class RealTimePriceService:
             logger.error(f"Error updating all prices: {e}")
             return 0
     
-    def update_investment_item_prices(self):
-        """Update investment item prices based on price feeds"""
+    def update_investment_item_prices(self, publish=True):
+        """Reprice every investment item linked to a price feed in a few set-based queries"""
         try:
-            # Map investment items to price feeds
-            item_feed_mapping = {
-                'Bitcoin (BTC)': 'BTC',
-                'Ethereum (ETH)': 'ETH',
-                'Cardano (ADA)': 'ADA',
-                'Solana (SOL)': 'SOL',
-                'Chainlink (LINK)': 'LINK',
-                'Polkadot (DOT)': 'DOT',
-                'Avalanche (AVAX)': 'AVAX',
-                'Polygon (MATIC)': 'MATIC',
-                'Gold Bullion (1 oz)': 'XAU',
-                'Silver Bullion (1 oz)': 'XAG',
-                'Platinum Bullion (1 oz)': 'XPT',
-                'Real Estate Investment Trust': 'REIT_INDEX',
-                'Luxury Property Fund': 'LUXURY_PROPERTY',
-            }
-            
-            for item_name, feed_symbol in item_feed_mapping.items():
+            items = list(InvestmentItem.objects.all())
+            
+            # Resolve each item's feed symbol; legacy items are matched by name and backfilled
+            item_symbols = {}
+            for item in items:
+                symbol = item.symbol or LEGACY_ITEM_FEED_SYMBOLS.get(item.name)
+                if symbol:
+                    item_symbols[item.pk] = symbol
+            
+            feeds_by_symbol = {}
+            for feed in RealTimePriceFeed.objects.filter(
+                symbol__in=set(item_symbols.values())
+            ).order_by('pk'):
+                # Same feed per symbol as the price feed ingestion
+                feeds_by_symbol.setdefault(feed.symbol, feed)
+            
+            now = timezone.now()
+            changed_items = []
+            history_records = []
+            movements = {}
+            for item in items:
                 try:
-                    item = InvestmentItem.objects.filter(name=item_name).first()
-                    feed = RealTimePriceFeed.objects.filter(symbol=feed_symbol).first()
+                    feed = feeds_by_symbol.get(item_symbols.get(item.pk))
+                    if not feed:
+                        continue
                     
-                    if item and feed:
-                        old_price = item.current_price_usd
-                        new_price = feed.current_price
-                        
-                        if old_price != new_price:
-                            # Calculate price change
-                            price_change = new_price - old_price
-                            price_change_percentage = (price_change / old_price * 100) if old_price > 0 else 0
-                            
-                            # Update item price using enhanced method (round to 2 decimal places)
-                            rounded_price = Decimal(str(round(float(new_price), 2)))
-                            rounded_change = Decimal(str(round(float(price_change), 2)))
-                            rounded_percentage = Decimal(str(round(float(price_change_percentage), 2)))
-                            
-                            item.update_price(
-                                rounded_price,
-                                rounded_change,
-                                rounded_percentage,
-                                volume_24h=feed.volume_24h if hasattr(feed, 'volume_24h') else None,
-                                market_cap=feed.market_cap if hasattr(feed, 'market_cap') else None
-                            )
-                            
-                            logger.info(f"Updated {item_name}: ${new_price} ({price_change_percentage:+.2f}%)")
-                            
-                except Exception as e:
-                    logger.error(f"Error updating {item_name}: {e}")
-                    # Try emergency update with safe values
-                    try:
-                        logger.info(f"🔄 Attempting emergency update for {item_name}...")
-                        item.current_price_usd = new_price
-                        item.price_change_24h = Decimal('0.00')  # Safe value
-                        item.price_change_percentage_24h = Decimal('0.00')  # Safe value
-                        item.last_price_update = timezone.now()
-                        item.save()
-                        logger.info(f"✅ Emergency update successful for {item_name}")
-                    except Exception as emergency_error:
-                        logger.error(f"❌ Emergency update failed for {item_name}: {emergency_error}")
+                    old_price = item.current_price_usd
+                    new_price = Decimal(str(round(float(feed.current_price), 2)))
+                    if old_price == new_price:
+                        continue
+                    
+                    price_change = new_price - old_price
+                    price_change_percentage = (price_change / old_price * 100) if old_price > 0 else Decimal('0')
+                    price_change_percentage = max(min(price_change_percentage, Decimal('999999.99')), Decimal('-999999.99'))
+                    rounded_percentage = Decimal(str(round(float(price_change_percentage), 2)))
+                    movement_type = 'increase' if price_change > 0 else 'decrease'
+                    if not (fits_decimal_field(InvestmentItem, 'current_price_usd', new_price)
+                            and fits_decimal_field(InvestmentItem, 'price_change_24h', price_change)):
+                        raise ValueError(f"price {new_price} (change {price_change}) doesn't fit the price columns")
+                    
+                    item.symbol = item_symbols[item.pk]
+                    item.current_price_usd = new_price
+                    item.price_change_24h = price_change
+                    item.price_change_percentage_24h = rounded_percentage
+                    item.last_price_update = now
+                    item.updated_at = now
+                    changed_items.append(item)
+                    movements[item.pk] = (new_price, movement_type)
                     
+                    history_records.append(PriceHistory(
+                        item=item,
+                        price=new_price,
+                        change_amount=price_change,
+                        change_percentage=rounded_percentage,
+                        movement_type=movement_type,
+                        volume_24h=feed.volume_24h,
+                        market_cap=feed.market_cap,
+                        timestamp=now
+                    ))
+                    
+                except Exception as e:
+                    # One bad feed or item is skipped instead of aborting the whole batch
+                    logger.error(f"Error repricing {item.name}: {e}")
+                    continue
+            
+            if not changed_items:
+                return 0
+            
+            with transaction.atomic():
+                InvestmentItem.objects.bulk_update(changed_items, [
+                    'symbol', 'current_price_usd', 'price_change_24h',
+                    'price_change_percentage_24h', 'last_price_update', 'updated_at'
+                ])
+                PriceHistory.objects.bulk_create(history_records)
+                rolling_price_stats.record_ticks(movements, now)
+            
+            for item in changed_items:
+                logger.info(f"Updated {item.name}: ${item.current_price_usd} ({item.price_change_percentage_24h:+.2f}%)")
+            if publish:
+                price_snapshot.publish()
+            
+            return len(changed_items)
+            
         except Exception as e:
             logger.error(f"Error updating investment item prices: {e}")
+            return 0
     
     def get_price_chart_data(self, item, days=30):
-        """Get price chart data for an item"""
+        """Get price chart data for an item from the OHLCV candle resolution that fits the range"""
         try:
             end_date = timezone.now()
             start_date = end_date - timedelta(days=days)
-            
-            # Get price history for the item's price feed
-            if hasattr(item, 'price_feed') and item.price_feed:
-                history = RealTimePriceHistory.objects.filter(
-                    price_feed=item.price_feed,
-                    timestamp__range=(start_date, end_date)
-                ).order_by('timestamp')
-            else:
+            resolution = resolution_for_range(days)
+            
+            # Prefer the live feed's candles, then the item's own candles
+            symbol = item.symbol or LEGACY_ITEM_FEED_SYMBOLS.get(item.name)
+            feed = RealTimePriceFeed.objects.filter(symbol=symbol).first() if symbol else None
+            candles = []
+            if feed:
+                candles = list(price_rollups.get_candles(start_date, end_date, resolution, price_feed=feed))
+            if not candles:
+                candles = list(price_rollups.get_candles(start_date, end_date, resolution, item=item))
+            
+            if not candles:
                 # Generate simulated data
-                history = self.generate_simulated_price_history(item, start_date, end_date)
+                return self._format_simulated_chart(self.generate_simulated_price_history(item, start_date, end_date))
             
+            label_format = '%Y-%m-%d' if resolution == '1d' else '%Y-%m-%d %H:%M'
             chart_data = {
                 'labels': [],
                 'prices': [],
-                'changes': []
+                'changes': [],
+                'open': [],
+                'high': [],
+                'low': [],
+                'resolution': resolution
             }
             
-            for record in history:
-                # Handle both model instances and dictionary records
-                if hasattr(record, 'timestamp'):
-                    # Real database record
-                    timestamp = record.timestamp
-                    price = record.price
-                    change = record.change_percentage
-                else:
-                    # Simulated dictionary record
-                    timestamp = record['timestamp']
-                    price = record['price']
-                    change = record['change_percentage']
+            previous_close = candles[0].open_price
+            for candle in candles:
+                change = (candle.close_price - previous_close) / previous_close * 100 if previous_close else 0
+                previous_close = candle.close_price
                 
-                chart_data['labels'].append(timestamp.strftime('%Y-%m-%d'))
-                chart_data['prices'].append(float(price))
-                chart_data['changes'].append(float(change))
+                chart_data['labels'].append(candle.bucket_start.strftime(label_format))
+                chart_data['prices'].append(float(candle.close_price))
+                chart_data['changes'].append(round(float(change), 2))
+                chart_data['open'].append(float(candle.open_price))
+                chart_data['high'].append(float(candle.high_price))
+                chart_data['low'].append(float(candle.low_price))
             
             return chart_data
             
@@ -659,6 +693,18 @@ class RealTimePriceService:
             logger.error(f"Error getting chart data: {e}")
             return {'labels': [], 'prices': [], 'changes': []}
     
+    def _format_simulated_chart(self, history):
+        chart_data = {
+            'labels': [],
+            'prices': [],
+            'changes': []
+        }
+        for record in history:
+            chart_data['labels'].append(record['timestamp'].strftime('%Y-%m-%d'))
+            chart_data['prices'].append(float(record['price']))
+            chart_data['changes'].append(float(record['change_percentage']))
+        return chart_data
+    
     def generate_simulated_price_history(self, item, start_date, end_date):
         """Generate simulated price history for items without price feeds"""
         history = []
@@ -695,20 +741,7 @@ def update_real_time_prices():
 def get_live_price_updates():
     """Get live price updates for WebSocket broadcasting"""
     try:
-        feeds = RealTimePriceFeed.objects.filter(is_active=True)
-        updates = []
-        
-        for feed in feeds:
-            updates.append({
-                'symbol': feed.symbol,
-                'name': feed.name,
-                'price': float(feed.current_price),
-                'change_24h': float(feed.price_change_24h),
-                'change_percentage': float(feed.price_change_percentage_24h),
-                'last_updated': feed.last_updated.isoformat() if feed.last_updated else None
-            })
-        
-        return updates
+        return price_snapshot.get().updates
         
     except Exception as e:
         logger.error(f"Error getting live price updates: {e}")
@@ -0,0 +1,396 @@
+"""
+Shared snapshot of live price payloads.
+
+The ingestion path builds one snapshot per update cycle and publishes it to the
+shared cache (Redis in production) under a new version number. Every worker
+keeps a local copy and only re-reads the shared blob when the published
+version changes, so live price endpoints and websocket connections are served
+without touching the database.
+
+Each published version also records which entries changed since the previous
+version, so websocket clients that track the sequence number receive only the
+moved prices and fall back to a full snapshot when they miss a version.
+"""
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import InvestmentItem, RealTimePriceFeed
+
+logger = logging.getLogger(__name__)
+
+# Fields compared between versions to decide whether an entry moved
+PRICE_FIELDS = ('current_price', 'price_change_24h', 'price_change_percentage_24h')
+
+# Longest run of missed versions replayed as deltas before sending a full snapshot
+MAX_REPLAY = 20
+
+
+def entry_key(entry):
+    """Stable identity of a price_data entry across versions"""
+    if entry.get('item_id') is not None:
+        return f"item:{entry['item_id']}"
+    return f"feed:{entry['symbol']}"
+
+
+def movement_stats(price_data):
+    """Count rising, falling and flat entries"""
+    increases = decreases = unchanged = 0
+    for price in price_data:
+        change = price.get('price_change_percentage_24h', 0)
+        if change > 0:
+            increases += 1
+        elif change < 0:
+            decreases += 1
+        else:
+            unchanged += 1
+    return {
+        'increases': increases,
+        'decreases': decreases,
+        'unchanged': unchanged,
+        'total': increases + decreases
+    }
+
+
+def diff_price_data(previous, current):
+    """Entries of current whose price moved since previous, and keys that disappeared"""
+    previous_by_key = {entry['key']: entry for entry in previous}
+    changed = []
+    for entry in current:
+        old = previous_by_key.pop(entry['key'], None)
+        if old is None or any(old.get(field) != entry.get(field) for field in PRICE_FIELDS):
+            changed.append(entry)
+    return changed, list(previous_by_key)
+
+
+def _feed_entry(feed):
+    return {
+        'symbol': feed.symbol,
+        'name': feed.name,
+        'current_price': float(feed.current_price),
+        'price_change_24h': float(feed.price_change_24h),
+        'price_change_percentage_24h': float(feed.price_change_percentage_24h),
+        'last_updated': feed.last_updated.isoformat() if feed.last_updated else None,
+        'source': 'price_feed'
+    }
+
+
+def _item_entry(item, feed=None):
+    entry = {
+        'symbol': item.symbol,
+        'name': item.name,
+        'item_id': item.id,
+        'minimum_investment': float(item.minimum_investment) if item.minimum_investment else None,
+        'investment_type': item.investment_type
+    }
+    if feed:
+        # Use price feed data for real-time updates
+        entry.update({
+            'symbol': item.symbol or feed.symbol,
+            'current_price': float(feed.current_price),
+            'price_change_24h': float(feed.price_change_24h),
+            'price_change_percentage_24h': float(feed.price_change_percentage_24h),
+            'last_updated': feed.last_updated.isoformat() if feed.last_updated else None,
+            'source': 'investment_item'
+        })
+    else:
+        last_updated = item.last_price_update or item.updated_at
+        entry.update({
+            'current_price': float(item.current_price_usd),
+            'price_change_24h': float(item.price_change_24h) if item.price_change_24h else 0,
+            'price_change_percentage_24h': float(item.price_change_percentage_24h) if item.price_change_percentage_24h else 0,
+            'last_updated': last_updated.isoformat() if last_updated else None,
+            'source': 'investment_item_static'
+        })
+    return entry
+
+
+def delta_message_json(seq, base_seq, changed, removed, stats, timestamp):
+    """Serialize a price_delta message"""
+    return json.dumps({
+        'type': 'price_delta',
+        'seq': seq,
+        'base_seq': base_seq,
+        'prices': changed,
+        'removed': removed,
+        'movement_stats': stats,
+        'update_count': len(changed),
+        'timestamp': timestamp
+    })
+
+
+class PriceSnapshot:
+    """One published version of the live price payloads"""
+
+    def __init__(self, version, data):
+        self.version = version
+        self.data = data
+        self._live_prices_json = None
+        self._message_json = {}
+
+    @property
+    def base_version(self):
+        """Version the recorded changes are relative to (None for the first version)"""
+        return self.data.get('base_version')
+
+    @property
+    def changed(self):
+        return self.data.get('changed', [])
+
+    @property
+    def removed(self):
+        return self.data.get('removed', [])
+
+    @property
+    def movement_stats(self):
+        return self.data.get('movement_stats', {})
+
+    @property
+    def timestamp(self):
+        return self.data['timestamp']
+
+    @property
+    def price_data(self):
+        """Feeds plus investable items, as sent by PriceFeedConsumer"""
+        return self.data['price_data']
+
+    @property
+    def live_prices(self):
+        """Feeds plus items without a feed, as served by LivePricesView"""
+        return self.data['live_prices']
+
+    @property
+    def updates(self):
+        """Feed-only updates, as broadcast over websockets"""
+        return self.data['updates']
+
+    @property
+    def live_prices_json(self):
+        """Pre-serialized LivePricesView body, encoded once per version"""
+        if self._live_prices_json is None:
+            self._live_prices_json = json.dumps({
+                'prices': self.live_prices,
+                'total_items': len(self.live_prices),
+                'timestamp': self.timestamp
+            })
+        return self._live_prices_json
+
+    def full_message_json(self):
+        """Pre-serialized full snapshot message, encoded once per version"""
+        if 'price_data' not in self._message_json:
+            self._message_json['price_data'] = json.dumps({
+                'type': 'price_data',
+                'seq': self.version,
+                'prices': self.price_data,
+                'movement_stats': self.movement_stats,
+                'update_count': len(self.price_data),
+                'timestamp': self.timestamp,
+                'total_items': len(self.price_data)
+            })
+        return self._message_json['price_data']
+
+    @property
+    def update_message_json(self):
+        """Pre-serialized legacy price_update message (feed updates under price_data) for clients without the delta protocol"""
+        if 'price_update' not in self._message_json:
+            self._message_json['price_update'] = json.dumps({
+                'type': 'price_update',
+                'price_data': self.updates,
+                'movement_stats': self.movement_stats,
+                'update_count': len(self.updates),
+                'timestamp': self.timestamp,
+                'total_items': len(self.updates)
+            })
+        return self._message_json['price_update']
+
+    @property
+    def delta_message_json(self):
+        """Pre-serialized delta message against base_version"""
+        if 'price_delta' not in self._message_json:
+            self._message_json['price_delta'] = delta_message_json(
+                self.version, self.base_version, self.changed, self.removed, self.movement_stats, self.timestamp
+            )
+        return self._message_json['price_delta']
+
+
+class PriceSnapshotCache:
+    """Builds, publishes and serves versioned price snapshots"""
+
+    SEQUENCE_KEY = 'investments:price_snapshot:sequence'
+    VERSION_KEY = 'investments:price_snapshot:version'
+    DATA_KEY = 'investments:price_snapshot:data:{version}'
+
+    def __init__(self, check_interval=None, ttl=None):
+        # How often a worker asks the shared cache whether a newer version exists
+        self.check_interval = check_interval if check_interval is not None else getattr(settings, 'PRICE_SNAPSHOT_CHECK_INTERVAL', 1.0)
+        self.ttl = ttl or getattr(settings, 'PRICE_SNAPSHOT_TTL', 3600)
+        self._local = None
+        self._checked_at = 0.0
+
+    def build(self):
+        """Build the snapshot payload with two queries and O(n) feed matching"""
+        feeds = list(RealTimePriceFeed.objects.filter(is_active=True))
+        items = list(InvestmentItem.objects.filter(is_active=True))
+
+        feeds_by_name = {}
+        feeds_by_symbol = {}
+        for feed in feeds:
+            feeds_by_name.setdefault(feed.name, feed)
+            if feed.symbol:
+                feeds_by_symbol.setdefault(feed.symbol, feed)
+
+        feed_entries = [_feed_entry(feed) for feed in feeds]
+
+        price_data = [dict(entry, key=entry_key(entry)) for entry in feed_entries]
+        live_prices = list(feed_entries)
+        for item in items:
+            feed = feeds_by_name.get(item.name) or (feeds_by_symbol.get(item.symbol) if item.symbol else None)
+            entry = _item_entry(item, feed)
+            entry['key'] = entry_key(entry)
+            price_data.append(entry)
+
+            # LivePricesView lists items only when no feed carries the same name
+            if item.name not in feeds_by_name:
+                live_prices.append({
+                    'symbol': item.symbol,
+                    'name': item.name,
+                    'current_price': float(item.current_price_usd),
+                    'price_change_24h': float(item.price_change_24h),
+                    'price_change_percentage_24h': float(item.price_change_percentage_24h),
+                    'last_updated': item.last_price_update.isoformat() if item.last_price_update else None,
+                    'source': 'investment_item'
+                })
+
+        updates = [{
+            'symbol': entry['symbol'],
+            'name': entry['name'],
+            'price': entry['current_price'],
+            'change_24h': entry['price_change_24h'],
+            'change_percentage': entry['price_change_percentage_24h'],
+            'last_updated': entry['last_updated']
+        } for entry in feed_entries]
+
+        return {
+            'timestamp': timezone.now().isoformat(),
+            'price_data': price_data,
+            'live_prices': live_prices,
+            'updates': updates,
+            'movement_stats': movement_stats(price_data)
+        }
+
+    def _current_shared(self):
+        """Currently published snapshot, preferring the local copy"""
+        version = cache.get(self.VERSION_KEY)
+        if version is None:
+            return None
+        local = self._local
+        if local is not None and local.version == version:
+            return local
+        blob = cache.get(self.DATA_KEY.format(version=version))
+        return PriceSnapshot(version, json.loads(blob)) if blob is not None else None
+
+    def publish(self):
+        """Build a new snapshot and make it the current version everywhere"""
+        data = self.build()
+        version = None
+        try:
+            previous = self._current_shared()
+            if previous is not None:
+                data['base_version'] = previous.version
+                data['changed'], data['removed'] = diff_price_data(previous.price_data, data['price_data'])
+            
+            cache.add(self.SEQUENCE_KEY, 0, None)
+            version = cache.incr(self.SEQUENCE_KEY)
+            # Store the blob before pointing readers at it
+            cache.set(self.DATA_KEY.format(version=version), json.dumps(data), self.ttl)
+            cache.set(self.VERSION_KEY, version, None)
+        except Exception as e:
+            logger.warning(f"Could not publish price snapshot to shared cache: {e}")
+
+        self._local = PriceSnapshot(version, data)
+        self._checked_at = time.monotonic()
+        return self._local
+
+    def publish_on_commit(self):
+        """Publish a new version once the surrounding transaction commits; many edits in one transaction publish once"""
+        connection = transaction.get_connection()
+        if any(callback == self._publish_after_commit for _, callback, *_ in connection.run_on_commit):
+            return
+        transaction.on_commit(self._publish_after_commit)
+
+    def _publish_after_commit(self):
+        try:
+            self.publish()
+        except Exception as e:
+            logger.error(f"Could not publish price snapshot after edit: {e}")
+
+    def get(self, min_version=None):
+        """Current snapshot, from the local copy whenever its version is still current"""
+        local = self._local
+        now = time.monotonic()
+        fresh_enough = min_version is None or (local is not None and local.version is not None and local.version >= min_version)
+        if local is not None and fresh_enough and now - self._checked_at < self.check_interval:
+            return local
+
+        try:
+            version = cache.get(self.VERSION_KEY)
+            if version is not None:
+                if local is not None and local.version == version:
+                    self._checked_at = now
+                    return local
+                blob = cache.get(self.DATA_KEY.format(version=version))
+                if blob is not None:
+                    self._local = PriceSnapshot(version, json.loads(blob))
+                    self._checked_at = now
+                    return self._local
+        except Exception as e:
+            logger.warning(f"Could not read price snapshot from shared cache: {e}")
+
+        # Nothing published yet (cold start or expired): build it once and share it
+        return self.publish()
+
+    def catch_up_message_json(self, last_seq):
+        """Message bringing a client at last_seq up to date: deltas when the chain is intact, else a full snapshot"""
+        current = self.get()
+        if last_seq is None or current.version is None or last_seq > current.version:
+            return current.full_message_json()
+        if last_seq == current.version:
+            return None
+        if current.version - last_seq > MAX_REPLAY:
+            return current.full_message_json()
+
+        # Walk back from the current version to last_seq, merging changes oldest first
+        chain = [current]
+        try:
+            while chain[-1].base_version is not None and chain[-1].base_version > last_seq:
+                blob = cache.get(self.DATA_KEY.format(version=chain[-1].base_version))
+                if blob is None:
+                    break
+                chain.append(PriceSnapshot(chain[-1].base_version, json.loads(blob)))
+        except Exception as e:
+            logger.warning(f"Could not replay price snapshot versions: {e}")
+            return current.full_message_json()
+
+        if chain[-1].base_version != last_seq:
+            return current.full_message_json()
+
+        changed, removed = {}, set()
+        for snapshot in reversed(chain):
+            for key in snapshot.removed:
+                changed.pop(key, None)
+                removed.add(key)
+            for entry in snapshot.changed:
+                changed[entry['key']] = entry
+                removed.discard(entry['key'])
+        return delta_message_json(
+            current.version, last_seq, list(changed.values()), sorted(removed), current.movement_stats, current.timestamp
+        )
+
+
+# Global instance
+price_snapshot = PriceSnapshotCache()
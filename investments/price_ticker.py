@@ -0,0 +1,144 @@
+"""
+Singleton price ticker.
+
+Exactly one process at a time holds the ticker lease in Redis and is allowed
+to pull upstream prices, write them and announce the new snapshot on the
+price_feeds channel group. Every other process (ASGI workers, Celery workers,
+management commands) only renews its candidacy, so upstream request volume
+does not depend on how many websockets are connected. The lease is taken with
+SET NX and renewed or released with compare-and-set scripts, so a process
+can only extend or drop a lease it still owns.
+
+Leader election needs Redis (REDIS_URL). Without it there is nothing shared
+to elect through, and every process runs its own ticker.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PriceTicker:
+    """Leader-elected writer of live prices"""
+
+    LEADER_KEY = 'investments:price_ticker:leader'
+
+    # Extend or delete the lease only while it still holds this instance's id
+    RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+    RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+    def __init__(self, interval=None):
+        self.interval = interval or getattr(settings, 'PRICE_TICKER_INTERVAL', 60)
+        # The lease outlives a couple of missed ticks so a slow cycle doesn't flap leadership
+        self.lease = max(self.interval * 3, 30)
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task = None
+        self._redis = None
+        self._warned_unshared = False
+
+    def _get_redis(self):
+        redis_url = getattr(settings, 'REDIS_URL', None) or os.environ.get('REDIS_URL')
+        if not redis_url:
+            return None
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url)
+        return self._redis
+
+    def acquire_leadership(self):
+        """Take or renew the ticker lease; True when this process is the leader"""
+        try:
+            client = self._get_redis()
+            if client is None:
+                if not self._warned_unshared:
+                    logger.warning(f"No REDIS_URL for price ticker leader election; {self.instance_id} runs its own ticker")
+                    self._warned_unshared = True
+                return True
+            if client.set(self.LEADER_KEY, self.instance_id, nx=True, ex=self.lease):
+                logger.info(f"Price ticker leadership acquired by {self.instance_id}")
+                return True
+            return bool(client.eval(self.RENEW_SCRIPT, 1, self.LEADER_KEY, self.instance_id, self.lease))
+        except Exception as e:
+            logger.warning(f"Price ticker leader election failed: {e}")
+            return False
+
+    def release_leadership(self):
+        try:
+            client = self._get_redis()
+            if client is not None:
+                client.eval(self.RELEASE_SCRIPT, 1, self.LEADER_KEY, self.instance_id)
+        except Exception as e:
+            logger.warning(f"Could not release price ticker leadership: {e}")
+
+    def tick(self):
+        """One update cycle: fetch, write, publish the snapshot, fan it out and queue revaluation"""
+        from .price_services import price_service
+        from .tasks import broadcast_price_updates, update_user_portfolio_values
+
+        updated_count = price_service.update_all_prices()
+        broadcast_price_updates()
+        if updated_count:
+            try:
+                update_user_portfolio_values.delay()
+            except Exception as e:
+                logger.warning(f"Could not queue portfolio revaluation: {e}")
+        return updated_count
+
+    def tick_if_leader(self):
+        """Run one cycle when holding the lease; None when another process is the leader"""
+        if not self.acquire_leadership():
+            return None
+        try:
+            return self.tick()
+        except Exception as e:
+            logger.error(f"Price ticker cycle failed: {e}")
+            return 0
+
+    def run_forever(self):
+        """Blocking loop for a dedicated ticker process"""
+        try:
+            while True:
+                started = time.monotonic()
+                self.tick_if_leader()
+                time.sleep(max(self.interval - (time.monotonic() - started), 1))
+        finally:
+            self.release_leadership()
+
+    async def run_async(self):
+        """Ticker loop inside an ASGI worker's event loop"""
+        while True:
+            try:
+                await sync_to_async(self.tick_if_leader, thread_sensitive=False)()
+            except Exception as e:
+                logger.error(f"Error in price ticker loop: {e}")
+            await asyncio.sleep(self.interval)
+
+    def ensure_started(self):
+        """Start the in-process ticker candidate once per ASGI worker"""
+        if not getattr(settings, 'PRICE_TICKER_IN_ASGI', True):
+            return
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self.run_async())
+            logger.info(f"Price ticker candidate started in {self.instance_id}")
+
+
+# Global instance
+price_ticker = PriceTicker()
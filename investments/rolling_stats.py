@@ -0,0 +1,251 @@
+"""
+Rolling-window price statistics for investment items.
+
+Each price tick is folded into an hourly PriceStatsBucket and into running
+totals for the 24h, 7d and 30d windows (PriceRollingWindow) in O(1). Once an
+hour, expire() subtracts buckets that have left each window, so reads never
+have to aggregate PriceHistory.
+
+Every read-modify-write happens on rows locked with SELECT ... FOR UPDATE,
+always in the same order (buckets, then windows by item and window, then
+today's PriceMovementStats), so concurrent writers queue instead of losing
+increments.
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+
+from .models import PriceMovementStats, PriceRollingWindow, PriceStatsBucket
+
+logger = logging.getLogger(__name__)
+
+WINDOWS = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+}
+
+BUCKET_SIZE = timedelta(hours=1)
+
+MOVEMENT_FIELDS = {
+    'increase': 'increases',
+    'decrease': 'decreases',
+    'unchanged': 'unchanged',
+}
+
+TOTAL_FIELDS = ['price_sum', 'price_count', 'price_min', 'price_max', 'increases', 'decreases', 'unchanged']
+
+
+def bucket_start(moment):
+    """Start of the hourly bucket containing moment"""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def window_cutoff(moment, length):
+    """Earliest bucket start still inside a window ending at moment"""
+    return bucket_start(moment) - length + BUCKET_SIZE
+
+
+def _add_tick(totals, price, movement_type):
+    totals.price_sum += price
+    totals.price_count += 1
+    if totals.price_min is None or price < totals.price_min:
+        totals.price_min = price
+    if totals.price_max is None or price > totals.price_max:
+        totals.price_max = price
+    field = MOVEMENT_FIELDS.get(movement_type, 'unchanged')
+    setattr(totals, field, getattr(totals, field) + 1)
+
+
+class RollingPriceStatistics:
+    """Maintains hourly buckets, rolling windows and today's PriceMovementStats"""
+
+    def record_ticks(self, ticks, now=None):
+        """Fold {item_id: (price, movement_type)} into buckets, windows and today's stats"""
+        if not ticks:
+            return
+        now = now or timezone.now()
+        ticks = {item_id: (Decimal(str(price)), movement) for item_id, (price, movement) in ticks.items()}
+
+        with transaction.atomic():
+            self._record_buckets(ticks, bucket_start(now))
+            windows = self._record_windows(ticks, now)
+            self._sync_movement_stats(windows, now.date(), ticks)
+
+    def _record_buckets(self, ticks, start):
+        # Create missing buckets empty so every one can be locked before it is read
+        PriceStatsBucket.objects.bulk_create(
+            [PriceStatsBucket(item_id=item_id, bucket_start=start) for item_id in ticks],
+            ignore_conflicts=True
+        )
+        buckets = list(PriceStatsBucket.objects.select_for_update().filter(
+            item_id__in=ticks, bucket_start=start
+        ).order_by('item_id'))
+        for bucket in buckets:
+            _add_tick(bucket, *ticks[bucket.item_id])
+        PriceStatsBucket.objects.bulk_update(buckets, TOTAL_FIELDS)
+
+    def _record_windows(self, ticks, now):
+        """Apply ticks to each window; windows seen for the first time are seeded from buckets"""
+        windows = {}
+        for window in self._lock_windows(item_id__in=ticks):
+            windows.setdefault(window.item_id, {})[window.window] = window
+
+        touched = []
+        for item_id, (price, movement_type) in ticks.items():
+            for name in WINDOWS:
+                window = windows.get(item_id, {}).get(name)
+                if window is not None:
+                    _add_tick(window, price, movement_type)
+                    # bulk_update doesn't apply auto_now
+                    window.last_updated = now
+                    touched.append(window)
+        if touched:
+            PriceRollingWindow.objects.bulk_update(touched, TOTAL_FIELDS + ['last_updated'])
+
+        missing = [item_id for item_id in ticks if len(windows.get(item_id, {})) < len(WINDOWS)]
+        if missing:
+            for window in self._seed_windows(missing, now):
+                windows.setdefault(window.item_id, {})[window.window] = window
+        return windows
+
+    def _lock_windows(self, **lookup):
+        """Windows matching lookup, locked in (item, window) order"""
+        return PriceRollingWindow.objects.select_for_update().filter(**lookup).order_by('item_id', 'window')
+
+    def _seed_windows(self, item_ids, now):
+        """Build missing window rows from the buckets already recorded (which include this tick)"""
+        have = set(PriceRollingWindow.objects.filter(item_id__in=item_ids).values_list('item_id', 'window'))
+        created = []
+        for name, length in WINDOWS.items():
+            cutoff = window_cutoff(now, length)
+            totals = PriceStatsBucket.objects.filter(
+                item_id__in=item_ids, bucket_start__gte=cutoff
+            ).values('item_id').annotate(
+                sum_price=Sum('price_sum'), sum_count=Sum('price_count'),
+                min_price=Min('price_min'), max_price=Max('price_max'),
+                sum_increases=Sum('increases'), sum_decreases=Sum('decreases'),
+                sum_unchanged=Sum('unchanged'),
+            )
+            for row in totals:
+                if (row['item_id'], name) in have:
+                    continue
+                created.append(PriceRollingWindow(
+                    item_id=row['item_id'],
+                    window=name,
+                    price_sum=row['sum_price'] or 0,
+                    price_count=row['sum_count'] or 0,
+                    price_min=row['min_price'],
+                    price_max=row['max_price'],
+                    increases=row['sum_increases'] or 0,
+                    decreases=row['sum_decreases'] or 0,
+                    unchanged=row['sum_unchanged'] or 0,
+                    expired_before=cutoff,
+                ))
+        PriceRollingWindow.objects.bulk_create(created, ignore_conflicts=True)
+        return created
+
+    def _sync_movement_stats(self, windows, today, ticks=None):
+        """Mirror window totals onto today's PriceMovementStats rows, counting any new ticks"""
+        item_ids = list(windows)
+        existing = set(PriceMovementStats.objects.filter(
+            item_id__in=item_ids, date=today
+        ).values_list('item_id', flat=True))
+        PriceMovementStats.objects.bulk_create(
+            [PriceMovementStats(item_id=item_id, date=today) for item_id in item_ids if item_id not in existing],
+            ignore_conflicts=True
+        )
+
+        stats_rows = list(PriceMovementStats.objects.select_for_update().filter(
+            item_id__in=item_ids, date=today
+        ).order_by('item_id'))
+        for stats in stats_rows:
+            if ticks and stats.item_id in ticks:
+                stats.count_movement(ticks[stats.item_id][1])
+            stats.apply_rolling_windows(windows.get(stats.item_id, {}))
+
+        PriceMovementStats.objects.bulk_update(stats_rows, [
+            'increases_today', 'decreases_today', 'unchanged_today',
+            'increases_this_week', 'decreases_this_week', 'unchanged_this_week',
+            'increases_this_month', 'decreases_this_month', 'unchanged_this_month',
+            'highest_price_24h', 'lowest_price_24h', 'average_price_24h', 'last_updated'
+        ])
+
+    def expire(self, now=None):
+        """Subtract buckets that have left their windows and drop buckets older than every window"""
+        now = now or timezone.now()
+        expired_count = 0
+
+        with transaction.atomic():
+            # Lock every window up front, in the same order record_ticks uses
+            list(self._lock_windows())
+            for name, length in WINDOWS.items():
+                expired_count += self._expire_window(name, window_cutoff(now, length), now)
+
+            oldest_cutoff = window_cutoff(now, max(WINDOWS.values()))
+            PriceStatsBucket.objects.filter(bucket_start__lt=oldest_cutoff).delete()
+
+            windows = {}
+            for window in PriceRollingWindow.objects.all():
+                windows.setdefault(window.item_id, {})[window.window] = window
+            if windows:
+                self._sync_movement_stats(windows, now.date())
+
+        logger.info(f"Expired {expired_count} price statistics buckets from rolling windows")
+        return expired_count
+
+    def _expire_window(self, name, cutoff, now):
+        stale = {
+            window.item_id: window
+            for window in PriceRollingWindow.objects.filter(window=name, expired_before__lt=cutoff)
+        }
+        if not stale:
+            return 0
+
+        oldest = min(window.expired_before for window in stale.values())
+        expired = PriceStatsBucket.objects.filter(
+            item_id__in=stale, bucket_start__gte=oldest, bucket_start__lt=cutoff
+        )
+
+        expired_count = 0
+        needs_extremes = set()
+        for bucket in expired:
+            window = stale[bucket.item_id]
+            if bucket.bucket_start < window.expired_before:
+                continue
+            window.price_sum -= bucket.price_sum
+            window.price_count = max(window.price_count - bucket.price_count, 0)
+            for field in ('increases', 'decreases', 'unchanged'):
+                setattr(window, field, max(getattr(window, field) - getattr(bucket, field), 0))
+            # Min/max cannot be subtracted; recompute only when the expired bucket held them
+            if bucket.price_min == window.price_min or bucket.price_max == window.price_max:
+                needs_extremes.add(bucket.item_id)
+            expired_count += 1
+
+        if needs_extremes:
+            extremes = {
+                row['item_id']: row
+                for row in PriceStatsBucket.objects.filter(
+                    item_id__in=needs_extremes, bucket_start__gte=cutoff
+                ).values('item_id').annotate(min_price=Min('price_min'), max_price=Max('price_max'))
+            }
+            for item_id in needs_extremes:
+                row = extremes.get(item_id, {})
+                stale[item_id].price_min = row.get('min_price')
+                stale[item_id].price_max = row.get('max_price')
+
+        for window in stale.values():
+            window.expired_before = cutoff
+            window.last_updated = now
+            if not window.price_count:
+                window.price_sum = 0
+        PriceRollingWindow.objects.bulk_update(stale.values(), TOTAL_FIELDS + ['expired_before', 'last_updated'])
+        return expired_count
+
+
+# Global instance
+rolling_price_stats = RollingPriceStatistics()
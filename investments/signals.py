@@ -1,40 +1,81 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import UserInvestment, InvestmentTransaction, InvestmentPortfolio
+import threading
+from contextlib import contextmanager
+
+from .models import UserInvestment, InvestmentTransaction, InvestmentPortfolio, InvestmentItem, RealTimePriceFeed
+
+_suppressed = threading.local()
+
+
+@contextmanager
+def suppress_portfolio_signals():
+    """Skip per-save portfolio recomputation while a bulk job refreshes portfolios itself"""
+    previous = getattr(_suppressed, 'active', False)
+    _suppressed.active = True
+    try:
+        yield
+    finally:
+        _suppressed.active = previous
+
+
+def portfolio_signals_suppressed():
+    return getattr(_suppressed, 'active', False)
 
 
 @receiver(post_save, sender=UserInvestment)
 def update_portfolio_on_investment_change(sender, instance, created, **kwargs):
-    """Update user portfolio when investment changes"""
+    """Mark the user's portfolio for recomputation when an investment changes"""
+    if portfolio_signals_suppressed():
+        return
     try:
-        if hasattr(instance.user, 'investment_portfolio'):
-            instance.user.investment_portfolio.update_portfolio_summary()
+        from .portfolio_valuation import dirty_portfolios
+        dirty_portfolios.mark(instance.user_id)
     except Exception as e:
         # Log error but don't fail the save operation
         import logging
         logger = logging.getLogger(__name__)
-        logger.error(f"Failed to update portfolio: {e}")
+        logger.error(f"Failed to mark portfolio dirty: {e}")
 
 
 @receiver(post_delete, sender=UserInvestment)
 def update_portfolio_on_investment_delete(sender, instance, **kwargs):
-    """Update user portfolio when investment is deleted"""
+    """Mark the user's portfolio for recomputation when an investment is deleted"""
+    if portfolio_signals_suppressed():
+        return
     try:
-        if hasattr(instance.user, 'investment_portfolio'):
-            instance.user.investment_portfolio.update_portfolio_summary()
+        from .portfolio_valuation import dirty_portfolios
+        dirty_portfolios.mark(instance.user_id)
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
-        logger.error(f"Failed to update portfolio after deletion: {e}")
+        logger.error(f"Failed to mark portfolio dirty after deletion: {e}")
 
 
 @receiver(post_save, sender=InvestmentTransaction)
 def update_portfolio_on_transaction_change(sender, instance, created, **kwargs):
-    """Update user portfolio when transaction changes"""
+    """Mark the user's portfolio for recomputation when a transaction changes"""
+    if portfolio_signals_suppressed():
+        return
+    try:
+        from .portfolio_valuation import dirty_portfolios
+        dirty_portfolios.mark(instance.user_id)
+    except Exception as e:
+        import logging
+        logger = logging.getLogger(__name__)
+        logger.error(f"Failed to mark portfolio dirty after transaction: {e}")
+
+
+@receiver(post_save, sender=InvestmentItem)
+@receiver(post_delete, sender=InvestmentItem)
+@receiver(post_save, sender=RealTimePriceFeed)
+@receiver(post_delete, sender=RealTimePriceFeed)
+def publish_price_snapshot(sender, instance, **kwargs):
+    """Publish a fresh live price snapshot once an item or feed edit commits"""
     try:
-        if hasattr(instance.user, 'investment_portfolio'):
-            instance.user.investment_portfolio.update_portfolio_summary()
+        from .price_snapshot import price_snapshot
+        price_snapshot.publish_on_commit()
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
-        logger.error(f"Failed to update portfolio after transaction: {e}")
+        logger.error(f"Failed to schedule price snapshot publish: {e}")
@@ -6,7 +6,7 @@ import json
 import logging
 
 from .models import RealTimePriceFeed, InvestmentItem
-from .price_services import price_service, get_live_price_updates
+from .price_services import price_service
 
 logger = logging.getLogger(__name__)
 
@@ -14,25 +14,15 @@ logger = logging.getLogger(__name__)
 def update_real_time_prices():
     """Update real-time prices and broadcast updates"""
     try:
-        # Update all prices
-        updated_count = price_service.update_all_prices()
+        from .price_ticker import price_ticker
+        
+        # Only the ticker leader writes prices and broadcasts the new snapshot
+        updated_count = price_ticker.tick_if_leader()
+        if updated_count is None:
+            logger.info("Price ticker leader is another process - skipping update")
+            return 0
         
         if updated_count > 0:
-            # Get live price updates for broadcasting
-            price_updates = get_live_price_updates()
-            
-            # Try to broadcast updates via WebSocket (non-blocking)
-            try:
-                broadcast_price_updates(price_updates)
-            except Exception as ws_error:
-                logger.warning(f"WebSocket broadcast failed: {ws_error}")
-            
-            # Update user portfolio values
-            try:
-                update_user_portfolio_values.delay()
-            except Exception as portfolio_error:
-                logger.warning(f"Portfolio update failed: {portfolio_error}")
-            
             logger.info(f"Updated {updated_count} prices")
         
         return updated_count
@@ -46,37 +36,10 @@ def update_real_time_prices():
 def update_user_portfolio_values():
     """Update all user portfolio values based on current prices"""
     try:
-        from .models import UserInvestment, InvestmentPortfolio
-        
-        # Get all active investments
-        active_investments = UserInvestment.objects.filter(status='active')
-        updated_count = 0
+        from .portfolio_valuation import portfolio_revaluation
         
-        for investment in active_investments:
-            try:
-                # Calculate current value based on latest item price
-                current_value = investment.quantity * investment.item.current_price_usd
-                total_return = current_value - investment.investment_amount_usd
-                total_return_percentage = (total_return / investment.investment_amount_usd * 100) if investment.investment_amount_usd > 0 else 0
-                
-                # Update investment values
-                investment.current_value_usd = current_value
-                investment.total_return_usd = total_return
-                investment.total_return_percentage = total_return_percentage
-                investment.save()
-                
-                updated_count += 1
-                
-            except Exception as e:
-                logger.error(f"Error updating investment {investment.id}: {e}")
-        
-        # Update portfolio summaries
-        portfolios = InvestmentPortfolio.objects.all()
-        for portfolio in portfolios:
-            try:
-                portfolio.update_portfolio_summary()
-            except Exception as e:
-                logger.error(f"Error updating portfolio {portfolio.id}: {e}")
+        # One joined read + bulk_update for holdings, one aggregate per user batch for portfolios
+        updated_count = portfolio_revaluation.revalue_all()
         
         logger.info(f"Updated {updated_count} user investments")
         return updated_count
@@ -86,22 +49,39 @@ def update_user_portfolio_values():
         return 0
 
 @shared_task
-def broadcast_price_updates(price_updates):
-    """Broadcast price updates to all connected WebSocket clients"""
+def flush_dirty_portfolios():
+    """Recompute portfolios marked dirty by investment and transaction writes"""
+    try:
+        from .portfolio_valuation import dirty_portfolios
+        
+        return dirty_portfolios.flush()
+        
+    except Exception as e:
+        logger.error(f"Error flushing dirty portfolios: {e}")
+        return 0
+
+@shared_task
+def broadcast_price_updates(snapshot=None):
+    """Announce a new price snapshot version to all connected WebSocket clients"""
     try:
         channel_layer = get_channel_layer()
         
         if channel_layer:
-            # Broadcast to price feeds group
+            from .price_snapshot import price_snapshot
+            snapshot = snapshot or price_snapshot.get()
+            
+            # Only the sequence numbers travel through the channel layer; each worker
+            # encodes the delta or full snapshot once from its local copy
             async_to_sync(channel_layer.group_send)(
                 'price_feeds',
                 {
-                    'type': 'price_update',
-                    'price_data': price_updates
+                    'type': 'price_delta',
+                    'seq': snapshot.version,
+                    'base_seq': snapshot.base_version
                 }
             )
             
-            logger.info(f"Broadcasted {len(price_updates)} price updates")
+            logger.info(f"Broadcasted price snapshot {snapshot.version} ({len(snapshot.changed)} changed)")
         else:
             logger.warning("Channel layer not available - skipping WebSocket broadcast")
         
@@ -113,75 +93,62 @@ def broadcast_price_updates(price_updates):
 def update_investment_item_prices():
     """Update investment item prices based on price feeds"""
     try:
-        # Map investment items to price feeds
-        item_feed_mapping = {
-            'Bitcoin (BTC)': 'BTC',
-            'Ethereum (ETH)': 'ETH',
-            'Cardano (ADA)': 'ADA',
-            'Gold Bullion (1 oz)': 'XAU',
-            'Silver Bullion (1 oz)': 'XAG',
-            'Platinum Bullion (1 oz)': 'XPT',
-        }
+        return price_service.update_investment_item_prices()
         
-        updated_count = 0
-        
-        for item_name, feed_symbol in item_feed_mapping.items():
-            try:
-                item = InvestmentItem.objects.filter(name=item_name).first()
-                feed = RealTimePriceFeed.objects.filter(symbol=feed_symbol).first()
-                
-                if item and feed:
-                    old_price = item.current_price_usd
-                    new_price = feed.current_price
-                    
-                    if old_price != new_price:
-                        # Calculate price change
-                        price_change = new_price - old_price
-                        price_change_percentage = (price_change / old_price * 100) if old_price > 0 else 0
-                        
-                        # Update item price
-                        item.current_price_usd = new_price
-                        item.price_change_24h = price_change
-                        item.price_change_percentage_24h = price_change_percentage
-                        item.last_price_update = timezone.now()
-                        item.save()
-                        
-                        updated_count += 1
-                        logger.info(f"Updated {item_name}: ${new_price} ({price_change_percentage:+.2f}%)")
-                        
-            except Exception as e:
-                logger.error(f"Error updating {item_name}: {e}")
+    except Exception as e:
+        logger.error(f"Error updating investment item prices: {e}")
+        return 0
+
+@shared_task
+def rollup_price_candles():
+    """Roll raw price ticks into 1m/1h/1d OHLCV candles"""
+    try:
+        from .price_rollups import price_rollups
         
-        return updated_count
+        written = price_rollups.rollup()
+        logger.info(f"Rolled up {written} price candles")
+        return written
         
     except Exception as e:
-        logger.error(f"Error updating investment item prices: {e}")
+        logger.error(f"Error rolling up price candles: {e}")
         return 0
 
+
 @shared_task
 def cleanup_old_price_history():
-    """Clean up old price history records"""
+    """Clean up raw price ticks once they are rolled up, keeping coarse candles"""
     try:
         from .models import PriceHistory, RealTimePriceHistory
+        from .price_rollups import price_rollups
         from datetime import timedelta
         
-        # Keep only last 30 days of price history
-        cutoff_date = timezone.now() - timedelta(days=30)
+        # Make sure every tick is in a candle before the raw rows go
+        try:
+            price_rollups.rollup()
+        except Exception as e:
+            logger.error(f"Price rollup failed, keeping raw price history: {e}")
+            return 0
         
-        # Clean up investment item price history
-        deleted_item_history = PriceHistory.objects.filter(
-            timestamp__lt=cutoff_date
-        ).delete()
+        # Keep only last 30 days of raw price history, and never ticks that aren't in a candle yet
+        cutoff_date = timezone.now() - timedelta(days=30)
+        deleted = {}
+        for source_field, model in (('item', PriceHistory), ('price_feed', RealTimePriceHistory)):
+            rolled_up_before = price_rollups.rolled_up_before(source_field)
+            if rolled_up_before is None:
+                deleted[source_field] = 0
+                continue
+            deleted[source_field] = model.objects.filter(
+                timestamp__lt=min(cutoff_date, rolled_up_before)
+            ).delete()[0]
         
-        # Clean up real-time price feed history
-        deleted_feed_history = RealTimePriceHistory.objects.filter(
-            timestamp__lt=cutoff_date
-        ).delete()
+        # Fine candles expire too; daily candles are kept for long-range charts
+        deleted_candles = price_rollups.prune()
         
-        logger.info(f"Cleaned up {deleted_item_history[0]} item price history records")
-        logger.info(f"Cleaned up {deleted_feed_history[0]} feed price history records")
+        logger.info(f"Cleaned up {deleted['item']} item price history records")
+        logger.info(f"Cleaned up {deleted['price_feed']} feed price history records")
+        logger.info(f"Cleaned up {deleted_candles} expired price candles")
         
-        return deleted_item_history[0] + deleted_feed_history[0]
+        return deleted['item'] + deleted['price_feed'] + deleted_candles
         
     except Exception as e:
         logger.error(f"Error cleaning up price history: {e}")
@@ -265,36 +232,11 @@ def generate_price_alerts():
 
 @shared_task
 def update_price_statistics():
-    """Update daily, weekly, and monthly price statistics"""
+    """Expire hourly buckets that have left the 24h, 7d and 30d rolling windows"""
     try:
-        from .models import PriceMovementStats, InvestmentItem
-        from datetime import timedelta
-        
-        items = InvestmentItem.objects.filter(is_active=True)
-        updated_count = 0
+        from .rolling_stats import rolling_price_stats
         
-        for item in items:
-            try:
-                stats = PriceMovementStats.get_or_create_today_stats(item)
-                
-                # Update weekly and monthly counters
-                # This is a simplified version - in production you'd want more sophisticated logic
-                stats.increases_this_week = stats.increases_today
-                stats.decreases_this_week = stats.decreases_today
-                stats.unchanged_this_week = stats.unchanged_today
-                
-                stats.increases_this_month = stats.increases_today
-                stats.decreases_this_month = stats.decreases_today
-                stats.unchanged_this_month = stats.unchanged_today
-                
-                stats.save()
-                updated_count += 1
-                
-            except Exception as e:
-                logger.error(f"Error updating statistics for {item.name}: {e}")
-        
-        logger.info(f"Updated statistics for {updated_count} items")
-        return updated_count
+        return rolling_price_stats.expire()
         
     except Exception as e:
         logger.error(f"Error updating price statistics: {e}")
@@ -1108,45 +1108,11 @@ class LivePricesView(View):
     
     def get(self, request):
         try:
-            from .models import RealTimePriceFeed
+            from .price_snapshot import price_snapshot
             
-            # Get all active price feeds
-            feeds = RealTimePriceFeed.objects.filter(is_active=True)
-            prices = []
-            
-            for feed in feeds:
-                prices.append({
-                    'symbol': feed.symbol,
-                    'name': feed.name,
-                    'current_price': float(feed.current_price),
-                    'price_change_24h': float(feed.price_change_24h),
-                    'price_change_percentage_24h': float(feed.price_change_percentage_24h),
-                    'last_updated': feed.last_updated.isoformat() if feed.last_updated else None,
-                    'source': 'price_feed'
-                })
-            
-            # Also include investment items that don't have price feeds
-            items = InvestmentItem.objects.filter(is_active=True)
-            for item in items:
-                # Check if we already have this item from price feeds
-                if not any(p['name'] == item.name for p in prices):
-                    prices.append({
-                        'symbol': item.symbol,
-                        'name': item.name,
-                        'current_price': float(item.current_price_usd),
-                        'price_change_24h': float(item.price_change_24h),
-                        'price_change_percentage_24h': float(item.price_change_percentage_24h),
-                        'last_updated': item.last_price_update.isoformat() if item.last_price_update else None,
-                        'source': 'investment_item'
-                    })
-            
-            data = {
-                'prices': prices,
-                'total_items': len(prices),
-                'timestamp': timezone.now().isoformat()
-            }
-            
-            return JsonResponse(data)
+            # Served from the shared snapshot, pre-serialized once per price update
+            snapshot = price_snapshot.get()
+            return HttpResponse(snapshot.live_prices_json, content_type='application/json')
             
         except Exception as e:
             logger.error(f"Error getting live prices: {e}")
@@ -9,7 +9,6 @@ import sys
 import django
 import random
 import time
-import asyncio
 from decimal import Decimal
 
 # Setup Django
@@ -18,7 +17,8 @@ django.setup()
 
 from django.utils import timezone
 from investments.models import RealTimePriceFeed, InvestmentItem
-from investments.consumers import PriceFeedConsumer
+from investments.price_snapshot import price_snapshot
+from investments.tasks import broadcast_price_updates
 
 def simulate_price_updates():
     """Simulate realistic price updates for all assets"""
@@ -72,28 +72,15 @@ def simulate_price_updates():
     
     print("✅ Price simulation completed!")
 
-async def broadcast_updates():
+def broadcast_updates():
     """Broadcast price updates via WebSocket"""
     try:
         print("📡 Broadcasting price updates via WebSocket...")
         
-        # Get updated price data
-        feeds = RealTimePriceFeed.objects.filter(is_active=True)
-        price_data = []
-        
-        for feed in feeds:
-            price_data.append({
-                'symbol': feed.symbol,
-                'name': feed.name,
-                'current_price': float(feed.current_price),
-                'price_change_24h': float(feed.price_change_24h),
-                'price_change_percentage_24h': float(feed.price_change_percentage_24h),
-                'last_updated': feed.last_updated.isoformat() if feed.last_updated else None
-            })
-        
-        # Broadcast to all connected clients
-        await PriceFeedConsumer.broadcast_price_update(price_data)
-        print(f"✅ Broadcasted {len(price_data)} price updates")
+        # Publish a new price snapshot and announce it to all connected clients
+        snapshot = price_snapshot.publish()
+        broadcast_price_updates(snapshot)
+        print(f"✅ Broadcasted {len(snapshot.updates)} price updates")
         
     except Exception as e:
         print(f"❌ Error broadcasting updates: {e}")
@@ -116,7 +103,7 @@ def run_continuous_simulation(interval_seconds=30, max_updates=20):
             
             # Try to broadcast updates
             try:
-                asyncio.run(broadcast_updates())
+                broadcast_updates()
             except Exception as e:
                 print(f"⚠️ Broadcasting failed: {e}")
             
@@ -146,7 +133,7 @@ def main():
         print("🔄 Running single price update...")
         simulate_price_updates()
         try:
-            asyncio.run(broadcast_updates())
+            broadcast_updates()
         except Exception as e:
             print(f"⚠️ Broadcasting failed: {e}")
     else:
@@ -5,6 +5,7 @@ let pickupMarker = null;
 let deliveryMarker = null;
 let deliveryPath = null;
 let websocket = null;
+let routeZoom = null;
 
 // Google Maps initialization
 function initMap() {
@@ -26,9 +27,47 @@ function initMap() {
         ]
     });
     
+    // Ask for a route simplified for the new zoom level
+    map.addListener('zoom_changed', function() {
+        requestRoute(map.getZoom());
+    });
+    
     console.log('✅ Google Maps initialized');
 }
 
+// Request the route polyline for a zoom level
+function requestRoute(zoom) {
+    if (zoom === routeZoom || !websocket || websocket.readyState !== WebSocket.OPEN) return;
+    routeZoom = zoom;
+    websocket.send(JSON.stringify({
+        type: 'get_route',
+        zoom: zoom
+    }));
+}
+
+// Decode a Google encoded polyline into LatLng objects
+function decodePolyline(encoded) {
+    const points = [];
+    let index = 0, lat = 0, lng = 0;
+    
+    while (index < encoded.length) {
+        const deltas = [];
+        for (let i = 0; i < 2; i++) {
+            let result = 0, shift = 0, byte;
+            do {
+                byte = encoded.charCodeAt(index++) - 63;
+                result |= (byte & 0x1f) << shift;
+                shift += 5;
+            } while (byte >= 0x20);
+            deltas.push(result & 1 ? ~(result >> 1) : result >> 1);
+        }
+        lat += deltas[0];
+        lng += deltas[1];
+        points.push(new google.maps.LatLng(lat / 1e5, lng / 1e5));
+    }
+    return points;
+}
+
 // WebSocket connection for real-time updates
 function initWebSocket() {
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
@@ -63,6 +102,12 @@ function initWebSocket() {
                 case 'status_update':
                     handleStatusUpdate(data);
                     break;
+                case 'route':
+                    handleRoute(data.data);
+                    break;
+                case 'eta_update':
+                    handleEtaUpdate(data.eta);
+                    break;
                 case 'error':
                     console.error('❌ WebSocket error:', data.message);
                     break;
@@ -92,6 +137,7 @@ function initWebSocket() {
 function handleTrackingData(data) {
     console.log('📊 Handling tracking data:', data);
     window.trackingData = data;
+    routeZoom = data.route ? data.route.zoom : null;
     
     // Update timeline
     if (typeof updateTimeline === 'function') {
@@ -116,6 +162,38 @@ function handleTrackingData(data) {
     updateGPSStatus();
 }
 
+// Handle a route simplified for the current zoom level
+function handleRoute(route) {
+    if (!window.trackingData) return;
+    window.trackingData.route = route;
+    routeZoom = route.zoom;
+    drawDeliveryPath();
+}
+
+// Handle a new server-side ETA prediction
+function handleEtaUpdate(eta) {
+    if (!window.trackingData) return;
+    window.trackingData.delivery.eta = eta;
+    displayETA(eta);
+}
+
+// Show a server-side ETA prediction
+function displayETA(eta) {
+    const minutesRemaining = Math.max(0, Math.round((new Date(eta.predicted_delivery) - new Date()) / 60000));
+    
+    if (eta.remaining_distance_km !== null) {
+        document.getElementById('distance-display').textContent = `${eta.remaining_distance_km.toFixed(1)} km remaining`;
+    }
+    
+    if (minutesRemaining < 60) {
+        document.getElementById('eta-display').textContent = `~${minutesRemaining} minutes`;
+    } else {
+        const hours = Math.floor(minutesRemaining / 60);
+        const minutes = minutesRemaining % 60;
+        document.getElementById('eta-display').textContent = `~${hours}h ${minutes}m`;
+    }
+}
+
 // Handle location updates from WebSocket
 function handleLocationUpdate(data) {
     console.log('📍 Location update received:', data);
@@ -286,6 +364,32 @@ function drawDeliveryPath() {
     if (!map || !window.trackingData) return;
     
     const delivery = window.trackingData.delivery;
+    const route = window.trackingData.route;
+    
+    if (deliveryPath) deliveryPath.setMap(null);
+    
+    // Travelled route, simplified server-side for the current zoom level
+    if (route && route.polyline) {
+        const pathCoordinates = decodePolyline(route.polyline);
+        if (delivery.delivery_location) {
+            pathCoordinates.push(new google.maps.LatLng(
+                delivery.delivery_location.latitude,
+                delivery.delivery_location.longitude
+            ));
+        }
+        if (pathCoordinates.length > 1) {
+            deliveryPath = new google.maps.Polyline({
+                path: pathCoordinates,
+                geodesic: true,
+                strokeColor: '#3B82F6',
+                strokeOpacity: 0.8,
+                strokeWeight: 4,
+                map: map
+            });
+            return;
+        }
+    }
+    
     const pathCoordinates = [];
     
     // Add pickup location
@@ -359,6 +463,12 @@ function calculateETA(currentLocation) {
     const delivery = window.trackingData?.delivery;
     if (!delivery || !delivery.delivery_location) return;
     
+    // Prefer the server prediction, which uses the courier's actual speed
+    if (delivery.eta) {
+        displayETA(delivery.eta);
+        return;
+    }
+    
     const currentPos = new google.maps.LatLng(
         currentLocation.latitude,
         currentLocation.longitude
@@ -23,6 +23,8 @@ class PriceWebSocketClient {
         };
         
         this.priceData = {};
+        this.priceKeys = {};
+        this.lastSeq = null;
         this.lastUpdate = null;
     }
     
@@ -38,7 +40,8 @@ class PriceWebSocketClient {
         
         try {
             const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-            const wsUrl = `${protocol}//${window.location.host}/ws/price-feeds/`;
+            // delta=1: the server waits for our subscribe instead of pushing a full snapshot
+            const wsUrl = `${protocol}//${window.location.host}/ws/price-feeds/?delta=1`;
             
             this.ws = new WebSocket(wsUrl);
             
@@ -48,10 +51,8 @@ class PriceWebSocketClient {
                 this.log('WebSocket connected');
                 this.triggerCallbacks('onConnect');
                 
-                // Request initial price data
-                this.sendMessage({
-                    type: 'get_prices'
-                });
+                // Resume the delta stream from the last snapshot we saw (a full snapshot the first time)
+                this.subscribe();
             };
             
             this.ws.onmessage = (event) => {
@@ -99,6 +100,19 @@ class PriceWebSocketClient {
             case 'price_data':
             case 'price_update':
                 this.updatePriceData(data.prices);
+                this.lastSeq = data.seq ?? null;
+                break;
+            case 'price_delta':
+                if (data.base_seq !== this.lastSeq) {
+                    // Missed a version: ask for whatever brings us back in sync
+                    this.subscribe();
+                    break;
+                }
+                this.applyPriceDelta(data.prices, data.removed || []);
+                this.lastSeq = data.seq;
+                break;
+            case 'in_sync':
+                this.lastSeq = data.seq;
                 break;
             case 'subscription_confirmed':
                 this.log('Subscription confirmed for:', data.asset_type);
@@ -115,8 +129,11 @@ class PriceWebSocketClient {
         const previousData = { ...this.priceData };
         this.priceData = {};
         
+        this.priceKeys = {};
+        
         prices.forEach(price => {
             this.priceData[price.symbol] = price;
+            this.priceKeys[price.key] = price.symbol;
             
             // Check if price changed
             const previousPrice = previousData[price.symbol];
@@ -136,6 +153,46 @@ class PriceWebSocketClient {
         this.lastUpdate = new Date();
     }
     
+    /**
+     * Apply changed entries and removals from a price_delta message
+     */
+    applyPriceDelta(prices, removed) {
+        removed.forEach(key => {
+            delete this.priceData[this.priceKeys[key]];
+            delete this.priceKeys[key];
+        });
+        
+        prices.forEach(price => {
+            const previousPrice = this.priceData[price.symbol];
+            this.priceData[price.symbol] = price;
+            this.priceKeys[price.key] = price.symbol;
+            
+            if (previousPrice && previousPrice.current_price !== price.current_price) {
+                this.triggerCallbacks('onPriceUpdate', {
+                    symbol: price.symbol,
+                    name: price.name,
+                    oldPrice: previousPrice.current_price,
+                    newPrice: price.current_price,
+                    change: price.current_price - previousPrice.current_price,
+                    changePercent: price.price_change_percentage_24h,
+                    data: price
+                });
+            }
+        });
+        
+        this.lastUpdate = new Date();
+    }
+    
+    /**
+     * Subscribe to the delta stream from the last seen sequence number
+     */
+    subscribe() {
+        this.sendMessage({
+            type: 'subscribe',
+            last_seq: this.lastSeq
+        });
+    }
+    
     /**
      * Send message to WebSocket server
      */
@@ -4,7 +4,10 @@ from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 from .models import Delivery, DeliveryStatus
-from django.utils import timezone
+from .route_geometry import route_geometry
+from .monitoring import FLEET_GROUP, delivery_group, viewport_groups
+from .spatial import delivery_spatial
+from .tracking_document import tracking_documents
 
 logger = logging.getLogger(__name__)
 
@@ -21,14 +24,14 @@ class DeliveryTrackingConsumer(AsyncWebsocketConsumer):
             logger.info(f"🔌 Attempting WebSocket connection for tracking: {self.tracking_number}")
             
             # Verify tracking credentials
-            delivery = await self.get_delivery()
-            if not delivery:
+            document = await self.get_tracking_document()
+            if not document:
                 logger.warning(f"❌ Delivery not found for tracking: {self.tracking_number}")
                 await self.close()
                 return
             
             # Check if tracking link is expired
-            if delivery.is_tracking_link_expired():
+            if tracking_documents.is_expired(document):
                 logger.warning(f"❌ Tracking link expired for: {self.tracking_number}")
                 await self.send(text_data=json.dumps({
                     'type': 'error',
@@ -51,7 +54,10 @@ class DeliveryTrackingConsumer(AsyncWebsocketConsumer):
             await self.accept()
             
             # Send initial tracking data
-            await self.send_initial_data()
+            await self.send(text_data=json.dumps({
+                'type': 'tracking_data',
+                'data': tracking_documents.get_tracking_data(document)
+            }))
             
             logger.info(f"✅ Delivery tracking WebSocket connected: {self.tracking_number}")
             
@@ -79,6 +85,14 @@ class DeliveryTrackingConsumer(AsyncWebsocketConsumer):
             
             if message_type == 'get_tracking_data':
                 await self.send_initial_data()
+            elif message_type == 'get_route':
+                # Map zoomed: resend the route simplified for the new zoom level
+                route = await self.get_route(data.get('zoom'))
+                if route is not None:
+                    await self.send(text_data=json.dumps({
+                        'type': 'route',
+                        'data': route
+                    }))
             elif message_type == 'location_update':
                 # Handle location updates from admin/courier
                 await self.handle_location_update(data)
@@ -102,12 +116,9 @@ class DeliveryTrackingConsumer(AsyncWebsocketConsumer):
     
     async def send_initial_data(self):
         """Send initial tracking data to client"""
-        delivery = await self.get_delivery()
-        if not delivery:
-            return
-        
-        # Get tracking data
         tracking_data = await self.get_tracking_data()
+        if not tracking_data:
+            return
         
         await self.send(text_data=json.dumps({
             'type': 'tracking_data',
@@ -129,30 +140,21 @@ class DeliveryTrackingConsumer(AsyncWebsocketConsumer):
                 }))
                 return
             
-            # Update delivery location
+            # Queue the fix; the ingestion worker stores it, updates the ETA and broadcasts both
             delivery = await self.get_delivery()
             if delivery:
-                await self.update_delivery_location(
+                if await self.update_delivery_location(
                     delivery, latitude, longitude, location_name, accuracy
-                )
-                
-                # Broadcast update to all connected clients
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'location_update',
-                        'latitude': latitude,
-                        'longitude': longitude,
-                        'location_name': location_name,
-                        'accuracy': accuracy,
-                        'timestamp': timezone.now().isoformat()
-                    }
-                )
-                
-                await self.send(text_data=json.dumps({
-                    'type': 'success',
-                    'message': 'Location updated successfully'
-                }))
+                ):
+                    await self.send(text_data=json.dumps({
+                        'type': 'success',
+                        'message': 'Location update received'
+                    }))
+                else:
+                    await self.send(text_data=json.dumps({
+                        'type': 'error',
+                        'message': 'Failed to update location'
+                    }))
             
         except Exception as e:
             logger.error(f"Error handling location update: {e}")
@@ -172,6 +174,13 @@ class DeliveryTrackingConsumer(AsyncWebsocketConsumer):
             'timestamp': event['timestamp']
         }))
     
+    async def eta_update(self, event):
+        """Handle ETA update broadcast"""
+        await self.send(text_data=json.dumps({
+            'type': 'eta_update',
+            'eta': event['eta']
+        }))
+    
     async def status_update(self, event):
         """Handle status update broadcast"""
         await self.send(text_data=json.dumps({
@@ -194,115 +203,42 @@ class DeliveryTrackingConsumer(AsyncWebsocketConsumer):
             return None
     
     @database_sync_to_async
-    def get_tracking_data(self):
+    def get_tracking_document(self):
+        """Cached tracking document for this tracking link"""
+        return tracking_documents.get(self.tracking_number, self.tracking_secret)
+    
+    async def get_tracking_data(self):
         """Get comprehensive tracking data"""
+        document = await self.get_tracking_document()
+        if not document:
+            return None
+        return tracking_documents.get_tracking_data(document)
+    
+    @database_sync_to_async
+    def get_route(self, zoom=None):
+        """Simplified route polyline for the given map zoom level"""
         try:
             delivery = Delivery.objects.get(
                 tracking_number=self.tracking_number,
                 tracking_secret=self.tracking_secret
             )
-            
-            # Get status updates with geolocation
-            status_updates = []
-            for status in delivery.status_updates.all():
-                status_data = {
-                    'id': status.id,
-                    'status': status.status,
-                    'status_display': delivery.get_status_display(),
-                    'location': status.location,
-                    'description': status.description,
-                    'timestamp': status.timestamp.isoformat(),
-                    'formatted_timestamp': status.timestamp.strftime('%B %d, %Y at %I:%M %p'),
-                    'latitude': float(status.latitude) if status.latitude else None,
-                    'longitude': float(status.longitude) if status.longitude else None,
-                    'location_name': status.location_name,
-                    'accuracy': float(status.accuracy) if status.accuracy else None
-                }
-                status_updates.append(status_data)
-            
-            # Get checkpoints
-            checkpoints = []
-            for checkpoint in delivery.checkpoints.all()[:10]:  # Last 10 checkpoints
-                checkpoint_data = {
-                    'id': checkpoint.id,
-                    'checkpoint_type': checkpoint.checkpoint_type,
-                    'checkpoint_type_display': checkpoint.get_checkpoint_type_display(),
-                    'location_name': checkpoint.location_name,
-                    'description': checkpoint.description,
-                    'latitude': float(checkpoint.latitude) if checkpoint.latitude else None,
-                    'longitude': float(checkpoint.longitude) if checkpoint.longitude else None,
-                    'accuracy': float(checkpoint.accuracy) if checkpoint.accuracy else None,
-                    'timestamp': checkpoint.timestamp.isoformat(),
-                    'formatted_timestamp': checkpoint.timestamp.strftime('%B %d, %Y at %I:%M %p'),
-                    'courier_notes': checkpoint.courier_notes,
-                    'customer_notified': checkpoint.customer_notified
-                }
-                checkpoints.append(checkpoint_data)
-            
-            # Calculate progress percentage
-            status_order = {
-                'pending': 0,
-                'confirmed': 1,
-                'in_transit': 2,
-                'out_for_delivery': 3,
-                'delivered': 4,
-                'failed': 5,
-                'returned': 6
-            }
-            
-            current_status_order = status_order.get(delivery.current_status, 0)
-            total_statuses = len(status_order)
-            progress_percentage = (current_status_order / (total_statuses - 1)) * 100
-            
-            return {
-                'delivery': {
-                    'id': delivery.id,
-                    'tracking_number': delivery.tracking_number,
-                    'order_number': delivery.order_number,
-                    'customer_name': delivery.customer_name,
-                    'customer_email': delivery.customer_email,
-                    'customer_phone': delivery.customer_phone,
-                    'package_description': delivery.package_description,
-                    'package_weight': float(delivery.package_weight) if delivery.package_weight else None,
-                    'package_dimensions': delivery.package_dimensions,
-                    'pickup_address': delivery.pickup_address,
-                    'delivery_address': delivery.delivery_address,
-                    'current_status': delivery.current_status,
-                    'current_status_display': delivery.get_current_status_display(),
-                    'estimated_delivery': delivery.estimated_delivery.isoformat() if delivery.estimated_delivery else None,
-                    'actual_delivery': delivery.actual_delivery.isoformat() if delivery.actual_delivery else None,
-                    'created_at': delivery.created_at.isoformat(),
-                    'updated_at': delivery.updated_at.isoformat(),
-                    'progress_percentage': round(progress_percentage, 1),
-                    'has_geolocation': delivery.has_geolocation(),
-                    'is_gps_active': delivery.is_gps_active(),
-                    'gps_tracking_enabled': delivery.gps_tracking_enabled,
-                    'current_location': delivery.get_current_location_dict(),
-                    'pickup_location': delivery.get_pickup_location_dict(),
-                    'delivery_location': delivery.get_delivery_location_dict(),
-                    'courier_info': delivery.get_courier_info()
-                },
-                'status_updates': status_updates,
-                'checkpoints': checkpoints
-            }
-            
         except Delivery.DoesNotExist:
             return None
+        return route_geometry.get_route(delivery, zoom)
     
     @database_sync_to_async
     def update_delivery_location(self, delivery, latitude, longitude, location_name=None, accuracy=None):
-        """Update delivery location"""
-        delivery.update_current_location(
-            latitude=latitude,
-            longitude=longitude,
-            location_name=location_name,
-            accuracy=accuracy
-        )
+        """Queue a GPS fix for the delivery; returns whether it was accepted"""
+        from .gps_service import gps_service
+        return gps_service.update_delivery_location(delivery.id, latitude, longitude, location_name, accuracy)
 
 
 class AdminDeliveryConsumer(AsyncWebsocketConsumer):
     """WebSocket consumer for admin delivery monitoring"""
     
+    # Upper bound on deliveries sent in one admin_data message
+    MAX_DELIVERIES = 2000
+    
     async def connect(self):
         """Handle admin WebSocket connection"""
         self.user = self.scope['user']
@@ -312,7 +248,11 @@ class AdminDeliveryConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
         
-        self.room_group_name = 'admin_delivery_monitoring'
+        self.room_group_name = FLEET_GROUP
+        # Tile and delivery groups replacing the fleet-wide group once the client subscribes
+        self.subscribed_groups = set()
+        # Last event timestamp sent per delivery, so overlapping subscriptions don't duplicate events
+        self.last_sent = {}
         
         # Join admin room
         await self.channel_layer.group_add(
@@ -329,12 +269,21 @@ class AdminDeliveryConsumer(AsyncWebsocketConsumer):
     
     async def disconnect(self, close_code):
         """Handle admin WebSocket disconnection"""
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        for group in {self.room_group_name} | getattr(self, 'subscribed_groups', set()):
+            await self.channel_layer.group_discard(group, self.channel_name)
         logger.info(f"❌ Admin delivery monitoring WebSocket disconnected: {self.user.username}")
     
+    async def set_subscription(self, groups):
+        """Move this socket to the given groups; an empty set means the whole fleet"""
+        groups = set(groups) or {FLEET_GROUP}
+        current = self.subscribed_groups or {FLEET_GROUP}
+        for group in current - groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        for group in groups - current:
+            await self.channel_layer.group_add(group, self.channel_name)
+        self.subscribed_groups = groups - {FLEET_GROUP}
+        self.last_sent = {}
+    
     async def receive(self, text_data):
         """Handle admin WebSocket messages"""
         try:
@@ -343,6 +292,40 @@ class AdminDeliveryConsumer(AsyncWebsocketConsumer):
             
             if message_type == 'get_all_deliveries':
                 await self.send_initial_admin_data()
+            elif message_type == 'subscribe':
+                await self.handle_subscribe(data)
+            elif message_type == 'unsubscribe':
+                await self.set_subscription(set())
+                await self.send(text_data=json.dumps({
+                    'type': 'subscribed',
+                    'scope': 'fleet'
+                }))
+            elif message_type == 'get_deliveries_in_viewport':
+                # Map moved: send only what is visible
+                bounds = self.parse_bounds(data.get('bounds'))
+                if bounds is None:
+                    await self.send(text_data=json.dumps({
+                        'type': 'error',
+                        'message': 'bounds with north, south, east and west are required'
+                    }))
+                else:
+                    await self.send_initial_admin_data(bounds)
+            elif message_type == 'get_nearest_deliveries':
+                try:
+                    latitude = float(data['latitude'])
+                    longitude = float(data['longitude'])
+                    count = min(int(data.get('count', 10)), 100)
+                except (KeyError, TypeError, ValueError):
+                    await self.send(text_data=json.dumps({
+                        'type': 'error',
+                        'message': 'latitude and longitude are required'
+                    }))
+                else:
+                    deliveries_data = await self.get_nearest_deliveries_data(latitude, longitude, count)
+                    await self.send(text_data=json.dumps({
+                        'type': 'nearest_deliveries',
+                        'deliveries': deliveries_data
+                    }))
             elif message_type == 'update_delivery_location':
                 await self.handle_admin_location_update(data)
             else:
@@ -363,15 +346,54 @@ class AdminDeliveryConsumer(AsyncWebsocketConsumer):
                 'message': 'Internal server error'
             }))
     
-    async def send_initial_admin_data(self):
+    async def handle_subscribe(self, data):
+        """Receive location events only for a viewport and/or a list of deliveries"""
+        bounds = self.parse_bounds(data.get('bounds')) if data.get('bounds') is not None else None
+        try:
+            delivery_ids = [int(delivery_id) for delivery_id in data.get('delivery_ids') or []]
+        except (TypeError, ValueError):
+            delivery_ids = None
+        
+        if (data.get('bounds') is not None and bounds is None) or delivery_ids is None or (bounds is None and not delivery_ids):
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': 'subscribe needs bounds (north, south, east, west) and/or delivery_ids'
+            }))
+            return
+        
+        groups = {delivery_group(delivery_id) for delivery_id in delivery_ids[:self.MAX_DELIVERIES]}
+        if bounds:
+            groups |= viewport_groups(bounds)
+        await self.set_subscription(groups)
+        
+        await self.send(text_data=json.dumps({
+            'type': 'subscribed',
+            'scope': 'viewport' if bounds else 'deliveries',
+            'tiles': sum(1 for group in groups if group.startswith('admin_tile_')),
+            'delivery_ids': delivery_ids
+        }))
+        
+        # Snapshot of what is now visible; events keep it current from here on
+        if bounds:
+            await self.send_initial_admin_data(bounds)
+    
+    async def send_initial_admin_data(self, bounds=None):
         """Send initial admin data"""
-        deliveries_data = await self.get_all_deliveries_data()
+        deliveries_data = await self.get_all_deliveries_data(bounds)
         
         await self.send(text_data=json.dumps({
             'type': 'admin_data',
-            'deliveries': deliveries_data
+            'deliveries': deliveries_data,
+            'bounds': bounds
         }))
     
+    def parse_bounds(self, bounds):
+        """Viewport bounds as floats, None when incomplete"""
+        try:
+            return {key: float(bounds[key]) for key in ('north', 'south', 'east', 'west')}
+        except (KeyError, TypeError, ValueError):
+            return None
+    
     async def handle_admin_location_update(self, data):
         """Handle location update from admin"""
         try:
@@ -388,43 +410,14 @@ class AdminDeliveryConsumer(AsyncWebsocketConsumer):
                 }))
                 return
             
-            # Update delivery location
-            success = await self.update_delivery_location_by_id(
+            # Queue the fix; the ingestion worker stores it, updates the ETA and broadcasts
+            # to the admin groups and the delivery's tracking room
+            if await self.update_delivery_location_by_id(
                 delivery_id, latitude, longitude, location_name, accuracy
-            )
-            
-            if success:
-                # Broadcast to admin room
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'delivery_location_updated',
-                        'delivery_id': delivery_id,
-                        'latitude': latitude,
-                        'longitude': longitude,
-                        'location_name': location_name,
-                        'timestamp': timezone.now().isoformat()
-                    }
-                )
-                
-                # Broadcast to specific delivery tracking room
-                delivery = await self.get_delivery_by_id(delivery_id)
-                if delivery:
-                    await self.channel_layer.group_send(
-                        f'delivery_tracking_{delivery.tracking_number}',
-                        {
-                            'type': 'location_update',
-                            'latitude': latitude,
-                            'longitude': longitude,
-                            'location_name': location_name,
-                            'accuracy': accuracy,
-                            'timestamp': timezone.now().isoformat()
-                        }
-                    )
-                
+            ):
                 await self.send(text_data=json.dumps({
                     'type': 'success',
-                    'message': 'Location updated successfully'
+                    'message': 'Location update received'
                 }))
             else:
                 await self.send(text_data=json.dumps({
@@ -441,6 +434,11 @@ class AdminDeliveryConsumer(AsyncWebsocketConsumer):
     
     async def delivery_location_updated(self, event):
         """Handle delivery location update broadcast"""
+        # The same event arrives once per matching group when subscriptions overlap
+        if self.last_sent.get(event['delivery_id']) == event['timestamp']:
+            return
+        self.last_sent[event['delivery_id']] = event['timestamp']
+        
         await self.send(text_data=json.dumps({
             'type': 'delivery_location_updated',
             'delivery_id': event['delivery_id'],
@@ -451,35 +449,47 @@ class AdminDeliveryConsumer(AsyncWebsocketConsumer):
         }))
     
     @database_sync_to_async
-    def get_all_deliveries_data(self):
-        """Get all deliveries data for admin dashboard"""
-        deliveries = Delivery.objects.filter(
-            current_status__in=['confirmed', 'in_transit', 'out_for_delivery']
-        ).select_related('created_by')
-        
-        deliveries_data = []
-        for delivery in deliveries:
-            delivery_data = {
-                'id': delivery.id,
-                'tracking_number': delivery.tracking_number,
-                'order_number': delivery.order_number,
-                'customer_name': delivery.customer_name,
-                'current_status': delivery.current_status,
-                'current_status_display': delivery.get_current_status_display(),
-                'package_description': delivery.package_description,
-                'pickup_address': delivery.pickup_address,
-                'delivery_address': delivery.delivery_address,
-                'estimated_delivery': delivery.estimated_delivery.isoformat() if delivery.estimated_delivery else None,
-                'has_geolocation': delivery.has_geolocation(),
-                'current_location': delivery.get_current_location_dict(),
-                'pickup_location': delivery.get_pickup_location_dict(),
-                'delivery_location': delivery.get_delivery_location_dict(),
-                'created_at': delivery.created_at.isoformat(),
-                'updated_at': delivery.updated_at.isoformat()
-            }
-            deliveries_data.append(delivery_data)
+    def get_all_deliveries_data(self, bounds=None):
+        """Get active deliveries for the admin dashboard, limited to the map viewport when bounds are given"""
+        if bounds:
+            deliveries = delivery_spatial.within_bbox(
+                bounds['south'], bounds['west'], bounds['north'], bounds['east']
+            )
+        else:
+            deliveries = Delivery.objects.filter(
+                current_status__in=['confirmed', 'in_transit', 'out_for_delivery']
+            )
         
-        return deliveries_data
+        return [self.serialize_admin_delivery(delivery) for delivery in deliveries[:self.MAX_DELIVERIES]]
+    
+    @database_sync_to_async
+    def get_nearest_deliveries_data(self, latitude, longitude, count):
+        """Get the active deliveries closest to a point"""
+        return [
+            dict(self.serialize_admin_delivery(delivery), distance_km=round(distance, 3))
+            for delivery, distance in delivery_spatial.nearest_n(latitude, longitude, count)
+        ]
+    
+    def serialize_admin_delivery(self, delivery):
+        """Delivery payload for the admin dashboard"""
+        return {
+            'id': delivery.id,
+            'tracking_number': delivery.tracking_number,
+            'order_number': delivery.order_number,
+            'customer_name': delivery.customer_name,
+            'current_status': delivery.current_status,
+            'current_status_display': delivery.get_current_status_display(),
+            'package_description': delivery.package_description,
+            'pickup_address': delivery.pickup_address,
+            'delivery_address': delivery.delivery_address,
+            'estimated_delivery': delivery.estimated_delivery.isoformat() if delivery.estimated_delivery else None,
+            'has_geolocation': delivery.has_geolocation(),
+            'current_location': delivery.get_current_location_dict(),
+            'pickup_location': delivery.get_pickup_location_dict(),
+            'delivery_location': delivery.get_delivery_location_dict(),
+            'created_at': delivery.created_at.isoformat(),
+            'updated_at': delivery.updated_at.isoformat()
+        }
     
     @database_sync_to_async
     def get_delivery_by_id(self, delivery_id):
@@ -491,15 +501,8 @@ class AdminDeliveryConsumer(AsyncWebsocketConsumer):
     
     @database_sync_to_async
     def update_delivery_location_by_id(self, delivery_id, latitude, longitude, location_name=None, accuracy=None):
-        """Update delivery location by ID"""
-        try:
-            delivery = Delivery.objects.get(id=delivery_id)
-            delivery.update_current_location(
-                latitude=latitude,
-                longitude=longitude,
-                location_name=location_name,
-                accuracy=accuracy
-            )
-            return True
-        except Delivery.DoesNotExist:
+        """Queue a GPS fix for the delivery with this ID; returns whether it was accepted"""
+        from .gps_service import gps_service
+        if not Delivery.objects.filter(id=delivery_id).exists():
             return False
+        return gps_service.update_delivery_location(delivery_id, latitude, longitude, location_name, accuracy)
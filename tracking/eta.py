@@ -0,0 +1,120 @@
+"""
+Incremental ETA prediction.
+
+Each delivery carries a smoothed speed (an exponentially weighted moving
+average over its recent fixes) and its latest prediction. A new batch of fixes
+only folds the new segments into that average, starting from the position and
+time already stored on the delivery, so an update costs O(new fixes) and needs
+no extra queries: the GPS ingestion worker writes the results in the same
+bulk_update as the position.
+
+The prediction is the remaining great-circle distance to the drop-off point,
+stretched by a road circuity factor, divided by the smoothed speed.
+"""
+import logging
+import math
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from .geo import haversine_km, segment_speeds_kmh
+
+logger = logging.getLogger(__name__)
+
+# Time constant of the speed average: a fix this many seconds old weighs ~37% of a fresh one
+SPEED_TIME_CONSTANT = 300.0
+
+# Segments faster than this are GPS jumps, not driving
+MAX_PLAUSIBLE_SPEED_KMH = 200.0
+
+# Never predict with less than this, so a parked courier doesn't push the ETA to infinity
+MIN_SPEED_KMH = 5.0
+
+# Within this distance of the drop-off point the delivery is considered arrived
+ARRIVAL_RADIUS_KM = 0.05
+
+# Only push a new ETA to customers when it moved by at least this much
+PUSH_THRESHOLD = timedelta(minutes=1)
+
+
+class EtaEngine:
+    """Folds new GPS fixes into a delivery's speed estimate and predicts its arrival"""
+
+    def __init__(self, default_speed_kmh=None, road_factor=None):
+        self.default_speed_kmh = default_speed_kmh or getattr(settings, 'ETA_DEFAULT_SPEED_KMH', 30)
+        self.road_factor = road_factor or getattr(settings, 'ETA_ROAD_FACTOR', 1.3)
+
+    def smoothed_speed(self, previous_speed, lats, lngs, times):
+        """Fold the segments of a (previous fix + new fixes) track into the speed average"""
+        speed = previous_speed
+        speeds = segment_speeds_kmh(lats, lngs, times)
+        for index, segment_speed in enumerate(speeds):
+            elapsed = times[index + 1] - times[index]
+            if elapsed <= 0 or segment_speed > MAX_PLAUSIBLE_SPEED_KMH:
+                continue
+            if speed is None:
+                speed = float(segment_speed)
+                continue
+            weight = 1 - math.exp(-elapsed / SPEED_TIME_CONSTANT)
+            speed += weight * (float(segment_speed) - speed)
+        return speed
+
+    def predict(self, delivery, latitude, longitude, at, speed_kmh):
+        """(predicted arrival, remaining km) from a position, None when there is no drop-off point"""
+        if delivery.delivery_latitude is None or delivery.delivery_longitude is None:
+            return None, None
+        remaining_km = haversine_km(
+            latitude, longitude, float(delivery.delivery_latitude), float(delivery.delivery_longitude)
+        ) * self.road_factor
+        if remaining_km <= ARRIVAL_RADIUS_KM:
+            return at, 0.0
+
+        speed = max(speed_kmh if speed_kmh is not None else self.default_speed_kmh, MIN_SPEED_KMH)
+        return at + timedelta(hours=remaining_km / speed), remaining_km
+
+    def update(self, delivery, fixes):
+        """
+        Update delivery.average_speed_kmh, predicted_delivery and remaining_distance_km
+        from fixes sorted by time; the delivery must still hold its previous position.
+        Returns True when the prediction moved enough to be pushed to clients.
+        """
+        lats = [fix['latitude'] for fix in fixes]
+        lngs = [fix['longitude'] for fix in fixes]
+        times = [fix['recorded_at'].timestamp() for fix in fixes]
+        if delivery.current_latitude is not None and delivery.current_longitude is not None and delivery.last_gps_update:
+            lats.insert(0, float(delivery.current_latitude))
+            lngs.insert(0, float(delivery.current_longitude))
+            times.insert(0, delivery.last_gps_update.timestamp())
+
+        previous_speed = float(delivery.average_speed_kmh) if delivery.average_speed_kmh is not None else None
+        speed = self.smoothed_speed(previous_speed, lats, lngs, times)
+
+        last_fix = fixes[-1]
+        predicted, remaining_km = self.predict(delivery, last_fix['latitude'], last_fix['longitude'], last_fix['recorded_at'], speed)
+
+        previous_prediction = delivery.predicted_delivery
+        delivery.average_speed_kmh = Decimal(str(round(speed, 2))) if speed is not None else None
+        delivery.predicted_delivery = predicted
+        delivery.remaining_distance_km = Decimal(str(round(remaining_km, 3))) if remaining_km is not None else None
+
+        if predicted is None:
+            return False
+        return previous_prediction is None or abs(predicted - previous_prediction) >= PUSH_THRESHOLD
+
+    def get_eta_dict(self, delivery):
+        """ETA payload for API and websocket clients"""
+        if delivery.predicted_delivery is None:
+            return None
+        minutes_remaining = max((delivery.predicted_delivery - timezone.now()).total_seconds() / 60, 0)
+        return {
+            'predicted_delivery': delivery.predicted_delivery.isoformat(),
+            'minutes_remaining': round(minutes_remaining),
+            'remaining_distance_km': float(delivery.remaining_distance_km) if delivery.remaining_distance_km is not None else None,
+            'average_speed_kmh': float(delivery.average_speed_kmh) if delivery.average_speed_kmh is not None else None
+        }
+
+
+# Global instance
+eta_engine = EtaEngine()
@@ -6,6 +6,9 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
 from .models import Delivery, NewsletterSubscriber
+from .stats import delivery_stats
+from .tracking_document import tracking_documents
+from .tracking_lookup import tracking_lookup
 import json
 
 
@@ -16,28 +19,23 @@ def is_staff_user(user):
 
 def tracking_page(request, tracking_number, tracking_secret):
     """Frontend tracking page"""
-    try:
-        delivery = Delivery.objects.get(
-            tracking_number=tracking_number,
-            tracking_secret=tracking_secret
-        )
-        
-        # Check if tracking link has expired
-        if delivery.is_tracking_link_expired():
-            return render(request, 'tracking/expired.html', {
-                'delivery': delivery,
-                'expired_at': delivery.tracking_link_expires
-            })
-        
-        return render(request, 'tracking/tracking_page.html', {
-            'delivery': delivery,
-            'tracking_number': tracking_number,
-            'tracking_secret': tracking_secret,
-            'GOOGLE_MAPS_API_KEY': getattr(settings, 'GOOGLE_MAPS_API_KEY', '')
-        })
-        
-    except Delivery.DoesNotExist:
+    document = tracking_documents.get(tracking_number, tracking_secret)
+    if document is None:
         raise Http404("Delivery not found")
+    
+    # Check if tracking link has expired
+    if tracking_documents.is_expired(document):
+        return render(request, 'tracking/expired.html', {
+            'delivery': document['page'],
+            'expired_at': document['tracking_link_expires']
+        })
+    
+    return render(request, 'tracking/tracking_page.html', {
+        'delivery': document['page'],
+        'tracking_number': tracking_number,
+        'tracking_secret': tracking_secret,
+        'GOOGLE_MAPS_API_KEY': getattr(settings, 'GOOGLE_MAPS_API_KEY', '')
+    })
 
 
 @csrf_exempt
@@ -53,41 +51,39 @@ def search_tracking_number(request):
                 'error': 'Please provide a tracking number'
             }, status=400)
         
-        # Try to find the delivery
-        try:
-            delivery = Delivery.objects.get(tracking_number=tracking_number)
-            
-            # Check if tracking link has expired
-            if delivery.is_tracking_link_expired():
-                return JsonResponse({
-                    'error': 'This tracking link has expired',
-                    'expired_at': delivery.tracking_link_expires.isoformat()
-                }, status=410)
-            
-            # Generate tracking URL using the current request's scheme and host
-            scheme = request.scheme
-            host = request.get_host()
-            
-            # Handle port forwarding - use the forwarded host if available
-            if 'HTTP_X_FORWARDED_HOST' in request.META:
-                host = request.META['HTTP_X_FORWARDED_HOST']
-            elif 'HTTP_HOST' in request.META:
-                host = request.META['HTTP_HOST']
-            
-            # Build the tracking URL
-            tracking_path = delivery.get_tracking_url()
-            tracking_url = f"{scheme}://{host}{tracking_path}"
-            
-            return JsonResponse({
-                'success': True,
-                'tracking_url': tracking_url,
-                'tracking_number': delivery.tracking_number
-            })
-            
-        except Delivery.DoesNotExist:
+        # Unknown numbers are answered from the lookup filter and negative cache
+        entry = tracking_lookup.lookup(tracking_number)
+        if entry is None:
             return JsonResponse({
                 'error': 'Tracking number not found. Please check your tracking number and try again.'
             }, status=404)
+        
+        # Check if tracking link has expired
+        if tracking_lookup.is_expired(entry):
+            return JsonResponse({
+                'error': 'This tracking link has expired',
+                'expired_at': entry['tracking_link_expires'].isoformat()
+            }, status=410)
+        
+        # Generate tracking URL using the current request's scheme and host
+        scheme = request.scheme
+        host = request.get_host()
+        
+        # Handle port forwarding - use the forwarded host if available
+        if 'HTTP_X_FORWARDED_HOST' in request.META:
+            host = request.META['HTTP_X_FORWARDED_HOST']
+        elif 'HTTP_HOST' in request.META:
+            host = request.META['HTTP_HOST']
+        
+        # Build the tracking URL
+        tracking_path = tracking_lookup.get_tracking_path(entry)
+        tracking_url = f"{scheme}://{host}{tracking_path}"
+        
+        return JsonResponse({
+            'success': True,
+            'tracking_url': tracking_url,
+            'tracking_number': entry['tracking_number']
+        })
             
     except json.JSONDecodeError:
         return JsonResponse({
@@ -105,18 +101,15 @@ def dashboard(request):
     """Admin dashboard for managing deliveries"""
     deliveries = Delivery.objects.all().order_by('-created_at')[:50]
     
-    # Get statistics
-    total_deliveries = Delivery.objects.count()
-    pending_deliveries = Delivery.objects.filter(current_status='pending').count()
-    in_transit_deliveries = Delivery.objects.filter(current_status='in_transit').count()
-    delivered_deliveries = Delivery.objects.filter(current_status='delivered').count()
+    # Get statistics from the materialized counters
+    stats = delivery_stats.get_summary()
     
     context = {
         'deliveries': deliveries,
-        'total_deliveries': total_deliveries,
-        'pending_deliveries': pending_deliveries,
-        'in_transit_deliveries': in_transit_deliveries,
-        'delivered_deliveries': delivered_deliveries,
+        'total_deliveries': stats['total_deliveries'],
+        'pending_deliveries': stats['pending_deliveries'],
+        'in_transit_deliveries': stats['in_transit_deliveries'],
+        'delivered_deliveries': stats['delivered_deliveries'],
     }
     
     return render(request, 'tracking/dashboard.html', context)
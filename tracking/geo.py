@@ -0,0 +1,187 @@
+"""
+Shared geo math for GPS fixes.
+
+Every function has a scalar form and an array form working on whole sequences
+of fixes at once. The array forms are vectorized with NumPy when it is
+installed and fall back to a tight pure Python loop otherwise, so callers
+(batch ingestion, checkpoint detection, ETA estimation, simulation) never need
+to know which one they got. Array forms return NumPy arrays or lists
+respectively; both iterate and index the same way.
+"""
+import bisect
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HAS_NUMPY = np is not None
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great circle distance between two points in kilometers"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def bearing_deg(lat1, lon1, lat2, lon2):
+    """Initial compass bearing from the first point to the second, 0-360 degrees"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    dlon = lon2 - lon1
+    x = math.sin(dlon) * math.cos(lat2)
+    y = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlon)
+    return (math.degrees(math.atan2(x, y)) + 360) % 360
+
+
+def haversine_km_many(lats1, lons1, lats2, lons2):
+    """Element-wise great circle distances in kilometers"""
+    if HAS_NUMPY:
+        lats1, lons1, lats2, lons2 = (np.radians(np.asarray(values, dtype=float)) for values in (lats1, lons1, lats2, lons2))
+        a = np.sin((lats2 - lats1) / 2) ** 2 + np.cos(lats1) * np.cos(lats2) * np.sin((lons2 - lons1) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    radians, sin, cos, asin, sqrt = math.radians, math.sin, math.cos, math.asin, math.sqrt
+    distances = []
+    for lat1, lon1, lat2, lon2 in zip(lats1, lons1, lats2, lons2):
+        lat1, lat2 = radians(lat1), radians(lat2)
+        a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin(radians(lon2 - lon1) / 2) ** 2
+        distances.append(2 * EARTH_RADIUS_KM * asin(sqrt(min(a, 1.0))))
+    return distances
+
+
+def bearing_deg_many(lats1, lons1, lats2, lons2):
+    """Element-wise initial bearings, 0-360 degrees"""
+    if HAS_NUMPY:
+        lats1, lons1, lats2, lons2 = (np.radians(np.asarray(values, dtype=float)) for values in (lats1, lons1, lats2, lons2))
+        dlon = lons2 - lons1
+        x = np.sin(dlon) * np.cos(lats2)
+        y = np.cos(lats1) * np.sin(lats2) - np.sin(lats1) * np.cos(lats2) * np.cos(dlon)
+        return (np.degrees(np.arctan2(x, y)) + 360) % 360
+
+    return [bearing_deg(*values) for values in zip(lats1, lons1, lats2, lons2)]
+
+
+def segment_distances_km(lats, lons):
+    """Distance of each consecutive segment of a track (one shorter than the track)"""
+    return haversine_km_many(lats[:-1], lons[:-1], lats[1:], lons[1:])
+
+
+def segment_bearings_deg(lats, lons):
+    """Bearing of each consecutive segment of a track"""
+    return bearing_deg_many(lats[:-1], lons[:-1], lats[1:], lons[1:])
+
+
+def segment_speeds_kmh(lats, lons, times):
+    """Speed of each consecutive segment; times are epoch seconds, zero-length intervals give 0"""
+    distances = segment_distances_km(lats, lons)
+    if HAS_NUMPY:
+        times = np.asarray(times, dtype=float)
+        hours = (times[1:] - times[:-1]) / 3600
+        return np.divide(distances, hours, out=np.zeros_like(distances), where=hours > 0)
+
+    speeds = []
+    for distance, start, end in zip(distances, times[:-1], times[1:]):
+        hours = (end - start) / 3600
+        speeds.append(distance / hours if hours > 0 else 0.0)
+    return speeds
+
+
+def track_length_km(lats, lons):
+    """Total length of a track"""
+    return float(sum(segment_distances_km(lats, lons))) if len(lats) > 1 else 0.0
+
+
+def interpolate_points(lat1, lon1, lat2, lon2, fractions):
+    """Points at the given fractions (0-1) of the way between two fixes, as (lats, lons)"""
+    if HAS_NUMPY:
+        fractions = np.asarray(fractions, dtype=float)
+        return lat1 + (lat2 - lat1) * fractions, lon1 + (lon2 - lon1) * fractions
+
+    return (
+        [lat1 + (lat2 - lat1) * fraction for fraction in fractions],
+        [lon1 + (lon2 - lon1) * fraction for fraction in fractions]
+    )
+
+
+def interpolate_at(times, lats, lons, at):
+    """Position of a timestamped track at time `at` (epoch seconds), clamped to its ends"""
+    if at <= times[0]:
+        return float(lats[0]), float(lons[0])
+    if at >= times[-1]:
+        return float(lats[-1]), float(lons[-1])
+    index = bisect.bisect_right(list(times), at)
+    start, end = times[index - 1], times[index]
+    fraction = (at - start) / (end - start) if end > start else 0.0
+    return (
+        float(lats[index - 1] + (lats[index] - lats[index - 1]) * fraction),
+        float(lons[index - 1] + (lons[index] - lons[index - 1]) * fraction)
+    )
+
+
+# Geohash: base32 interleaving of longitude and latitude bits. Cells sharing a
+# prefix are spatially nested, so a btree index on the hash answers area queries.
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # ~5m x 5m cells
+
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a point"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """(height, width) of a geohash cell in degrees"""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def geohash_cover(south, west, north, east, max_cells=32, max_precision=GEOHASH_PRECISION):
+    """Finest set of at most ~max_cells equal-precision geohash prefixes covering a bounding box (west <= east)"""
+    south, north = max(-90.0, south), min(90.0, north)
+    west, east = max(-180.0, west), min(180.0, east)
+
+    precision = 1
+    for candidate in range(max_precision, 0, -1):
+        height, width = geohash_cell_size(candidate)
+        rows = int((north - south) // height) + 2
+        cols = int((east - west) // width) + 2
+        if rows * cols <= max_cells:
+            precision = candidate
+            break
+
+    height, width = geohash_cell_size(precision)
+    cells = set()
+    # Walk the cell grid by snapping each step to the grid, so no cell is skipped
+    lat = math.floor(south / height) * height + height / 2
+    while lat - height / 2 <= north:
+        lng = math.floor(west / width) * width + width / 2
+        while lng - width / 2 <= east:
+            cells.add(geohash_encode(min(lat, 90.0), min(lng, 180.0), precision))
+            lng += width
+        lat += height
+    return cells
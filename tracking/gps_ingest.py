@@ -0,0 +1,260 @@
+"""
+Buffered GPS ingestion pipeline.
+
+GPS fixes are appended to a queue (a Redis list when REDIS_URL is configured,
+a process-local deque otherwise) instead of being written one by one. A worker
+drains the queue in batches, groups the fixes per delivery and persists the
+whole batch with a handful of bulk statements: one update of the latest
+position per delivery, one append to the compact location trace and one bulk
+insert for checkpoints.
+Only the latest fix of each delivery is broadcast to WebSocket clients.
+"""
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .eta import eta_engine
+from .geo import segment_distances_km
+from .location_trace import location_traces
+from .models import Delivery, DeliveryCheckpoint
+from .tracking_document import tracking_documents
+
+logger = logging.getLogger(__name__)
+
+
+class GPSFixQueue:
+    """Append-only queue of raw GPS fixes"""
+
+    QUEUE_KEY = 'tracking:gps:fixes'
+
+    def __init__(self):
+        self._local = deque()
+        self._redis = None
+
+    def _get_redis(self):
+        redis_url = getattr(settings, 'REDIS_URL', None) or os.environ.get('REDIS_URL')
+        if not redis_url:
+            return None
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url)
+        return self._redis
+
+    def push(self, fix):
+        payload = json.dumps(fix)
+        try:
+            client = self._get_redis()
+            if client is not None:
+                client.rpush(self.QUEUE_KEY, payload)
+                return
+        except Exception as e:
+            logger.warning(f"Could not queue GPS fix in Redis, buffering locally: {e}")
+        self._local.append(payload)
+
+    def pop_batch(self, limit):
+        """Take up to limit fixes, oldest first"""
+        payloads = []
+        while self._local and len(payloads) < limit:
+            payloads.append(self._local.popleft())
+        try:
+            client = self._get_redis()
+            if client is not None and len(payloads) < limit:
+                payloads.extend(client.lpop(self.QUEUE_KEY, limit - len(payloads)) or [])
+        except Exception as e:
+            logger.warning(f"Could not read GPS fixes from Redis: {e}")
+        return [json.loads(payload) for payload in payloads]
+
+    def requeue(self, fixes):
+        """Put fixes back at the head of the queue in their original order"""
+        payloads = [json.dumps(fix) for fix in fixes]
+        try:
+            client = self._get_redis()
+            if client is not None:
+                client.lpush(self.QUEUE_KEY, *reversed(payloads))
+                return
+        except Exception as e:
+            logger.warning(f"Could not requeue GPS fixes in Redis, buffering locally: {e}")
+        self._local.extendleft(reversed(payloads))
+
+    def __len__(self):
+        length = len(self._local)
+        try:
+            client = self._get_redis()
+            if client is not None:
+                length += client.llen(self.QUEUE_KEY)
+        except Exception:
+            pass
+        return length
+
+
+class GPSIngestionWorker:
+    """Drains the GPS queue and persists fixes in per-delivery batches"""
+
+    def __init__(self, queue=None, batch_size=None, interval=None):
+        self.queue = queue if queue is not None else GPSFixQueue()
+        self.batch_size = batch_size or getattr(settings, 'GPS_INGEST_BATCH_SIZE', 5000)
+        self.interval = interval if interval is not None else getattr(settings, 'GPS_INGEST_INTERVAL', 2)
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def enqueue(self, delivery_id, latitude, longitude, location_name=None, accuracy=None, recorded_at=None):
+        """Accept one fix; it is persisted by the next batch"""
+        recorded_at = recorded_at or timezone.now()
+        self.queue.push({
+            'delivery_id': delivery_id,
+            'latitude': float(latitude),
+            'longitude': float(longitude),
+            'location_name': location_name,
+            'accuracy': float(accuracy) if accuracy is not None else None,
+            'recorded_at': recorded_at.isoformat()
+        })
+        self._schedule()
+
+    def _schedule(self):
+        """Debounce: one flush timer per interval, whatever the number of fixes"""
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.interval, self._timer_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timer_flush(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.process_pending()
+        finally:
+            close_old_connections()
+
+    def process_pending(self):
+        """Process batches until the queue is empty; returns the number of fixes stored"""
+        processed = 0
+        while True:
+            fixes = self.queue.pop_batch(self.batch_size)
+            if not fixes:
+                return processed
+            try:
+                # process_batch rewrites fields in place; keep the queued form for a retry
+                processed += self.process_batch([dict(fix) for fix in fixes])
+            except Exception as e:
+                # Nothing was committed, so the next run retries the whole batch
+                self.queue.requeue(fixes)
+                logger.error(f"Could not store {len(fixes)} GPS fixes, requeued them: {e}")
+                return processed
+
+    def process_batch(self, fixes):
+        """Persist a batch of fixes with one read and a constant number of bulk writes"""
+        from .gps_service import gps_service
+
+        by_delivery = {}
+        for fix in fixes:
+            fix['recorded_at'] = datetime.fromisoformat(fix['recorded_at'])
+            by_delivery.setdefault(fix['delivery_id'], []).append(fix)
+
+        deliveries = Delivery.objects.only(
+            'id', 'tracking_number', 'current_status', 'current_latitude', 'current_longitude', 'current_geohash',
+            'last_gps_update', 'delivery_latitude', 'delivery_longitude',
+            'predicted_delivery', 'average_speed_kmh', 'remaining_distance_km'
+        ).in_bulk(list(by_delivery))
+
+        missing = set(by_delivery) - set(deliveries)
+        if missing:
+            logger.warning(f"Dropping GPS fixes for unknown deliveries: {sorted(missing)}")
+
+        track = []
+        checkpoints = []
+        latest = {}
+        previous_geohashes = {}
+        eta_changed = []
+        for delivery_id, delivery_fixes in by_delivery.items():
+            delivery = deliveries.get(delivery_id)
+            if delivery is None:
+                continue
+            delivery_fixes.sort(key=lambda fix: fix['recorded_at'])
+
+            track.extend(delivery_fixes)
+
+            # Distance of every fix from the previous one, in one vectorized pass;
+            # the first fix is measured from the stored position when there is one
+            lats = [fix['latitude'] for fix in delivery_fixes]
+            lngs = [fix['longitude'] for fix in delivery_fixes]
+            has_position = bool(delivery.current_latitude and delivery.current_longitude)
+            if has_position:
+                lats.insert(0, float(delivery.current_latitude))
+                lngs.insert(0, float(delivery.current_longitude))
+            moved_km = list(segment_distances_km(lats, lngs))
+            if not has_position:
+                moved_km.insert(0, None)
+
+            for fix, distance in zip(delivery_fixes, moved_km):
+                latitude, longitude, location_name = fix['latitude'], fix['longitude'], fix['location_name']
+                # Checkpoint when the courier moved more than 100 meters since the previous fix
+                if distance is None or distance > 0.1:
+                    checkpoints.append(DeliveryCheckpoint(
+                        delivery_id=delivery_id,
+                        checkpoint_type='transit',
+                        location_name=location_name or "GPS Location",
+                        latitude=latitude,
+                        longitude=longitude,
+                        accuracy=fix['accuracy'],
+                        description=f"Automatic GPS update: {location_name or 'GPS coordinates'}"
+                    ))
+
+            # Fold the new fixes into the ETA while the delivery still holds its previous position
+            if eta_engine.update(delivery, delivery_fixes):
+                eta_changed.append(delivery)
+
+            last_fix = delivery_fixes[-1]
+            delivery.current_latitude = last_fix['latitude']
+            delivery.current_longitude = last_fix['longitude']
+            delivery.current_location_name = last_fix['location_name']
+            previous_geohashes[delivery_id] = delivery.current_geohash
+            delivery.current_geohash = delivery.compute_geohash()
+            delivery.last_location_update = last_fix['recorded_at']
+            delivery.last_gps_update = last_fix['recorded_at']
+            delivery.updated_at = timezone.now()
+            latest[delivery_id] = last_fix
+
+        if not latest:
+            return 0
+
+        with transaction.atomic():
+            Delivery.objects.bulk_update([deliveries[delivery_id] for delivery_id in latest], [
+                'current_latitude', 'current_longitude', 'current_location_name', 'current_geohash',
+                'last_location_update', 'last_gps_update', 'updated_at',
+                'predicted_delivery', 'average_speed_kmh', 'remaining_distance_km'
+            ])
+            location_traces.append(track)
+            DeliveryCheckpoint.objects.bulk_create(checkpoints, batch_size=1000)
+
+        # The batch is committed from here on; failures below must not make it look unstored
+        try:
+            tracking_documents.invalidate_many(deliveries[delivery_id].tracking_number for delivery_id in latest)
+
+            # One broadcast per delivery per batch, carrying its latest position
+            for delivery_id, fix in latest.items():
+                gps_service._broadcast_location_update(
+                    deliveries[delivery_id], fix['latitude'], fix['longitude'], fix['location_name'], fix['accuracy'],
+                    previous_geohashes[delivery_id]
+                )
+
+            # ETA pushes only for deliveries whose prediction moved noticeably
+            for delivery in eta_changed:
+                gps_service._broadcast_eta_update(delivery)
+        except Exception as e:
+            logger.warning(f"Stored GPS batch but could not publish its updates: {e}")
+
+        logger.info(f"Stored {len(track)} GPS fixes for {len(latest)} deliveries ({len(checkpoints)} checkpoints)")
+        return len(track)
+
+
+# Global ingestion worker
+gps_ingestion = GPSIngestionWorker()
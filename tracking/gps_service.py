@@ -4,16 +4,17 @@ This service handles automatic GPS location updates for deliveries
 """
 
 import logging
-import asyncio
 from datetime import datetime, timedelta
 from django.utils import timezone
-from django.db import transaction
+from .geo import interpolate_points
 from .models import Delivery, DeliveryCheckpoint
+from .monitoring import admin_monitoring
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
 logger = logging.getLogger(__name__)
 
+
 class GPSTrackingService:
     """Service for managing GPS tracking and automatic location updates"""
     
@@ -48,73 +49,16 @@ class GPSTrackingService:
             return False
     
     def update_delivery_location(self, delivery_id, latitude, longitude, location_name=None, accuracy=None):
-        """Update delivery location and broadcast to WebSocket clients"""
+        """Queue a GPS fix; the ingestion worker persists and broadcasts it with its batch"""
         try:
-            with transaction.atomic():
-                delivery = Delivery.objects.select_for_update().get(id=delivery_id)
-                
-                # Update delivery location
-                delivery.update_current_location(
-                    latitude=latitude,
-                    longitude=longitude,
-                    location_name=location_name,
-                    accuracy=accuracy
-                )
-                
-                # Create checkpoint if significant movement
-                if self._should_create_checkpoint(delivery, latitude, longitude):
-                    DeliveryCheckpoint.objects.create(
-                        delivery=delivery,
-                        checkpoint_type='transit',
-                        location_name=location_name or f"GPS Location",
-                        latitude=latitude,
-                        longitude=longitude,
-                        accuracy=accuracy,
-                        description=f"Automatic GPS update: {location_name or 'GPS coordinates'}"
-                    )
-                
-                # Broadcast location update to WebSocket clients
-                self._broadcast_location_update(delivery, latitude, longitude, location_name, accuracy)
-                
-                logger.info(f"Location updated for delivery {delivery.tracking_number}: {latitude}, {longitude}")
-                return True
-                
-        except Delivery.DoesNotExist:
-            logger.error(f"Delivery {delivery_id} not found")
-            return False
+            from .gps_ingest import gps_ingestion
+            gps_ingestion.enqueue(delivery_id, latitude, longitude, location_name, accuracy)
+            return True
         except Exception as e:
-            logger.error(f"Error updating location for delivery {delivery_id}: {e}")
+            logger.error(f"Error queueing location for delivery {delivery_id}: {e}")
             return False
     
-    def _should_create_checkpoint(self, delivery, latitude, longitude):
-        """Determine if a checkpoint should be created based on movement"""
-        if not delivery.current_latitude or not delivery.current_longitude:
-            return True
-        
-        # Calculate distance from last location
-        from math import radians, cos, sin, asin, sqrt
-        
-        def haversine(lon1, lat1, lon2, lat2):
-            """Calculate the great circle distance between two points on earth"""
-            lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-            dlon = lon2 - lon1
-            dlat = lat2 - lat1
-            a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-            c = 2 * asin(sqrt(a))
-            r = 6371  # Radius of earth in kilometers
-            return c * r
-        
-        distance = haversine(
-            float(delivery.current_longitude),
-            float(delivery.current_latitude),
-            longitude,
-            latitude
-        )
-        
-        # Create checkpoint if moved more than 100 meters
-        return distance > 0.1
-    
-    def _broadcast_location_update(self, delivery, latitude, longitude, location_name, accuracy):
+    def _broadcast_location_update(self, delivery, latitude, longitude, location_name, accuracy, previous_geohash=None):
         """Broadcast location update to WebSocket clients"""
         try:
             # Broadcast to customer tracking room
@@ -131,10 +75,10 @@ class GPSTrackingService:
                 }
             )
             
-            # Broadcast to admin monitoring room
-            admin_room = 'admin_delivery_monitoring'
-            async_to_sync(self.channel_layer.group_send)(
-                admin_room,
+            # Broadcast to the admins watching this delivery or its map tiles
+            admin_monitoring.publish(
+                delivery.id,
+                delivery.current_geohash,
                 {
                     'type': 'delivery_location_updated',
                     'delivery_id': delivery.id,
@@ -142,12 +86,27 @@ class GPSTrackingService:
                     'longitude': longitude,
                     'location_name': location_name,
                     'timestamp': timezone.now().isoformat()
-                }
+                },
+                previous_geohash
             )
             
         except Exception as e:
             logger.error(f"Error broadcasting location update: {e}")
     
+    def _broadcast_eta_update(self, delivery):
+        """Push a changed ETA to the customer tracking room"""
+        from .eta import eta_engine
+        try:
+            async_to_sync(self.channel_layer.group_send)(
+                f'delivery_tracking_{delivery.tracking_number}',
+                {
+                    'type': 'eta_update',
+                    'eta': eta_engine.get_eta_dict(delivery)
+                }
+            )
+        except Exception as e:
+            logger.error(f"Error broadcasting ETA update: {e}")
+    
     def get_active_gps_deliveries(self):
         """Get all deliveries with active GPS tracking"""
         return Delivery.objects.filter(
@@ -193,6 +152,10 @@ class MockGPSService:
                 if i < len(route_points) - 1:
                     import time
                     time.sleep(2)  # 2 seconds between updates
+            
+            # Persist the tail of the route before the caller moves on
+            from .gps_ingest import gps_ingestion
+            gps_ingestion.process_pending()
                     
         except Delivery.DoesNotExist:
             logger.error(f"Delivery {delivery_id} not found for simulation")
@@ -205,16 +168,13 @@ class MockGPSService:
         
         route = []
         
-        # Generate intermediate points
-        for i in range(num_points):
-            # Linear interpolation with some randomness
-            ratio = i / (num_points - 1)
-            lat = start_lat + (end_lat - start_lat) * ratio
-            lng = start_lng + (end_lng - start_lng) * ratio
-            
+        # Generate intermediate points with one interpolation over the whole route
+        fractions = [i / (num_points - 1) for i in range(num_points)] if num_points > 1 else [0.0]
+        lats, lngs = interpolate_points(start_lat, start_lng, end_lat, end_lng, fractions)
+        for i, (lat, lng) in enumerate(zip(lats, lngs)):
             # Add some randomness to simulate real road movement
-            lat += random.uniform(-0.001, 0.001)
-            lng += random.uniform(-0.001, 0.001)
+            lat = float(lat) + random.uniform(-0.001, 0.001)
+            lng = float(lng) + random.uniform(-0.001, 0.001)
             
             location_name = f"Route Point {i+1}"
             route.append((lat, lng, location_name))
@@ -0,0 +1,184 @@
+"""
+Compact storage for raw GPS traces.
+
+Every GPS fix used to become a DeliveryStatus row with a human readable
+description. Fixes are now appended to one LocationTraceChunk per delivery and
+hour instead: the points are delta-encoded (time in milliseconds, latitude and
+longitude in 1e-7 degrees, i.e. the precision of the coordinate columns) as
+zigzag varints in a single binary blob, so a fix costs a few bytes and no row.
+Each chunk also keeps its last point in plain columns so new fixes are appended
+without decoding what is already stored.
+
+DeliveryStatus is left for actual status changes; the full movement trace is
+read back with location_traces.get_trace() for replays and route drawing.
+"""
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+
+from .models import LocationTraceChunk
+
+logger = logging.getLogger(__name__)
+
+COORDINATE_SCALE = 10 ** 7
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def _write_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def to_trace_point(recorded_at, latitude, longitude, accuracy=None):
+    """Integer (ms, lat_e7, lng_e7, accuracy_cm) tuple for a fix"""
+    return (
+        int(round(recorded_at.timestamp() * 1000)),
+        int(round(float(latitude) * COORDINATE_SCALE)),
+        int(round(float(longitude) * COORDINATE_SCALE)),
+        int(round(float(accuracy) * 100)) if accuracy is not None else None
+    )
+
+
+def encode_points(points, previous=(0, 0, 0)):
+    """Encode points as deltas from previous (the chunk's last point, or zero for a new chunk)"""
+    out = bytearray()
+    last_ms, last_lat, last_lng = previous
+    for ms, lat, lng, accuracy in points:
+        _write_varint(out, _zigzag(ms - last_ms))
+        _write_varint(out, _zigzag(lat - last_lat))
+        _write_varint(out, _zigzag(lng - last_lng))
+        # Accuracy isn't correlated between fixes, store it as is (0 means unknown)
+        _write_varint(out, accuracy + 1 if accuracy is not None and accuracy >= 0 else 0)
+        last_ms, last_lat, last_lng = ms, lat, lng
+    return bytes(out)
+
+
+def decode_points(data):
+    """Decode a chunk blob back into (ms, lat_e7, lng_e7, accuracy_cm) tuples"""
+    data = bytes(data)
+    points = []
+    pos = 0
+    ms = lat = lng = 0
+    while pos < len(data):
+        delta, pos = _read_varint(data, pos)
+        ms += _unzigzag(delta)
+        delta, pos = _read_varint(data, pos)
+        lat += _unzigzag(delta)
+        delta, pos = _read_varint(data, pos)
+        lng += _unzigzag(delta)
+        accuracy, pos = _read_varint(data, pos)
+        points.append((ms, lat, lng, accuracy - 1 if accuracy else None))
+    return points
+
+
+def hour_start(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class LocationTraceStore:
+    """Appends GPS fixes to per delivery-hour trace chunks and reads them back"""
+
+    def append(self, fixes):
+        """
+        Append fixes (dicts with delivery_id, latitude, longitude, accuracy and
+        recorded_at) with one read of the affected chunks and two bulk writes
+        """
+        by_chunk = {}
+        for fix in fixes:
+            key = (fix['delivery_id'], hour_start(fix['recorded_at']))
+            by_chunk.setdefault(key, []).append(fix)
+        if not by_chunk:
+            return 0
+
+        with transaction.atomic():
+            existing = {
+                (chunk.delivery_id, chunk.hour_start): chunk
+                for chunk in LocationTraceChunk.objects.select_for_update().filter(
+                    delivery_id__in={delivery_id for delivery_id, _ in by_chunk},
+                    hour_start__in={hour for _, hour in by_chunk}
+                )
+            }
+
+            created, updated = [], []
+            for (delivery_id, hour), chunk_fixes in by_chunk.items():
+                chunk_fixes.sort(key=lambda fix: fix['recorded_at'])
+                points = [
+                    to_trace_point(fix['recorded_at'], fix['latitude'], fix['longitude'], fix.get('accuracy'))
+                    for fix in chunk_fixes
+                ]
+                chunk = existing.get((delivery_id, hour))
+                if chunk is None:
+                    chunk = LocationTraceChunk(
+                        delivery_id=delivery_id,
+                        hour_start=hour,
+                        data=encode_points(points)
+                    )
+                    created.append(chunk)
+                else:
+                    previous = (chunk.last_timestamp_ms, chunk.last_latitude_e7, chunk.last_longitude_e7)
+                    chunk.data = bytes(chunk.data) + encode_points(points, previous)
+                    updated.append(chunk)
+
+                first, last = chunk_fixes[0]['recorded_at'], chunk_fixes[-1]['recorded_at']
+                chunk.point_count = (chunk.point_count or 0) + len(points)
+                chunk.first_timestamp = min(chunk.first_timestamp or first, first)
+                chunk.last_timestamp = max(chunk.last_timestamp or last, last)
+                chunk.last_timestamp_ms, chunk.last_latitude_e7, chunk.last_longitude_e7 = points[-1][:3]
+
+            LocationTraceChunk.objects.bulk_create(created)
+            LocationTraceChunk.objects.bulk_update(updated, [
+                'data', 'point_count', 'first_timestamp', 'last_timestamp',
+                'last_timestamp_ms', 'last_latitude_e7', 'last_longitude_e7'
+            ])
+        return len(fixes)
+
+    def get_trace(self, delivery_id, start=None, end=None):
+        """Decoded trace of a delivery between start and end, oldest first"""
+        chunks = LocationTraceChunk.objects.filter(delivery_id=delivery_id)
+        if start is not None:
+            chunks = chunks.filter(last_timestamp__gte=start)
+        if end is not None:
+            chunks = chunks.filter(first_timestamp__lte=end)
+
+        start_ms = int(start.timestamp() * 1000) if start is not None else None
+        end_ms = int(end.timestamp() * 1000) if end is not None else None
+
+        points = []
+        for data in chunks.order_by('hour_start').values_list('data', flat=True):
+            for ms, lat, lng, accuracy in decode_points(data):
+                if (start_ms is not None and ms < start_ms) or (end_ms is not None and ms > end_ms):
+                    continue
+                points.append((ms, lat, lng, accuracy))
+        points.sort(key=lambda point: point[0])
+
+        return [{
+            'timestamp': datetime.fromtimestamp(ms / 1000, tz=dt_timezone.utc).isoformat(),
+            'latitude': lat / COORDINATE_SCALE,
+            'longitude': lng / COORDINATE_SCALE,
+            'accuracy': accuracy / 100 if accuracy is not None else None
+        } for ms, lat, lng, accuracy in points]
+
+
+# Global instance
+location_traces = LocationTraceStore()
@@ -0,0 +1,98 @@
+"""
+Management command comparing the scalar haversine path with tracking.geo
+"""
+
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from tracking import geo
+
+
+def legacy_should_create_checkpoint(last_lat, last_lng, latitude, longitude):
+    """The former per-fix check: a haversine closure defined on every call"""
+    def haversine(lat1, lon1, lat2, lon2):
+        from math import radians, cos, sin, asin, sqrt
+        lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
+        dlon = lon2 - lon1
+        dlat = lat2 - lat1
+        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+        return 2 * asin(sqrt(a)) * 6371
+
+    return haversine(last_lat, last_lng, latitude, longitude) > 0.1
+
+
+class Command(BaseCommand):
+    help = 'Benchmark checkpoint detection with the scalar path and the shared geo module'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fixes',
+            type=int,
+            default=100000,
+            help='Number of synthetic GPS fixes (default: 100000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs per implementation, the best one is reported (default: 3)',
+        )
+
+    def handle(self, *args, **options):
+        count = options['fixes']
+        repeat = options['repeat']
+
+        # A wandering courier: ~30m to ~300m between fixes
+        random.seed(42)
+        lats, lngs, times = [6.5244], [3.3792], [0.0]
+        for _ in range(count - 1):
+            lats.append(lats[-1] + random.uniform(-0.002, 0.002))
+            lngs.append(lngs[-1] + random.uniform(-0.002, 0.002))
+            times.append(times[-1] + random.uniform(5, 30))
+
+        def scalar():
+            return sum(
+                legacy_should_create_checkpoint(lats[i - 1], lngs[i - 1], lats[i], lngs[i])
+                for i in range(1, count)
+            )
+
+        def vectorized():
+            return sum(1 for distance in geo.segment_distances_km(lats, lngs) if distance > 0.1)
+
+        def best_of(function):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                result = function()
+                timings.append(time.perf_counter() - started)
+            return min(timings), result
+
+        self.stdout.write(f'{count} fixes, NumPy {"available" if geo.HAS_NUMPY else "not installed (pure Python path)"}')
+
+        scalar_time, scalar_result = best_of(scalar)
+        vector_time, vector_result = best_of(vectorized)
+        if scalar_result != vector_result:
+            self.stdout.write(self.style.ERROR(f'Checkpoint counts differ: {scalar_result} vs {vector_result}'))
+            return
+
+        self.stdout.write(f'Scalar checkpoint detection:  {scalar_time * 1000:8.1f} ms ({scalar_result} checkpoints)')
+        self.stdout.write(f'geo.segment_distances_km:     {vector_time * 1000:8.1f} ms ({scalar_time / vector_time:.1f}x)')
+
+        for label, function in (
+            ('geo.segment_bearings_deg', lambda: geo.segment_bearings_deg(lats, lngs)),
+            ('geo.segment_speeds_kmh', lambda: geo.segment_speeds_kmh(lats, lngs, times)),
+            ('geo.interpolate_points', lambda: geo.interpolate_points(lats[0], lngs[0], lats[-1], lngs[-1], [i / count for i in range(count)])),
+        ):
+            elapsed, _ = best_of(function)
+            self.stdout.write(f'{label + ":":30}{elapsed * 1000:8.1f} ms')
+
+        total_km = geo.track_length_km(lats, lngs)
+        reference_km = sum(
+            math.hypot(lats[i] - lats[i - 1], (lngs[i] - lngs[i - 1]) * math.cos(math.radians(lats[i]))) * 111.195
+            for i in range(1, count)
+        )
+        self.stdout.write(f'Track length {total_km:.1f} km (flat-earth estimate {reference_km:.1f} km)')
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0004_newslettersubscriber'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationTraceChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour_start', models.DateTimeField()),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('last_timestamp_ms', models.BigIntegerField()),
+                ('last_latitude_e7', models.IntegerField()),
+                ('last_longitude_e7', models.IntegerField()),
+                ('data', models.BinaryField()),
+                ('delivery', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trace_chunks', to='tracking.delivery')),
+            ],
+            options={
+                'ordering': ['hour_start'],
+                'indexes': [models.Index(fields=['delivery', 'first_timestamp'], name='tracking_lo_deliver_172b8c_idx')],
+                'unique_together': {('delivery', 'hour_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,94 @@
+from django.db import migrations
+
+# Frozen copy of the tracking.location_trace encoding, so this migration keeps
+# working whatever happens to the app code later
+COORDINATE_SCALE = 10 ** 7
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _write_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def hour_start(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def to_trace_point(recorded_at, latitude, longitude, accuracy=None):
+    """Integer (ms, lat_e7, lng_e7, accuracy_cm) tuple for a fix"""
+    return (
+        int(round(recorded_at.timestamp() * 1000)),
+        int(round(float(latitude) * COORDINATE_SCALE)),
+        int(round(float(longitude) * COORDINATE_SCALE)),
+        int(round(float(accuracy) * 100)) if accuracy is not None else None
+    )
+
+
+def encode_points(points):
+    """Delta-encode points as zigzag varints, starting from zero"""
+    out = bytearray()
+    last_ms = last_lat = last_lng = 0
+    for ms, lat, lng, accuracy in points:
+        _write_varint(out, _zigzag(ms - last_ms))
+        _write_varint(out, _zigzag(lat - last_lat))
+        _write_varint(out, _zigzag(lng - last_lng))
+        _write_varint(out, accuracy + 1 if accuracy is not None and accuracy >= 0 else 0)
+        last_ms, last_lat, last_lng = ms, lat, lng
+    return bytes(out)
+
+
+def move_location_updates_to_trace(apps, schema_editor):
+    """Move per-fix 'Location updated' status rows into compact trace chunks"""
+    DeliveryStatus = apps.get_model('tracking', 'DeliveryStatus')
+    LocationTraceChunk = apps.get_model('tracking', 'LocationTraceChunk')
+
+    location_updates = DeliveryStatus.objects.filter(
+        description__startswith='Location updated:',
+        latitude__isnull=False,
+        longitude__isnull=False
+    )
+    rows = location_updates.order_by('delivery_id', 'timestamp').values_list(
+        'delivery_id', 'timestamp', 'latitude', 'longitude', 'accuracy'
+    )
+
+    # Group consecutive rows into delivery-hour chunks
+    chunks = {}
+    for delivery_id, timestamp, latitude, longitude, accuracy in rows.iterator(chunk_size=2000):
+        chunk = chunks.setdefault((delivery_id, hour_start(timestamp)), [])
+        chunk.append((timestamp, to_trace_point(timestamp, latitude, longitude, accuracy)))
+
+    LocationTraceChunk.objects.bulk_create([
+        LocationTraceChunk(
+            delivery_id=delivery_id,
+            hour_start=hour,
+            point_count=len(points),
+            first_timestamp=points[0][0],
+            last_timestamp=points[-1][0],
+            last_timestamp_ms=points[-1][1][0],
+            last_latitude_e7=points[-1][1][1],
+            last_longitude_e7=points[-1][1][2],
+            data=encode_points([point for _, point in points])
+        )
+        for (delivery_id, hour), points in chunks.items()
+    ], batch_size=500)
+
+    if chunks:
+        location_updates.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0005_locationtracechunk'),
+    ]
+
+    operations = [
+        # Irreversible: the deleted status rows' status and description aren't kept in the trace
+        migrations.RunPython(move_location_updates_to_trace),
+    ]
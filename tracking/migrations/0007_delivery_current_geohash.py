@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:52
+
+from django.db import migrations, models
+
+from tracking.geo import geohash_encode
+
+
+def backfill_current_geohash(apps, schema_editor):
+    """Compute the geohash of every delivery that already has a position"""
+    Delivery = apps.get_model('tracking', 'Delivery')
+    
+    deliveries = list(Delivery.objects.filter(
+        current_latitude__isnull=False,
+        current_longitude__isnull=False
+    ).only('id', 'current_latitude', 'current_longitude'))
+    
+    for delivery in deliveries:
+        delivery.current_geohash = geohash_encode(delivery.current_latitude, delivery.current_longitude)
+    
+    Delivery.objects.bulk_update(deliveries, ['current_geohash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0006_move_location_updates_to_trace'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='current_geohash',
+            field=models.CharField(blank=True, help_text='Geohash of the current location, maintained on save', max_length=12, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['current_status', 'current_geohash'], name='tracking_de_current_b69a5f_idx'),
+        ),
+        migrations.RunPython(backfill_current_geohash, migrations.RunPython.noop),
+    ]
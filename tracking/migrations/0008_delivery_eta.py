@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0007_delivery_current_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='average_speed_kmh',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='delivery',
+            name='predicted_delivery',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='delivery',
+            name='remaining_distance_km',
+            field=models.DecimalField(blank=True, decimal_places=3, max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0009_trackingidsequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['created_at', 'id'], name='tracking_de_created_4acd6b_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Expressions match what Django's icontains/istartswith lookups compare on PostgreSQL
+SEARCH_INDEXES = {
+    'tracking_delivery_tracking_number_trgm': 'tracking_number',
+    'tracking_delivery_order_number_trgm': 'order_number',
+    'tracking_delivery_customer_name_trgm': 'customer_name',
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    """pg_trgm GIN indexes for delivery search; other databases keep plain lookups"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, column in SEARCH_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON tracking_delivery '
+            f'USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0010_delivery_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
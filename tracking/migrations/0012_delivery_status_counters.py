@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:09
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_status_counts(apps, schema_editor):
+    """Seed the counters from current statuses and the daily series from status history"""
+    Delivery = apps.get_model('tracking', 'Delivery')
+    DeliveryStatus = apps.get_model('tracking', 'DeliveryStatus')
+    DeliveryStatusCounter = apps.get_model('tracking', 'DeliveryStatusCounter')
+    DailyStatusCount = apps.get_model('tracking', 'DailyStatusCount')
+
+    counts = Delivery.objects.order_by().values('current_status').annotate(count=Count('id'))
+    DeliveryStatusCounter.objects.bulk_create([
+        DeliveryStatusCounter(status=row['current_status'], count=row['count'])
+        for row in counts
+    ])
+
+    daily = (
+        DeliveryStatus.objects.order_by()
+        .annotate(date=TruncDate('timestamp'))
+        .values('date', 'status')
+        .annotate(count=Count('delivery', distinct=True))
+    )
+    DailyStatusCount.objects.bulk_create([
+        DailyStatusCount(date=row['date'], status=row['status'], count=row['count'])
+        for row in daily
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0011_delivery_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryStatusCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('in_transit', 'In Transit'), ('out_for_delivery', 'Out for Delivery'), ('delivered', 'Delivered'), ('failed', 'Failed'), ('returned', 'Returned')], max_length=20, unique=True)),
+                ('count', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('in_transit', 'In Transit'), ('out_for_delivery', 'Out for Delivery'), ('delivered', 'Delivered'), ('failed', 'Failed'), ('returned', 'Returned')], max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['date', 'status'],
+                'unique_together': {('date', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_status_counts, migrations.RunPython.noop),
+    ]
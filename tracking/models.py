@@ -2,7 +2,6 @@ from django.db import models
 from django.utils import timezone
 from django.conf import settings
 import secrets
-import string
 
 
 class Delivery(models.Model):
@@ -39,6 +38,7 @@ class Delivery(models.Model):
     current_longitude = models.DecimalField(max_digits=10, decimal_places=7, blank=True, null=True)
     current_location_name = models.CharField(max_length=200, blank=True, null=True)
     last_location_update = models.DateTimeField(blank=True, null=True)
+    current_geohash = models.CharField(max_length=12, blank=True, null=True, help_text="Geohash of the current location, maintained on save")
     
     # Courier information
     courier_name = models.CharField(max_length=200, blank=True, null=True)
@@ -61,6 +61,11 @@ class Delivery(models.Model):
     estimated_delivery = models.DateTimeField(blank=True, null=True)
     actual_delivery = models.DateTimeField(blank=True, null=True)
     
+    # Live ETA, maintained from GPS fixes by tracking.eta
+    predicted_delivery = models.DateTimeField(blank=True, null=True)
+    average_speed_kmh = models.DecimalField(max_digits=6, decimal_places=2, blank=True, null=True)
+    remaining_distance_km = models.DecimalField(max_digits=10, decimal_places=3, blank=True, null=True)
+    
     # GPS and location tracking settings
     gps_tracking_enabled = models.BooleanField(default=False, help_text="Enable automatic GPS tracking")
     location_update_frequency = models.IntegerField(default=30, help_text="Location update frequency in seconds")
@@ -80,10 +85,21 @@ class Delivery(models.Model):
     class Meta:
         verbose_name_plural = 'Deliveries'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['current_status', 'current_geohash']),
+            models.Index(fields=['created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"Delivery {self.tracking_number} - {self.customer_name}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Status as loaded, so save() knows which counter a status change leaves
+        instance._loaded_status = instance.__dict__.get('current_status')
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.tracking_number:
             self.tracking_number = self.generate_tracking_number()
@@ -95,20 +111,51 @@ class Delivery(models.Model):
             self.tracking_link_expires = timezone.now() + timezone.timedelta(
                 days=getattr(settings, 'TRACKING_LINK_EXPIRY_DAYS', 30)
             )
-        super().save(*args, **kwargs)
+        
+        # Keep the spatial index column in step with the current position
+        self.current_geohash = self.compute_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'current_latitude', 'current_longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'current_geohash'}
+        
+        # Creations and status changes move the per-status counters in the same transaction
+        adding = self._state.adding
+        previous_status = getattr(self, '_loaded_status', None)
+        status_changed = (
+            (update_fields is None or 'current_status' in update_fields)
+            and previous_status is not None
+            and previous_status != self.current_status
+        )
+        if adding or status_changed:
+            from django.db import transaction
+            from .stats import delivery_stats
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                if adding:
+                    delivery_stats.record_created(self.current_status)
+                else:
+                    delivery_stats.record_transition(previous_status, self.current_status)
+        else:
+            super().save(*args, **kwargs)
+        self._loaded_status = self.current_status
+        
+        from .tracking_document import tracking_documents
+        from .tracking_lookup import tracking_lookup
+        tracking_documents.invalidate(self.tracking_number)
+        if update_fields is None or {'tracking_number', 'tracking_secret', 'tracking_link_expires'} & set(update_fields):
+            tracking_lookup.remember(self)
+    
+    def compute_geohash(self):
+        """Geohash of the current location, None without one"""
+        from .geo import geohash_encode
+        if self.current_latitude is None or self.current_longitude is None:
+            return None
+        return geohash_encode(self.current_latitude, self.current_longitude)
     
     def generate_tracking_number(self):
         """Generate a unique tracking number"""
-        import random
-        import string
-        
-        while True:
-            # Generate a 12-character alphanumeric tracking number
-            tracking_number = ''.join(
-                random.choices(string.ascii_uppercase + string.digits, k=12)
-            )
-            if not Delivery.objects.filter(tracking_number=tracking_number).exists():
-                return tracking_number
+        from .tracking_ids import tracking_ids
+        return tracking_ids.allocate()
     
     def generate_tracking_secret(self):
         """Generate a secure tracking secret"""
@@ -163,27 +210,34 @@ class Delivery(models.Model):
         return None
     
     def update_current_location(self, latitude, longitude, location_name=None, accuracy=None):
-        """Update current location and create status update"""
+        """Update current location and append the fix to the location trace"""
         from django.utils import timezone
+        from .location_trace import location_traces
         
+        now = timezone.now()
         self.current_latitude = latitude
         self.current_longitude = longitude
         self.current_location_name = location_name
-        self.last_location_update = timezone.now()
-        self.last_gps_update = timezone.now()
-        self.save()
+        self.last_location_update = now
+        self.last_gps_update = now
+        self.save(update_fields=[
+            'current_latitude', 'current_longitude', 'current_location_name',
+            'last_location_update', 'last_gps_update', 'updated_at'
+        ])
         
-        # Create a location update status
-        DeliveryStatus.objects.create(
-            delivery=self,
-            status=self.current_status,
-            location=location_name or f"Lat: {latitude}, Lng: {longitude}",
-            description=f"Location updated: {location_name or 'GPS coordinates'}",
-            latitude=latitude,
-            longitude=longitude,
-            location_name=location_name,
-            accuracy=accuracy
-        )
+        # Raw fixes go to the compact trace; status_updates keeps only status changes
+        location_traces.append([{
+            'delivery_id': self.id,
+            'latitude': latitude,
+            'longitude': longitude,
+            'accuracy': accuracy,
+            'recorded_at': now
+        }])
+    
+    def get_location_trace(self, start=None, end=None):
+        """Full GPS trace for replay, oldest first"""
+        from .location_trace import location_traces
+        return location_traces.get_trace(self.id, start, end)
     
     def get_courier_info(self):
         """Get courier information as dictionary"""
@@ -240,11 +294,35 @@ class DeliveryStatus(models.Model):
     def __str__(self):
         return f"{self.delivery.tracking_number} - {self.status} at {self.timestamp}"
     
-    def save(self, *args, **kwargs):
-        # Update the delivery's current status
-        self.delivery.current_status = self.status
-        self.delivery.save()
-        super().save(*args, **kwargs)
+    def clean(self):
+        """Reject status changes the transition rules don't allow (admin and model forms)"""
+        from django.core.exceptions import ValidationError
+        from .status_transitions import StatusTransitionError, status_transitions
+        
+        if self.delivery_id and self.status != self.delivery.current_status:
+            try:
+                status_transitions.validate(self.delivery, self.status)
+            except StatusTransitionError as e:
+                raise ValidationError({'status': str(e)})
+    
+    def save(self, *args, sync_delivery=True, **kwargs):
+        from django.db import transaction
+        from .status_transitions import status_transitions
+        from .tracking_document import tracking_documents
+        
+        # Rows that move the delivery follow the same rules as status_transitions.transition;
+        # recording the status it already has doesn't move it
+        if sync_delivery and self.status != self.delivery.current_status:
+            status_transitions.validate(self.delivery, self.status)
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            # Update the delivery's current status (status_transitions saves the delivery itself)
+            if sync_delivery:
+                self.delivery.save(update_fields=status_transitions.apply(self.delivery, self.status, self.timestamp))
+        
+        tracking_documents.invalidate(self.delivery.tracking_number)
 
 
 class DeliveryCheckpoint(models.Model):
@@ -293,6 +371,12 @@ class DeliveryCheckpoint(models.Model):
     def __str__(self):
         return f"{self.delivery.tracking_number} - {self.get_checkpoint_type_display()} at {self.location_name}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        
+        from .tracking_document import tracking_documents
+        tracking_documents.invalidate(self.delivery.tracking_number)
+    
     def get_location_dict(self):
         """Get location as dictionary for API responses"""
         return {
@@ -306,6 +390,74 @@ class DeliveryCheckpoint(models.Model):
         }
 
 
+class LocationTraceChunk(models.Model):
+    """Delta-encoded raw GPS points of one delivery for one hour (see tracking.location_trace)"""
+    
+    delivery = models.ForeignKey(
+        Delivery,
+        on_delete=models.CASCADE,
+        related_name='trace_chunks'
+    )
+    hour_start = models.DateTimeField()
+    point_count = models.PositiveIntegerField(default=0)
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    
+    # Last encoded point, so new points are appended without decoding the blob
+    last_timestamp_ms = models.BigIntegerField()
+    last_latitude_e7 = models.IntegerField()
+    last_longitude_e7 = models.IntegerField()
+    
+    data = models.BinaryField()
+    
+    class Meta:
+        ordering = ['hour_start']
+        unique_together = ['delivery', 'hour_start']
+        indexes = [
+            models.Index(fields=['delivery', 'first_timestamp']),
+        ]
+    
+    def __str__(self):
+        return f"{self.delivery_id} trace {self.hour_start} ({self.point_count} points)"
+
+
+class TrackingIdSequence(models.Model):
+    """Next unreserved counter value of a tracking number sequence (see tracking.tracking_ids)"""
+    
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
+class DeliveryStatusCounter(models.Model):
+    """Number of deliveries currently in a status, maintained by status changes (see tracking.stats)"""
+    
+    status = models.CharField(max_length=20, choices=Delivery.STATUS_CHOICES, unique=True)
+    count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.status}: {self.count}"
+
+
+class DailyStatusCount(models.Model):
+    """Number of deliveries that entered a status on a given day"""
+    
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Delivery.STATUS_CHOICES)
+    count = models.BigIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['date', 'status']
+        unique_together = ['date', 'status']
+    
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.count}"
+
+
 class NewsletterSubscriber(models.Model):
     """Model for newsletter subscribers"""
     
@@ -0,0 +1,92 @@
+"""
+Routing of delivery location events to admin monitoring sockets.
+
+Admin sockets subscribe to what their map shows instead of the whole fleet:
+either the geohash tiles covering their viewport or an explicit list of
+delivery ids. Every location event is published to the tile groups that
+contain the delivery (one per tile precision, plus the tiles it just left so
+viewers see it exit) and to the delivery's own group. Per-admin traffic then
+grows with the viewport, not with the size of the fleet.
+
+Sockets that haven't subscribed stay in the fleet-wide group, which keeps
+receiving every event as before.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .geo import geohash_cover
+
+logger = logging.getLogger(__name__)
+
+FLEET_GROUP = 'admin_delivery_monitoring'
+
+# Tile sizes admins can subscribe at, coarsest first (~5000km, ~1250km, ~156km, ~39km wide)
+TILE_PRECISIONS = (1, 2, 3, 4)
+
+# A viewport is covered with at most about this many tiles
+MAX_SUBSCRIBED_TILES = 32
+
+
+def tile_group(geohash_prefix):
+    return f'admin_tile_{geohash_prefix}'
+
+
+def delivery_group(delivery_id):
+    return f'admin_delivery_{delivery_id}'
+
+
+def tile_groups_for(geohash):
+    """Tile groups containing a position, one per subscribable precision"""
+    if not geohash:
+        return set()
+    return {tile_group(geohash[:precision]) for precision in TILE_PRECISIONS}
+
+
+def viewport_groups(bounds):
+    """Tile groups covering a viewport {north, south, east, west}"""
+    south, north = bounds['south'], bounds['north']
+    west, east = bounds['west'], bounds['east']
+    boxes = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+
+    groups = set()
+    for box_west, box_east in boxes:
+        cells = geohash_cover(south, box_west, north, box_east, MAX_SUBSCRIBED_TILES // len(boxes), max(TILE_PRECISIONS))
+        groups.update(tile_group(cell) for cell in cells)
+    return groups
+
+
+class AdminMonitoringRouter:
+    """Publishes delivery location events to the fleet, tile and delivery groups"""
+
+    def __init__(self):
+        self._channel_layer = None
+
+    @property
+    def channel_layer(self):
+        if self._channel_layer is None:
+            self._channel_layer = get_channel_layer()
+        return self._channel_layer
+
+    def groups_for(self, delivery_id, geohash, previous_geohash=None):
+        groups = {FLEET_GROUP, delivery_group(delivery_id)}
+        groups |= tile_groups_for(geohash)
+        if previous_geohash and previous_geohash != geohash:
+            groups |= tile_groups_for(previous_geohash)
+        return groups
+
+    async def apublish(self, delivery_id, geohash, event, previous_geohash=None):
+        """Send a delivery_location_updated event to every interested group"""
+        for group in self.groups_for(delivery_id, geohash, previous_geohash):
+            try:
+                await self.channel_layer.group_send(group, event)
+            except Exception as e:
+                logger.error(f"Error publishing location update to {group}: {e}")
+
+    def publish(self, delivery_id, geohash, event, previous_geohash=None):
+        async_to_sync(self.apublish)(delivery_id, geohash, event, previous_geohash)
+
+
+# Global instance
+admin_monitoring = AdminMonitoringRouter()
@@ -0,0 +1,88 @@
+"""
+Keyset pagination for delivery listings.
+
+Pages are ordered newest first by (created_at, id), and the cursor carries
+the last row's key: the next page is "created_at < t OR (created_at = t AND
+id < n)", which the (created_at, id) index answers without counting or
+skipping rows. Page cost stays the same however deep the listing goes.
+"""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+class DeliveryCursorPagination(BasePagination):
+    """Forward-only cursor pagination on (created_at, id), newest first"""
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        page_size = api_settings.PAGE_SIZE or 20
+        try:
+            requested = int(request.query_params.get(self.page_size_query_param, page_size))
+        except (TypeError, ValueError):
+            return page_size
+        return max(1, min(requested, self.max_page_size))
+
+    def encode_cursor(self, instance):
+        position = f'{instance.created_at.isoformat()}|{instance.pk}'
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError(cursor)
+            return created_at, int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by('-created_at', '-pk')
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+        # One extra row tells whether there is a next page, without a COUNT
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_cursor = self.encode_cursor(rows[-1]) if self.has_next else None
+        return rows
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        params = self.request.query_params.copy()
+        params[self.cursor_query_param] = self.next_cursor
+        return self.request.build_absolute_uri(f'{self.request.path}?{params.urlencode()}')
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
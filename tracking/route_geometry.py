@@ -0,0 +1,190 @@
+"""
+Route geometry for tracking maps.
+
+Builds the travelled path of a delivery from its stored location trace (or its
+checkpoints when no trace exists), simplifies it with Douglas-Peucker using a
+tolerance matched to the map zoom level and ships it as a Google encoded
+polyline string. Results are cached per delivery, location version and zoom
+level, so repeated map loads don't decode or simplify the trace again.
+"""
+import logging
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371008.8
+
+# Ground resolution of one map pixel at zoom 0 on the equator (Web Mercator)
+METERS_PER_PIXEL_Z0 = 156543.03392
+
+DEFAULT_ZOOM = 14
+MIN_ZOOM = 0
+MAX_ZOOM = 21
+
+
+def tolerance_for_zoom(zoom, pixels=1.0):
+    """Simplification tolerance in meters: detail below `pixels` screen pixels is dropped"""
+    return METERS_PER_PIXEL_Z0 / (2 ** zoom) * pixels
+
+
+def _project(points):
+    """Equirectangular projection to meters around the track's mean latitude"""
+    mean_lat = math.radians(sum(lat for lat, _ in points) / len(points))
+    x_scale = EARTH_RADIUS_M * math.cos(mean_lat) * math.pi / 180
+    y_scale = EARTH_RADIUS_M * math.pi / 180
+    return [(lng * x_scale, lat * y_scale) for lat, lng in points]
+
+
+def douglas_peucker(points, tolerance_m):
+    """Simplify [(lat, lng), ...] keeping every vertex further than tolerance_m from the simplified line"""
+    if len(points) < 3 or tolerance_m <= 0:
+        return list(points)
+
+    projected = _project(points)
+    tolerance_sq = tolerance_m * tolerance_m
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+
+    # Iterative to stay clear of the recursion limit on long traces
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        ax, ay = projected[first]
+        bx, by = projected[last]
+        dx, dy = bx - ax, by - ay
+        segment_sq = dx * dx + dy * dy
+
+        max_distance_sq = -1.0
+        index = first
+        for i in range(first + 1, last):
+            px, py = projected[i]
+            if segment_sq == 0:
+                distance_sq = (px - ax) ** 2 + (py - ay) ** 2
+            else:
+                t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / segment_sq))
+                distance_sq = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2
+            if distance_sq > max_distance_sq:
+                max_distance_sq = distance_sq
+                index = i
+
+        if max_distance_sq > tolerance_sq:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def encode_polyline(points, precision=5):
+    """Google encoded polyline of [(lat, lng), ...]"""
+    factor = 10 ** precision
+    out = []
+    last_lat = last_lng = 0
+    for lat, lng in points:
+        lat_e, lng_e = int(round(lat * factor)), int(round(lng * factor))
+        for delta in (lat_e - last_lat, lng_e - last_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        last_lat, last_lng = lat_e, lng_e
+    return ''.join(out)
+
+
+def decode_polyline(polyline, precision=5):
+    """Inverse of encode_polyline"""
+    factor = 10 ** precision
+    points = []
+    index = lat = lng = 0
+    while index < len(polyline):
+        deltas = []
+        for _ in range(2):
+            result = shift = 0
+            while True:
+                byte = ord(polyline[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
+
+
+class RouteGeometryService:
+    """Simplified, polyline-encoded delivery routes cached per delivery and zoom level"""
+
+    CACHE_KEY = 'tracking:route:{delivery_id}:{version}:{zoom}'
+
+    def __init__(self, cache_timeout=None):
+        self.cache_timeout = cache_timeout or getattr(settings, 'ROUTE_GEOMETRY_CACHE_TIMEOUT', 3600)
+
+    def get_raw_points(self, delivery):
+        """Travelled path as [(lat, lng), ...], oldest first"""
+        trace = delivery.get_location_trace()
+        if trace:
+            points = [(point['latitude'], point['longitude']) for point in trace]
+        else:
+            points = [
+                (float(latitude), float(longitude))
+                for latitude, longitude in delivery.checkpoints.order_by('timestamp').values_list('latitude', 'longitude')
+            ]
+
+        if delivery.pickup_latitude and delivery.pickup_longitude:
+            points.insert(0, (float(delivery.pickup_latitude), float(delivery.pickup_longitude)))
+        if delivery.has_geolocation():
+            current = (float(delivery.current_latitude), float(delivery.current_longitude))
+            if not points or points[-1] != current:
+                points.append(current)
+        return points
+
+    def _version(self, delivery):
+        """Changes whenever a new fix is stored, so stale routes are never served"""
+        last_update = delivery.last_location_update
+        return int(last_update.timestamp() * 1000) if last_update else 0
+
+    def get_route(self, delivery, zoom=None):
+        """Route payload for a map at the given zoom level"""
+        try:
+            zoom = int(zoom) if zoom is not None else DEFAULT_ZOOM
+        except (TypeError, ValueError):
+            zoom = DEFAULT_ZOOM
+        zoom = max(MIN_ZOOM, min(MAX_ZOOM, zoom))
+
+        cache_key = self.CACHE_KEY.format(delivery_id=delivery.id, version=self._version(delivery), zoom=zoom)
+        try:
+            route = cache.get(cache_key)
+            if route is not None:
+                return route
+        except Exception as e:
+            logger.warning(f"Could not read cached route for delivery {delivery.id}: {e}")
+
+        raw_points = self.get_raw_points(delivery)
+        tolerance = tolerance_for_zoom(zoom)
+        simplified = douglas_peucker(raw_points, tolerance)
+        route = {
+            'polyline': encode_polyline(simplified),
+            'zoom': zoom,
+            'tolerance_m': round(tolerance, 2),
+            'point_count': len(simplified),
+            'raw_point_count': len(raw_points)
+        }
+
+        try:
+            cache.set(cache_key, route, self.cache_timeout)
+        except Exception as e:
+            logger.warning(f"Could not cache route for delivery {delivery.id}: {e}")
+        return route
+
+
+# Global instance
+route_geometry = RouteGeometryService()
@@ -0,0 +1,67 @@
+"""
+Staff search over deliveries.
+
+Tracking and order numbers are matched exactly or by prefix, customer names
+by substring. On PostgreSQL the 0011 migration adds pg_trgm GIN indexes on
+UPPER(tracking_number), UPPER(order_number) and UPPER(customer_name), the
+expressions Django's case-insensitive lookups compare against, so both the
+prefix and the substring lookups below are index scans instead of
+sequential scans. Other databases (SQLite in local development) run the same
+lookups without those indexes.
+
+Trigrams need at least three characters; shorter queries only match number
+prefixes and the start of customer names.
+"""
+import logging
+import re
+
+from django.db.models import Q
+
+from .models import Delivery
+
+logger = logging.getLogger(__name__)
+
+# Shortest query that substring matching is used for (one trigram)
+MIN_SUBSTRING_LENGTH = 3
+
+# Queries that look like a tracking or order number rather than a name
+NUMBER_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class DeliverySearch:
+    """Builds indexed search filters for delivery lookups"""
+
+    def number_filter(self, query):
+        """Exact or prefix match on tracking and order numbers"""
+        return (
+            Q(tracking_number=query.upper())
+            | Q(order_number=query)
+            | Q(tracking_number__istartswith=query)
+            | Q(order_number__istartswith=query)
+        )
+
+    def name_filter(self, query):
+        if len(query) < MIN_SUBSTRING_LENGTH:
+            return Q(customer_name__istartswith=query)
+        return Q(customer_name__icontains=query)
+
+    def filter(self, queryset, query):
+        """Narrow a delivery queryset to those matching a free-text query"""
+        query = (query or '').strip()
+        if not query:
+            return queryset
+
+        condition = self.name_filter(query)
+        if NUMBER_PATTERN.match(query):
+            condition |= self.number_filter(query)
+        return queryset.filter(condition)
+
+    def search(self, query, status=None, queryset=None):
+        queryset = queryset if queryset is not None else Delivery.objects.all()
+        if status:
+            queryset = queryset.filter(current_status=status)
+        return self.filter(queryset, query)
+
+
+# Global instance
+delivery_search = DeliverySearch()
@@ -1,5 +1,6 @@
+from django.utils.functional import cached_property
 from rest_framework import serializers
-from .models import Delivery, DeliveryStatus
+from .models import Delivery, DeliveryStatus, DeliveryCheckpoint
 
 
 class DeliveryStatusSerializer(serializers.ModelSerializer):
@@ -21,7 +22,29 @@ class DeliveryStatusSerializer(serializers.ModelSerializer):
         return obj.timestamp.strftime('%B %d, %Y at %I:%M %p')
 
 
-class DeliverySerializer(serializers.ModelSerializer):
+class TrackingUrlMixin:
+    """Builds absolute tracking URLs, reading the request's scheme and host once per serializer"""
+    
+    @cached_property
+    def tracking_base_url(self):
+        request = self.context.get('request')
+        if not request:
+            return ''
+        
+        # Generate tracking URL using the current request's scheme and host
+        scheme = request.scheme
+        host = request.get_host()
+        
+        # Handle port forwarding - use the forwarded host if available
+        if 'HTTP_X_FORWARDED_HOST' in request.META:
+            host = request.META['HTTP_X_FORWARDED_HOST']
+        elif 'HTTP_HOST' in request.META:
+            host = request.META['HTTP_HOST']
+        
+        return f"{scheme}://{host}"
+
+
+class DeliverySerializer(TrackingUrlMixin, serializers.ModelSerializer):
     """Serializer for delivery entries"""
     
     status_updates = DeliveryStatusSerializer(many=True, read_only=True)
@@ -51,22 +74,7 @@ class DeliverySerializer(serializers.ModelSerializer):
     
     def get_tracking_url(self, obj):
         """Get the tracking URL for the delivery"""
-        request = self.context.get('request')
-        if request:
-            # Generate tracking URL using the current request's scheme and host
-            scheme = request.scheme
-            host = request.get_host()
-            
-            # Handle port forwarding - use the forwarded host if available
-            if 'HTTP_X_FORWARDED_HOST' in request.META:
-                host = request.META['HTTP_X_FORWARDED_HOST']
-            elif 'HTTP_HOST' in request.META:
-                host = request.META['HTTP_HOST']
-            
-            # Build the tracking URL
-            tracking_path = obj.get_tracking_url()
-            return f"{scheme}://{host}{tracking_path}"
-        return obj.get_tracking_url()
+        return f"{self.tracking_base_url}{obj.get_tracking_url()}"
     
     def get_is_expired(self, obj):
         """Check if the tracking link has expired"""
@@ -89,7 +97,33 @@ class DeliverySerializer(serializers.ModelSerializer):
         return None
 
 
-class DeliveryCreateSerializer(serializers.ModelSerializer):
+class DeliveryListSerializer(TrackingUrlMixin, serializers.ModelSerializer):
+    """Serializer for delivery listings (no nested status history)"""
+    
+    current_status_display = serializers.CharField(source='get_current_status_display', read_only=True)
+    tracking_url = serializers.SerializerMethodField()
+    is_expired = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Delivery
+        fields = [
+            'id', 'order_number', 'tracking_number', 'tracking_secret', 'customer_name',
+            'delivery_address', 'current_status', 'current_status_display',
+            'estimated_delivery', 'actual_delivery', 'tracking_url', 'is_expired',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+    
+    def get_tracking_url(self, obj):
+        """Get the tracking URL for the delivery"""
+        return f"{self.tracking_base_url}{obj.get_tracking_url()}"
+    
+    def get_is_expired(self, obj):
+        """Check if the tracking link has expired"""
+        return obj.is_tracking_link_expired()
+
+
+class DeliveryCreateSerializer(TrackingUrlMixin, serializers.ModelSerializer):
     """Serializer for creating delivery entries"""
     
     tracking_number = serializers.CharField(read_only=True)
@@ -106,22 +140,7 @@ class DeliveryCreateSerializer(serializers.ModelSerializer):
     
     def get_tracking_url(self, obj):
         """Get the tracking URL for the delivery"""
-        request = self.context.get('request')
-        if request:
-            # Generate tracking URL using the current request's scheme and host
-            scheme = request.scheme
-            host = request.get_host()
-            
-            # Handle port forwarding - use the forwarded host if available
-            if 'HTTP_X_FORWARDED_HOST' in request.META:
-                host = request.META['HTTP_X_FORWARDED_HOST']
-            elif 'HTTP_HOST' in request.META:
-                host = request.META['HTTP_HOST']
-            
-            # Build the tracking URL
-            tracking_path = obj.get_tracking_url()
-            return f"{scheme}://{host}{tracking_path}"
-        return obj.get_tracking_url()
+        return f"{self.tracking_base_url}{obj.get_tracking_url()}"
     
     def create(self, validated_data):
         """Create a new delivery with tracking information"""
@@ -131,12 +150,12 @@ class DeliveryCreateSerializer(serializers.ModelSerializer):
         
         delivery = Delivery.objects.create(**validated_data)
         
-        # Create initial status update
-        DeliveryStatus.objects.create(
+        # Create initial status update (the delivery is already pending)
+        DeliveryStatus(
             delivery=delivery,
             status='pending',
             description='Order received and pending confirmation'
-        )
+        ).save(sync_delivery=False)
         
         return delivery
 
@@ -155,6 +174,32 @@ class DeliveryStatusCreateSerializer(serializers.ModelSerializer):
         return value
 
 
+class BulkScanSerializer(serializers.Serializer):
+    """Serializer for bulk hub scans (one status for many parcels)"""
+    
+    tracking_numbers = serializers.ListField(
+        child=serializers.CharField(max_length=100), allow_empty=False, max_length=5000
+    )
+    status = serializers.ChoiceField(choices=Delivery.STATUS_CHOICES)
+    description = serializers.CharField(required=False)
+    location = serializers.CharField(max_length=200, required=False)
+    checkpoint_type = serializers.ChoiceField(choices=DeliveryCheckpoint.CHECKPOINT_TYPES, required=False)
+    location_name = serializers.CharField(max_length=200, required=False)
+    latitude = serializers.DecimalField(max_digits=10, decimal_places=7, required=False)
+    longitude = serializers.DecimalField(max_digits=10, decimal_places=7, required=False)
+    accuracy = serializers.DecimalField(max_digits=8, decimal_places=2, required=False)
+    notify = serializers.BooleanField(default=True)
+    
+    def validate(self, data):
+        """A checkpoint needs a position and a name"""
+        if data.get('checkpoint_type'):
+            if data.get('latitude') is None or data.get('longitude') is None:
+                raise serializers.ValidationError("latitude and longitude are required to create a checkpoint.")
+            if not data.get('location_name') and not data.get('location'):
+                raise serializers.ValidationError("location or location_name is required to create a checkpoint.")
+        return data
+
+
 class TrackingResponseSerializer(serializers.ModelSerializer):
     """Serializer for tracking response (public API)"""
     
@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Delivery
+
+
+@receiver(post_delete, sender=Delivery)
+def forget_deleted_delivery(sender, instance, **kwargs):
+    """Stop serving a deleted delivery's tracking number from the lookup and document caches"""
+    from .tracking_document import tracking_documents
+    from .tracking_lookup import tracking_lookup
+
+    tracking_number = instance.tracking_number
+    transaction.on_commit(lambda: tracking_lookup.forget(tracking_number))
+    tracking_documents.invalidate(tracking_number)
+
+
+@receiver(post_delete, sender=Delivery)
+def count_deleted_delivery(sender, instance, **kwargs):
+    """Take a deleted delivery out of its status counter once the delete commits"""
+    from .stats import delivery_stats
+
+    status = instance.current_status
+    transaction.on_commit(lambda: delivery_stats.record_deleted(status))
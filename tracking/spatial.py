@@ -0,0 +1,94 @@
+"""
+Spatial lookups over delivery positions.
+
+Delivery.current_geohash is maintained whenever the current position changes
+and indexed together with current_status. A bounding box is covered with a
+handful of geohash prefixes, each turned into a range scan on that index
+(geohash >= prefix AND geohash < prefix + '{', '{' sorting right after 'z'),
+and the candidates are then trimmed to the exact box. Nearest-neighbour
+lookups widen a box around the point until enough candidates are found.
+"""
+import logging
+import math
+
+from django.db.models import Q
+
+from .geo import geohash_cover, haversine_km
+from .models import Delivery
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ['confirmed', 'in_transit', 'out_for_delivery']
+
+# One degree of latitude in kilometers
+KM_PER_DEGREE = 111.195
+
+
+def _prefix_range(prefix):
+    return Q(current_geohash__gte=prefix, current_geohash__lt=prefix + '{')
+
+
+class DeliverySpatialIndex:
+    """Bounding-box and nearest-neighbour queries on current delivery positions"""
+
+    def __init__(self, max_cells=32):
+        self.max_cells = max_cells
+
+    def _base_queryset(self, statuses, queryset):
+        queryset = queryset if queryset is not None else Delivery.objects.all()
+        if statuses:
+            queryset = queryset.filter(current_status__in=statuses)
+        return queryset
+
+    def within_bbox(self, south, west, north, east, statuses=ACTIVE_STATUSES, queryset=None):
+        """Deliveries whose current position lies inside the box; west > east crosses the antimeridian"""
+        south, west, north, east = float(south), float(west), float(north), float(east)
+        if south > north:
+            south, north = north, south
+
+        boxes = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+        cells_filter = Q()
+        exact_filter = Q()
+        for box_west, box_east in boxes:
+            for prefix in geohash_cover(south, box_west, north, box_east, self.max_cells):
+                cells_filter |= _prefix_range(prefix)
+            exact_filter |= Q(current_longitude__gte=box_west, current_longitude__lte=box_east)
+
+        return self._base_queryset(statuses, queryset).filter(cells_filter).filter(
+            exact_filter,
+            current_latitude__gte=south,
+            current_latitude__lte=north
+        )
+
+    def nearest_n(self, latitude, longitude, n=10, statuses=ACTIVE_STATUSES, max_radius_km=500, queryset=None):
+        """Up to n deliveries closest to a point as (delivery, distance_km) pairs, nearest first"""
+        latitude, longitude = float(latitude), float(longitude)
+        radius_km = 1.0
+        while True:
+            lat_delta = radius_km / KM_PER_DEGREE
+            lng_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+            west, east = longitude - lng_delta, longitude + lng_delta
+            if west < -180:
+                west += 360
+            if east > 180:
+                east -= 360
+
+            candidates = list(self.within_bbox(
+                latitude - lat_delta, west, latitude + lat_delta, east, statuses, queryset
+            ))
+            ranked = sorted(
+                (
+                    (delivery, haversine_km(latitude, longitude, float(delivery.current_latitude), float(delivery.current_longitude)))
+                    for delivery in candidates
+                ),
+                key=lambda pair: pair[1]
+            )
+            # Only candidates within the radius are guaranteed to be the true nearest
+            within = [pair for pair in ranked if pair[1] <= radius_km]
+            if len(within) >= n or radius_km >= max_radius_km:
+                return within[:n]
+            radius_km = min(radius_km * 4, max_radius_km)
+
+
+# Global instance
+delivery_spatial = DeliverySpatialIndex()
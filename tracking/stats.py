@@ -0,0 +1,131 @@
+"""
+Delivery statistics from materialized counters.
+
+DeliveryStatusCounter holds the number of deliveries currently in each
+status and DailyStatusCount the number that entered each status per day.
+Both are updated in the same transaction as the status change: Delivery.save
+records creations and status changes, and bulk status transitions record
+their whole batch at once. Deletes (including queryset deletes, which send
+post_delete per row) take the delivery out of its counter once they commit.
+The dashboard and stats API read the counters with a single query.
+
+Writes that bypass those paths (bulk_create imports, queryset update() of
+current_status, raw SQL) make the counters drift; reconcile() recomputes them
+with one conditional aggregate and runs periodically from Celery beat.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import DailyStatusCount, Delivery, DeliveryStatusCounter
+
+logger = logging.getLogger(__name__)
+
+STATUSES = [status for status, _ in Delivery.STATUS_CHOICES]
+
+
+class DeliveryStatsService:
+    """Maintains and reads per-status delivery counters"""
+
+    def _bump(self, model, lookup, delta):
+        """Add delta to a counter row, creating it on first use"""
+        if not delta:
+            return
+        if model.objects.filter(**lookup).update(count=F('count') + delta):
+            return
+        try:
+            with transaction.atomic():
+                model.objects.create(count=delta, **lookup)
+        except IntegrityError:
+            # Another transaction created the row first
+            model.objects.filter(**lookup).update(count=F('count') + delta)
+
+    def record_transitions(self, previous_statuses, status, at=None):
+        """Record deliveries moving to status; previous_statuses maps old status -> count (None for new deliveries)"""
+        entered = 0
+        for previous_status, count in previous_statuses.items():
+            if previous_status == status:
+                continue
+            if previous_status is not None:
+                self._bump(DeliveryStatusCounter, {'status': previous_status}, -count)
+            entered += count
+
+        if entered:
+            self._bump(DeliveryStatusCounter, {'status': status}, entered)
+            day = timezone.localdate(at or timezone.now())
+            self._bump(DailyStatusCount, {'date': day, 'status': status}, entered)
+
+    def record_created(self, status):
+        self.record_transitions({None: 1}, status)
+
+    def record_deleted(self, status):
+        self._bump(DeliveryStatusCounter, {'status': status}, -1)
+
+    def record_transition(self, previous_status, status):
+        self.record_transitions({previous_status: 1}, status)
+
+    def record_bulk(self, deliveries, status):
+        """Record a bulk transition from the deliveries' statuses before the update"""
+        self.record_transitions(Counter(delivery.current_status for delivery in deliveries), status)
+
+    def get_counts(self):
+        """{status: number of deliveries} from the counter table"""
+        counts = dict(DeliveryStatusCounter.objects.values_list('status', 'count'))
+        if not counts:
+            counts = self.reconcile()
+        return {status: max(counts.get(status, 0), 0) for status in STATUSES}
+
+    def get_summary(self):
+        """Numbers for the stats API and the dashboard"""
+        counts = self.get_counts()
+        return {
+            'total_deliveries': sum(counts.values()),
+            'pending_deliveries': counts['pending'],
+            'in_transit_deliveries': counts['in_transit'],
+            'delivered_deliveries': counts['delivered'],
+            'failed_deliveries': counts['failed'],
+            'status_counts': counts,
+        }
+
+    def aggregate(self):
+        """Live counts with a single conditional aggregate (no counters involved)"""
+        return Delivery.objects.aggregate(**{
+            status: Count('id', filter=Q(current_status=status)) for status in STATUSES
+        })
+
+    def reconcile(self):
+        """Overwrite the counters with live counts; returns them"""
+        with transaction.atomic():
+            # Lock the counters first so concurrent transitions wait instead of being lost
+            list(DeliveryStatusCounter.objects.select_for_update())
+            counts = self.aggregate()
+            drift = {}
+            for status in STATUSES:
+                counter, created = DeliveryStatusCounter.objects.get_or_create(
+                    status=status, defaults={'count': counts[status]}
+                )
+                if not created and counter.count != counts[status]:
+                    drift[status] = counts[status] - counter.count
+                    counter.count = counts[status]
+                    counter.save(update_fields=['count', 'updated_at'])
+        if drift:
+            logger.warning(f"Reconciled delivery status counters: {drift}")
+        return counts
+
+    def get_daily_counts(self, days=30):
+        """[{date, <status>: count, ...}] for the last days days, oldest first"""
+        start = timezone.localdate() - timedelta(days=days - 1)
+        rows = DailyStatusCount.objects.filter(date__gte=start).values_list('date', 'status', 'count')
+        by_date = {start + timedelta(days=offset): dict.fromkeys(STATUSES, 0) for offset in range(days)}
+        for date, status, count in rows:
+            if date in by_date and status in by_date[date]:
+                by_date[date][status] = count
+        return [{'date': date.isoformat(), **counts} for date, counts in sorted(by_date.items())]
+
+
+# Global instance
+delivery_stats = DeliveryStatsService()
@@ -0,0 +1,219 @@
+"""
+Delivery status transitions.
+
+A status change writes one DeliveryStatus row and updates the delivery with
+targeted update_fields (current_status, the timestamp that goes with the new
+status, updated_at) in a single transaction. Bulk transitions, such as a hub
+scan moving a truckload of parcels to in_transit, do the same for many
+deliveries with one bulk insert and one UPDATE, validating against rows locked
+with SELECT ... FOR UPDATE so concurrent scans can't act on stale statuses.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Delivery, DeliveryStatus
+
+logger = logging.getLogger(__name__)
+
+# Statuses each status may move to; repeating a non-final status records another scan
+ALLOWED_TRANSITIONS = {
+    'pending': {'pending', 'confirmed', 'in_transit', 'failed'},
+    'confirmed': {'confirmed', 'in_transit', 'out_for_delivery', 'failed'},
+    'in_transit': {'in_transit', 'out_for_delivery', 'delivered', 'failed', 'returned'},
+    'out_for_delivery': {'out_for_delivery', 'in_transit', 'delivered', 'failed', 'returned'},
+    'failed': {'failed', 'in_transit', 'out_for_delivery', 'returned'},
+    'delivered': set(),
+    'returned': set(),
+}
+
+
+class StatusTransitionError(ValueError):
+    """Raised when a delivery can't move to the requested status"""
+
+
+class StatusTransitionService:
+    """Validates and applies delivery status changes, one at a time or in bulk"""
+
+    def can_transition(self, from_status, to_status):
+        return to_status in ALLOWED_TRANSITIONS.get(from_status, set())
+
+    def validate(self, delivery, status):
+        if status not in ALLOWED_TRANSITIONS:
+            raise StatusTransitionError(f"Unknown status '{status}'")
+        if not self.can_transition(delivery.current_status, status):
+            raise StatusTransitionError(
+                f"Cannot change {delivery.tracking_number} from {delivery.current_status} to {status}"
+            )
+
+    def apply(self, delivery, status, at=None):
+        """Set the status and its timestamps on the delivery; returns the fields to save"""
+        delivery.current_status = status
+        fields = ['current_status', 'updated_at']
+        if status == 'delivered' and not delivery.actual_delivery:
+            delivery.actual_delivery = at or timezone.now()
+            fields.append('actual_delivery')
+        return fields
+
+    def transition(self, delivery, status, description, location=None, validate=True, **geolocation):
+        """
+        Move a delivery to a new status and record it; geolocation takes latitude,
+        longitude, location_name and accuracy. Returns the DeliveryStatus.
+        """
+        if validate:
+            self.validate(delivery, status)
+
+        with transaction.atomic():
+            status_update = DeliveryStatus(
+                delivery=delivery,
+                status=status,
+                description=description,
+                location=location,
+                **geolocation
+            )
+            status_update.save(sync_delivery=False)
+            delivery.save(update_fields=self.apply(delivery, status, status_update.timestamp))
+        return status_update
+
+    def bulk_transition(self, deliveries, status, description, location=None, validate=True, **geolocation):
+        """
+        Move many deliveries to the same status with one bulk insert and one UPDATE.
+        Returns (status updates created, {tracking_number: reason} for rejected deliveries).
+        """
+        deliveries = list(deliveries)
+        with transaction.atomic():
+            # Decide from the locked rows, not from statuses the caller read earlier
+            locked = {delivery.pk: delivery for delivery in self._lock(pk__in=[delivery.pk for delivery in deliveries])}
+            rejected = {}
+            current = []
+            for delivery in deliveries:
+                row = locked.get(delivery.pk)
+                if row is None:
+                    rejected[delivery.tracking_number] = f"{delivery.tracking_number} no longer exists"
+                    continue
+                delivery.current_status = delivery._loaded_status = row.current_status
+                delivery.actual_delivery = row.actual_delivery
+                current.append(delivery)
+
+            status_updates, locked_rejected = self._bulk_transition_locked(
+                current, status, description, location, validate, **geolocation
+            )
+        rejected.update(locked_rejected)
+        return status_updates, rejected
+
+    def _lock(self, **lookup):
+        """Deliveries matching lookup, locked in pk order until the transaction ends"""
+        return list(Delivery.objects.select_for_update().filter(**lookup).order_by('pk').only(
+            'id', 'tracking_number', 'current_status', 'actual_delivery'
+        ))
+
+    def _bulk_transition_locked(self, deliveries, status, description, location=None, validate=True, **geolocation):
+        """bulk_transition for deliveries already locked and read inside the current transaction"""
+        accepted = []
+        rejected = {}
+        for delivery in deliveries:
+            if validate:
+                try:
+                    self.validate(delivery, status)
+                except StatusTransitionError as e:
+                    rejected[delivery.tracking_number] = str(e)
+                    continue
+            accepted.append(delivery)
+
+        if not accepted:
+            return [], rejected
+
+        now = timezone.now()
+        updates = {'current_status': status, 'updated_at': now}
+        status_updates = DeliveryStatus.objects.bulk_create([
+            DeliveryStatus(
+                delivery=delivery,
+                status=status,
+                description=description,
+                location=location,
+                **geolocation
+            )
+            for delivery in accepted
+        ], batch_size=1000)
+
+        if status == 'delivered':
+            updates['actual_delivery'] = Coalesce('actual_delivery', Value(now))
+        Delivery.objects.filter(pk__in=[delivery.pk for delivery in accepted]).update(**updates)
+
+        from .stats import delivery_stats
+        delivery_stats.record_bulk(accepted, status)
+
+        for delivery in accepted:
+            delivery.current_status = status
+            delivery._loaded_status = status
+            delivery.updated_at = now
+            if status == 'delivered' and not delivery.actual_delivery:
+                delivery.actual_delivery = now
+
+        from .tracking_document import tracking_documents
+        tracking_documents.invalidate_many(delivery.tracking_number for delivery in accepted)
+
+        logger.info(f"Moved {len(accepted)} deliveries to {status} ({len(rejected)} rejected)")
+        return status_updates, rejected
+
+    def hub_scan(self, tracking_numbers, status, description, location=None, checkpoint_type=None,
+                 notify=True, **geolocation):
+        """
+        Apply one scan to many parcels: resolve and lock the tracking numbers with one query,
+        record the status (and a checkpoint when checkpoint_type is given) in bulk, and queue
+        the customer notifications once the transaction has committed.
+        """
+        from .models import DeliveryCheckpoint
+
+        tracking_numbers = list(dict.fromkeys(tracking_numbers))
+
+        with transaction.atomic():
+            deliveries = self._lock(tracking_number__in=tracking_numbers)
+            found = {delivery.tracking_number for delivery in deliveries}
+
+            status_updates, rejected = self._bulk_transition_locked(
+                deliveries, status, description, location, **geolocation
+            )
+            rejected_numbers = set(rejected)
+            accepted = [delivery for delivery in deliveries if delivery.tracking_number not in rejected_numbers]
+
+            checkpoints = []
+            if checkpoint_type and accepted:
+                checkpoints = DeliveryCheckpoint.objects.bulk_create([
+                    DeliveryCheckpoint(
+                        delivery=delivery,
+                        checkpoint_type=checkpoint_type,
+                        location_name=geolocation.get('location_name') or location,
+                        description=description,
+                        latitude=geolocation['latitude'],
+                        longitude=geolocation['longitude'],
+                        accuracy=geolocation.get('accuracy')
+                    )
+                    for delivery in accepted
+                ], batch_size=1000)
+
+            if notify and status_updates:
+                status_update_ids = [status_update.id for status_update in status_updates]
+                transaction.on_commit(lambda: self._queue_notifications(status_update_ids))
+
+        return {
+            'status': status,
+            'updated': len(status_updates),
+            'checkpoints_created': len(checkpoints),
+            'not_found': [number for number in tracking_numbers if number not in found],
+            'rejected': rejected
+        }
+
+    def _queue_notifications(self, status_update_ids):
+        from .tasks import send_status_notifications
+        try:
+            send_status_notifications.delay(status_update_ids)
+        except Exception as e:
+            logger.warning(f"Could not queue status notifications for {len(status_update_ids)} updates: {e}")
+
+
+# Global instance
+status_transitions = StatusTransitionService()
@@ -0,0 +1,71 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def process_gps_fixes():
+    """Persist queued GPS fixes in per-delivery batches"""
+    try:
+        from .gps_ingest import gps_ingestion
+        
+        return gps_ingestion.process_pending()
+        
+    except Exception as e:
+        logger.error(f"Error processing GPS fixes: {e}")
+        return 0
+
+
+@shared_task
+def send_status_notifications(status_update_ids):
+    """Push status updates to tracking pages and email the customers"""
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        from .email_utils import send_tracking_notification
+        from .models import DeliveryStatus
+        
+        channel_layer = get_channel_layer()
+        sent = 0
+        for status_update in DeliveryStatus.objects.filter(id__in=status_update_ids).select_related('delivery'):
+            delivery = status_update.delivery
+            try:
+                async_to_sync(channel_layer.group_send)(
+                    f'delivery_tracking_{delivery.tracking_number}',
+                    {
+                        'type': 'status_update',
+                        'status': status_update.status,
+                        'description': status_update.description,
+                        'location': status_update.location,
+                        'timestamp': status_update.timestamp.isoformat()
+                    }
+                )
+            except Exception as e:
+                logger.warning(f"Could not broadcast status update for {delivery.tracking_number}: {e}")
+            
+            if delivery.customer_email and send_tracking_notification(
+                delivery.customer_email,
+                delivery.tracking_number,
+                status_update.get_status_display(),
+                {'location': status_update.location, 'estimated_delivery': delivery.estimated_delivery}
+            ):
+                sent += 1
+        
+        return sent
+        
+    except Exception as e:
+        logger.error(f"Error sending status notifications: {e}")
+        return 0
+
+
+@shared_task
+def reconcile_status_counters():
+    """Correct drift in the per-status delivery counters"""
+    try:
+        from .stats import delivery_stats
+        
+        return delivery_stats.reconcile()
+        
+    except Exception as e:
+        logger.error(f"Error reconciling status counters: {e}")
+        return {}
@@ -0,0 +1,261 @@
+"""
+Tracking documents for public tracking links.
+
+The REST tracking API, the tracking page and the tracking websocket all show
+the same delivery, its status history and its latest checkpoints. The
+document is built once from a single delivery query (status updates and
+checkpoints come in through prefetch_related) and cached per tracking number,
+under a key that includes the delivery's updated_at. A small pointer key maps
+the tracking number to the cached version; status and location writes delete
+the pointer, so the next request rebuilds the document while customers who
+keep refreshing an unchanged link are served straight from the cache.
+Unknown tracking numbers and wrong secrets are turned away by
+tracking.tracking_lookup before either cache or database is consulted.
+
+Fields that depend on the current time (link expiry, GPS activity, minutes to
+arrival) are kept as raw values and evaluated when the document is served.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from .eta import eta_engine
+from .models import Delivery, DeliveryCheckpoint, DeliveryStatus
+from .route_geometry import route_geometry
+from .serializers import TrackingResponseSerializer
+from .tracking_lookup import tracking_lookup
+
+logger = logging.getLogger(__name__)
+
+# Checkpoints included in the websocket payload
+RECENT_CHECKPOINTS = 10
+
+# Progress bar position of each status
+STATUS_ORDER = {
+    'pending': 0,
+    'confirmed': 1,
+    'in_transit': 2,
+    'out_for_delivery': 3,
+    'delivered': 4,
+    'failed': 5,
+    'returned': 6
+}
+
+# Delivery attributes the tracking and expired page templates read
+PAGE_FIELDS = [
+    'tracking_number', 'order_number', 'customer_name', 'customer_email', 'customer_phone',
+    'package_description', 'package_weight', 'package_dimensions', 'pickup_address',
+    'delivery_address', 'current_status', 'estimated_delivery', 'tracking_link_expires'
+]
+
+
+def _float(value):
+    return float(value) if value else None
+
+
+class TrackingDocumentBuilder:
+    """Builds, caches and invalidates the public tracking document of a delivery"""
+
+    POINTER_KEY = 'tracking:document:{tracking_number}'
+    DOCUMENT_KEY = 'tracking:document:{tracking_number}:{version}'
+
+    def __init__(self, cache_timeout=None):
+        self.cache_timeout = cache_timeout or getattr(settings, 'TRACKING_DOCUMENT_CACHE_TIMEOUT', 300)
+
+    def _version(self, delivery):
+        return int(delivery.updated_at.timestamp() * 1000) if delivery.updated_at else 0
+
+    def _pointer_key(self, tracking_number):
+        return self.POINTER_KEY.format(tracking_number=tracking_number)
+
+    def _document_key(self, tracking_number, version):
+        return self.DOCUMENT_KEY.format(tracking_number=tracking_number, version=version)
+
+    def get_queryset(self):
+        return Delivery.objects.prefetch_related(
+            Prefetch('status_updates', queryset=DeliveryStatus.objects.order_by('-timestamp')),
+            Prefetch(
+                'checkpoints',
+                queryset=DeliveryCheckpoint.objects.order_by('-timestamp')[:RECENT_CHECKPOINTS],
+                to_attr='recent_checkpoints'
+            )
+        )
+
+    def _get_cached(self, tracking_number):
+        try:
+            version = cache.get(self._pointer_key(tracking_number))
+            if version is None:
+                return None
+            return cache.get(self._document_key(tracking_number, version))
+        except Exception as e:
+            logger.warning(f"Could not read cached tracking document for {tracking_number}: {e}")
+            return None
+
+    def _set_cached(self, document):
+        tracking_number = document['tracking_number']
+        try:
+            cache.set(self._document_key(tracking_number, document['version']), document, self.cache_timeout)
+            cache.set(self._pointer_key(tracking_number), document['version'], self.cache_timeout)
+        except Exception as e:
+            logger.warning(f"Could not cache tracking document for {tracking_number}: {e}")
+
+    def get(self, tracking_number, tracking_secret):
+        """Tracking document for a tracking link, None when the link doesn't match a delivery"""
+        entry = tracking_lookup.lookup(tracking_number)
+        if entry is None or not constant_time_compare(entry['tracking_secret'], tracking_secret):
+            return None
+
+        document = self._get_cached(tracking_number)
+        if document is None:
+            try:
+                delivery = self.get_queryset().get(tracking_number=tracking_number)
+            except Delivery.DoesNotExist:
+                return None
+            document = self.build(delivery)
+            self._set_cached(document)
+
+        if not constant_time_compare(document['tracking_secret'], tracking_secret):
+            return None
+        return document
+
+    def build(self, delivery):
+        """Build the document from a delivery fetched with get_queryset()"""
+        status_updates = list(delivery.status_updates.all())
+        checkpoints = getattr(delivery, 'recent_checkpoints', None)
+        if checkpoints is None:
+            checkpoints = list(delivery.checkpoints.order_by('-timestamp')[:RECENT_CHECKPOINTS])
+
+        page = {field: getattr(delivery, field) for field in PAGE_FIELDS}
+        page['get_current_status_display'] = delivery.get_current_status_display()
+
+        return {
+            'version': self._version(delivery),
+            'tracking_number': delivery.tracking_number,
+            'tracking_secret': delivery.tracking_secret,
+            'tracking_link_expires': delivery.tracking_link_expires,
+            'gps_tracking_enabled': delivery.gps_tracking_enabled,
+            'last_gps_update': delivery.last_gps_update,
+            'predicted_delivery': delivery.predicted_delivery,
+            'page': page,
+            'api': TrackingResponseSerializer(delivery).data,
+            'tracking_data': self._build_tracking_data(delivery, status_updates, checkpoints)
+        }
+
+    def _build_tracking_data(self, delivery, status_updates, checkpoints):
+        current_status_order = STATUS_ORDER.get(delivery.current_status, 0)
+        progress_percentage = (current_status_order / (len(STATUS_ORDER) - 1)) * 100
+
+        return {
+            'delivery': {
+                'id': delivery.id,
+                'tracking_number': delivery.tracking_number,
+                'order_number': delivery.order_number,
+                'customer_name': delivery.customer_name,
+                'customer_email': delivery.customer_email,
+                'customer_phone': delivery.customer_phone,
+                'package_description': delivery.package_description,
+                'package_weight': _float(delivery.package_weight),
+                'package_dimensions': delivery.package_dimensions,
+                'pickup_address': delivery.pickup_address,
+                'delivery_address': delivery.delivery_address,
+                'current_status': delivery.current_status,
+                'current_status_display': delivery.get_current_status_display(),
+                'estimated_delivery': delivery.estimated_delivery.isoformat() if delivery.estimated_delivery else None,
+                'actual_delivery': delivery.actual_delivery.isoformat() if delivery.actual_delivery else None,
+                'created_at': delivery.created_at.isoformat(),
+                'updated_at': delivery.updated_at.isoformat(),
+                'progress_percentage': round(progress_percentage, 1),
+                'has_geolocation': delivery.has_geolocation(),
+                'is_gps_active': delivery.is_gps_active(),
+                'gps_tracking_enabled': delivery.gps_tracking_enabled,
+                'current_location': delivery.get_current_location_dict(),
+                'pickup_location': delivery.get_pickup_location_dict(),
+                'delivery_location': delivery.get_delivery_location_dict(),
+                'courier_info': delivery.get_courier_info(),
+                'eta': eta_engine.get_eta_dict(delivery)
+            },
+            'status_updates': [
+                {
+                    'id': status.id,
+                    'status': status.status,
+                    'status_display': status.get_status_display(),
+                    'location': status.location,
+                    'description': status.description,
+                    'timestamp': status.timestamp.isoformat(),
+                    'formatted_timestamp': status.timestamp.strftime('%B %d, %Y at %I:%M %p'),
+                    'latitude': _float(status.latitude),
+                    'longitude': _float(status.longitude),
+                    'location_name': status.location_name,
+                    'accuracy': _float(status.accuracy)
+                }
+                for status in status_updates
+            ],
+            'checkpoints': [
+                {
+                    'id': checkpoint.id,
+                    'checkpoint_type': checkpoint.checkpoint_type,
+                    'checkpoint_type_display': checkpoint.get_checkpoint_type_display(),
+                    'location_name': checkpoint.location_name,
+                    'description': checkpoint.description,
+                    'latitude': _float(checkpoint.latitude),
+                    'longitude': _float(checkpoint.longitude),
+                    'accuracy': _float(checkpoint.accuracy),
+                    'timestamp': checkpoint.timestamp.isoformat(),
+                    'formatted_timestamp': checkpoint.timestamp.strftime('%B %d, %Y at %I:%M %p'),
+                    'courier_notes': checkpoint.courier_notes,
+                    'customer_notified': checkpoint.customer_notified
+                }
+                for checkpoint in checkpoints
+            ],
+            'route': route_geometry.get_route(delivery)
+        }
+
+    def is_expired(self, document):
+        expires = document['tracking_link_expires']
+        return bool(expires) and timezone.now() > expires
+
+    def get_api_payload(self, document):
+        """Public REST API response (same shape as TrackingResponseSerializer)"""
+        return document['api']
+
+    def get_tracking_data(self, document):
+        """Websocket tracking_data payload with its time-dependent fields refreshed"""
+        tracking_data = document['tracking_data']
+        delivery = tracking_data['delivery']
+
+        last_gps_update = document['last_gps_update']
+        delivery['is_gps_active'] = bool(
+            document['gps_tracking_enabled'] and last_gps_update
+            and timezone.now() - last_gps_update < timedelta(minutes=5)
+        )
+        if delivery['eta'] and document['predicted_delivery']:
+            minutes_remaining = (document['predicted_delivery'] - timezone.now()).total_seconds() / 60
+            delivery['eta']['minutes_remaining'] = round(max(minutes_remaining, 0))
+        return tracking_data
+
+    def invalidate(self, tracking_number):
+        """Drop the cached document of a delivery after a status or location write"""
+        self.invalidate_many([tracking_number])
+
+    def invalidate_many(self, tracking_numbers):
+        keys = [self._pointer_key(tracking_number) for tracking_number in tracking_numbers if tracking_number]
+        if not keys:
+            return
+        # After commit, so a concurrent request can't cache the pre-write state again
+        transaction.on_commit(lambda: self._delete_keys(keys))
+
+    def _delete_keys(self, keys):
+        try:
+            cache.delete_many(keys)
+        except Exception as e:
+            logger.warning(f"Could not invalidate tracking documents: {e}")
+
+
+# Global instance
+tracking_documents = TrackingDocumentBuilder()
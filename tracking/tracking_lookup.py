@@ -0,0 +1,209 @@
+"""
+Tracking number lookups that keep unknown numbers away from the database.
+
+Every lookup from the landing page search, the public tracking API, the
+tracking page and the tracking websocket goes through TrackingLookup:
+
+1. A cached mapping tracking_number -> (secret, link expiry) answers known
+   numbers. Delivery.save() writes it, so it also covers numbers created after
+   the Bloom filter was built.
+2. A short-lived negative entry answers numbers that were just looked up and
+   not found.
+3. A per-process Bloom filter of every tracking number, rebuilt from a single
+   values_list scan every TRACKING_LOOKUP_FILTER_REFRESH seconds, rejects
+   mistyped and made-up numbers outright.
+
+Only numbers the filter can't rule out (real ones whose mapping isn't cached
+yet, plus ~1% false positives) reach the database.
+
+Steps 2 and 3 are only safe when every process sees the same cache: a number
+created in another process reaches this process's filter only at its next
+rebuild, and until then only the shared mapping from step 1 vouches for it.
+With a per-process cache (LocMem) lookups skip the negative entries and the
+filter and fall through to the database. Deleting a delivery drops its
+mapping (see tracking.signals).
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Delivery
+
+logger = logging.getLogger(__name__)
+
+# Tracking numbers are stored in a CharField(max_length=100)
+MAX_TRACKING_NUMBER_LENGTH = 100
+
+# Marker stored for numbers known not to exist
+MISSING = '__missing__'
+
+# Cache backends private to each process
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared():
+    """Whether the default cache is visible to every process"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    return backend not in LOCAL_CACHE_BACKENDS
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, using double hashing of one blake2b digest"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(int(capacity), 1)
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class TrackingLookup:
+    """Resolves tracking numbers to their secret and link expiry, rejecting unknown numbers cheaply"""
+
+    CACHE_KEY = 'tracking:lookup:{tracking_number}'
+
+    def __init__(self, cache_timeout=None, negative_timeout=None, filter_refresh=None, error_rate=0.01,
+                 shared_cache=None):
+        self.filter_refresh = filter_refresh or getattr(settings, 'TRACKING_LOOKUP_FILTER_REFRESH', 900)
+        self.negative_timeout = negative_timeout or getattr(settings, 'TRACKING_LOOKUP_NEGATIVE_TIMEOUT', 60)
+        # Mappings written on save must outlive the filter other processes built before that save
+        self.cache_timeout = max(
+            cache_timeout or getattr(settings, 'TRACKING_LOOKUP_CACHE_TIMEOUT', 3600),
+            2 * self.filter_refresh
+        )
+        self.error_rate = error_rate
+        # Negative answers (cached misses, the Bloom filter) need a cache shared by all processes
+        self.shared_cache = shared_cache if shared_cache is not None else cache_is_shared()
+        self._filter = None
+        self._filter_built_at = 0.0
+        self._lock = threading.Lock()
+
+    def _cache_key(self, tracking_number):
+        return self.CACHE_KEY.format(tracking_number=tracking_number)
+
+    def _get_filter(self):
+        if self._filter is not None and time.monotonic() - self._filter_built_at < self.filter_refresh:
+            return self._filter
+        with self._lock:
+            if self._filter is None or time.monotonic() - self._filter_built_at >= self.filter_refresh:
+                try:
+                    self._filter = self.build_filter()
+                    self._filter_built_at = time.monotonic()
+                except Exception as e:
+                    logger.error(f"Could not build tracking number filter: {e}")
+                    return None
+        return self._filter
+
+    def build_filter(self):
+        """Bloom filter of every existing tracking number"""
+        tracking_numbers = list(Delivery.objects.values_list('tracking_number', flat=True))
+        bloom = BloomFilter(max(len(tracking_numbers) * 2, 10000), self.error_rate)
+        for tracking_number in tracking_numbers:
+            bloom.add(tracking_number)
+        logger.info(f"Built tracking number filter with {len(tracking_numbers)} entries ({len(bloom.bits)} bytes)")
+        return bloom
+
+    def lookup(self, tracking_number):
+        """{tracking_number, tracking_secret, tracking_link_expires} for a tracking number, None if it doesn't exist"""
+        if not tracking_number or len(tracking_number) > MAX_TRACKING_NUMBER_LENGTH:
+            return None
+
+        cache_key = self._cache_key(tracking_number)
+        try:
+            cached = cache.get(cache_key)
+            if cached == MISSING:
+                return None
+            if cached is not None:
+                return cached
+        except Exception as e:
+            logger.warning(f"Could not read cached tracking lookup for {tracking_number}: {e}")
+
+        if self.shared_cache:
+            bloom = self._get_filter()
+            if bloom is not None and tracking_number not in bloom:
+                self._cache_missing(cache_key)
+                return None
+
+        row = Delivery.objects.filter(tracking_number=tracking_number).values_list(
+            'tracking_secret', 'tracking_link_expires'
+        ).first()
+        if row is None:
+            self._cache_missing(cache_key)
+            return None
+
+        entry = {
+            'tracking_number': tracking_number,
+            'tracking_secret': row[0],
+            'tracking_link_expires': row[1]
+        }
+        try:
+            cache.set(cache_key, entry, self.cache_timeout)
+        except Exception as e:
+            logger.warning(f"Could not cache tracking lookup for {tracking_number}: {e}")
+        return entry
+
+    def _cache_missing(self, cache_key):
+        if not self.shared_cache:
+            return
+        try:
+            cache.set(cache_key, MISSING, self.negative_timeout)
+        except Exception as e:
+            logger.warning(f"Could not cache missing tracking number: {e}")
+
+    def remember(self, delivery):
+        """Record a saved delivery's tracking number, replacing any negative entry"""
+        if self._filter is not None:
+            self._filter.add(delivery.tracking_number)
+        try:
+            cache.set(self._cache_key(delivery.tracking_number), {
+                'tracking_number': delivery.tracking_number,
+                'tracking_secret': delivery.tracking_secret,
+                'tracking_link_expires': delivery.tracking_link_expires
+            }, self.cache_timeout)
+        except Exception as e:
+            logger.warning(f"Could not cache tracking lookup for {delivery.tracking_number}: {e}")
+
+    def forget(self, tracking_number):
+        """Drop the cached mapping of a deleted delivery"""
+        try:
+            cache.delete(self._cache_key(tracking_number))
+        except Exception as e:
+            logger.warning(f"Could not drop tracking lookup for {tracking_number}: {e}")
+
+    def is_expired(self, entry):
+        expires = entry['tracking_link_expires']
+        return bool(expires) and timezone.now() > expires
+
+    def get_tracking_path(self, entry):
+        """Tracking page path, same as Delivery.get_tracking_url()"""
+        return reverse('frontend:track_delivery', kwargs={
+            'tracking_number': entry['tracking_number'],
+            'tracking_secret': entry['tracking_secret']
+        })
+
+
+# Global instance
+tracking_lookup = TrackingLookup()
@@ -12,10 +12,15 @@ import os
 from .models import Delivery, DeliveryStatus
 from .serializers import (
     DeliverySerializer, DeliveryCreateSerializer, DeliveryStatusSerializer,
-    DeliveryStatusCreateSerializer, TrackingResponseSerializer
+    DeliveryStatusCreateSerializer, TrackingResponseSerializer, BulkScanSerializer,
+    DeliveryListSerializer
 )
+from .pagination import DeliveryCursorPagination
+from .search import delivery_search
+from .stats import delivery_stats
+from .status_transitions import StatusTransitionError, status_transitions
+from .tracking_document import tracking_documents
 from .email_utils import test_email_configuration
-from django.db import models
 
 
 class IsStaffUser(permissions.BasePermission):
@@ -32,16 +37,24 @@ class DeliveryViewSet(viewsets.ModelViewSet):
     queryset = Delivery.objects.all()
     serializer_class = DeliverySerializer
     permission_classes = [IsStaffUser]  # Require staff authentication
+    pagination_class = DeliveryCursorPagination
+    
+    # Actions serialized without the nested status history
+    list_actions = ['list', 'within_bbox', 'nearest']
     
     def get_serializer_class(self):
         """Return appropriate serializer based on action"""
         if self.action == 'create':
             return DeliveryCreateSerializer
+        if self.action in self.list_actions:
+            return DeliveryListSerializer
         return DeliverySerializer
     
     def get_queryset(self):
         """Filter queryset based on user permissions"""
         queryset = Delivery.objects.all()
+        if self.action not in self.list_actions:
+            queryset = queryset.prefetch_related('status_updates')
         
         # Filter by status if provided
         status_filter = self.request.query_params.get('status', None)
@@ -51,12 +64,12 @@ class DeliveryViewSet(viewsets.ModelViewSet):
         # Filter by customer name if provided
         customer_name = self.request.query_params.get('customer_name', None)
         if customer_name:
-            queryset = queryset.filter(customer_name__icontains=customer_name)
+            queryset = queryset.filter(delivery_search.name_filter(customer_name))
         
-        # Filter by tracking number if provided
+        # Filter by tracking number prefix if provided
         tracking_number = self.request.query_params.get('tracking_number', None)
         if tracking_number:
-            queryset = queryset.filter(tracking_number__icontains=tracking_number)
+            queryset = queryset.filter(tracking_number__istartswith=tracking_number)
         
         return queryset
     
@@ -67,13 +80,11 @@ class DeliveryViewSet(viewsets.ModelViewSet):
         serializer = DeliveryStatusCreateSerializer(data=request.data)
         
         if serializer.is_valid():
-            # Set the delivery for the status update
-            status_update = serializer.save(delivery=delivery)
-            
-            # Update delivery timestamps based on status
-            if status_update.status == 'delivered':
-                delivery.actual_delivery = timezone.now()
-                delivery.save()
+            # Record the status and update the delivery in one transaction
+            try:
+                status_update = status_transitions.transition(delivery, **serializer.validated_data)
+            except StatusTransitionError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             
             return Response({
                 'message': 'Status updated successfully',
@@ -82,6 +93,19 @@ class DeliveryViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'])
+    def bulk_scan(self, request):
+        """Apply one hub scan (status, location, optional checkpoint) to a list of tracking numbers"""
+        serializer = BulkScanSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = dict(serializer.validated_data)
+        new_status = data.pop('status')
+        description = data.pop('description', None) or f"Scanned as {dict(Delivery.STATUS_CHOICES)[new_status]}"
+        result = status_transitions.hub_scan(data.pop('tracking_numbers'), new_status, description, **data)
+        return Response(result, status=status.HTTP_200_OK)
+    
     @action(detail=True, methods=['get'])
     def tracking_info(self, request, pk=None):
         """Get tracking information for a delivery"""
@@ -89,6 +113,70 @@ class DeliveryViewSet(viewsets.ModelViewSet):
         serializer = TrackingResponseSerializer(delivery, context={'request': request})
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def trace(self, request, pk=None):
+        """Raw GPS trace for replay, optionally limited with ?start= and ?end= (ISO 8601)"""
+        from django.utils.dateparse import parse_datetime
+        
+        delivery = self.get_object()
+        bounds = {}
+        for name in ('start', 'end'):
+            value = request.query_params.get(name)
+            if value:
+                parsed = parse_datetime(value)
+                if parsed is None:
+                    return Response({'error': f'Invalid {name} datetime'}, status=status.HTTP_400_BAD_REQUEST)
+                bounds[name] = parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+        
+        points = delivery.get_location_trace(bounds.get('start'), bounds.get('end'))
+        return Response({
+            'tracking_number': delivery.tracking_number,
+            'point_count': len(points),
+            'points': points
+        })
+    
+    @action(detail=True, methods=['get'])
+    def route(self, request, pk=None):
+        """Simplified route as an encoded polyline for a map at ?zoom="""
+        from .route_geometry import route_geometry
+        
+        delivery = self.get_object()
+        return Response(route_geometry.get_route(delivery, request.query_params.get('zoom')))
+    
+    @action(detail=False, methods=['get'])
+    def within_bbox(self, request):
+        """Active deliveries inside ?north=&south=&east=&west= (map viewport)"""
+        from .spatial import delivery_spatial
+        
+        try:
+            bounds = [float(request.query_params[key]) for key in ('south', 'west', 'north', 'east')]
+        except (KeyError, ValueError):
+            return Response({'error': 'north, south, east and west are required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        deliveries = delivery_spatial.within_bbox(*bounds, queryset=self.get_queryset())
+        serializer = self.get_serializer(deliveries[:2000], many=True)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def nearest(self, request):
+        """The ?n= active deliveries closest to ?lat=&lng="""
+        from .spatial import delivery_spatial
+        
+        try:
+            latitude = float(request.query_params['lat'])
+            longitude = float(request.query_params['lng'])
+            count = min(int(request.query_params.get('n', 10)), 100)
+        except (KeyError, ValueError):
+            return Response({'error': 'lat and lng are required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        nearest = delivery_spatial.nearest_n(latitude, longitude, count, queryset=self.get_queryset())
+        data = []
+        for delivery, distance in nearest:
+            delivery_data = self.get_serializer(delivery).data
+            delivery_data['distance_km'] = round(distance, 3)
+            data.append(delivery_data)
+        return Response(data)
+    
     @action(detail=True, methods=['post'])
     def extend_tracking_link(self, request, pk=None):
         """Extend the tracking link expiry"""
@@ -130,26 +218,20 @@ class TrackingAPIView(APIView):
     
     def get(self, request, tracking_number, tracking_secret):
         """Get tracking information for a delivery"""
-        try:
-            delivery = Delivery.objects.get(
-                tracking_number=tracking_number,
-                tracking_secret=tracking_secret
-            )
-            
-            # Check if tracking link has expired
-            if delivery.is_tracking_link_expired():
-                return Response({
-                    'error': 'This tracking link has expired',
-                    'expired_at': delivery.tracking_link_expires
-                }, status=status.HTTP_410_GONE)
-            
-            serializer = TrackingResponseSerializer(delivery, context={'request': request})
-            return Response(serializer.data)
-            
-        except Delivery.DoesNotExist:
+        document = tracking_documents.get(tracking_number, tracking_secret)
+        if document is None:
             return Response({
                 'error': 'Delivery not found or invalid tracking information'
             }, status=status.HTTP_404_NOT_FOUND)
+        
+        # Check if tracking link has expired
+        if tracking_documents.is_expired(document):
+            return Response({
+                'error': 'This tracking link has expired',
+                'expired_at': document['tracking_link_expires']
+            }, status=status.HTTP_410_GONE)
+        
+        return Response(tracking_documents.get_api_payload(document))
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -163,20 +245,12 @@ class DeliverySearchAPIView(APIView):
         query = request.query_params.get('q', '')
         status_filter = request.query_params.get('status', '')
         
-        queryset = Delivery.objects.all()
-        
-        if query:
-            queryset = queryset.filter(
-                models.Q(tracking_number__icontains=query) |
-                models.Q(order_number__icontains=query) |
-                models.Q(customer_name__icontains=query)
-            )
-        
-        if status_filter:
-            queryset = queryset.filter(current_status=status_filter)
+        queryset = delivery_search.search(query, status_filter)
         
-        serializer = DeliverySerializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        paginator = DeliveryCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = DeliveryListSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -187,28 +261,46 @@ class DeliveryStatsAPIView(APIView):
     
     def get(self, request):
         """Get delivery statistics"""
-        total_deliveries = Delivery.objects.count()
-        pending_deliveries = Delivery.objects.filter(current_status='pending').count()
-        in_transit_deliveries = Delivery.objects.filter(current_status='in_transit').count()
-        delivered_deliveries = Delivery.objects.filter(current_status='delivered').count()
-        failed_deliveries = Delivery.objects.filter(current_status='failed').count()
+        # Status numbers come from the materialized counters (one query)
+        stats = delivery_stats.get_summary()
         
-        # Recent deliveries (last 7 days)
+        # Recent deliveries (last 7 days), a range count on the created_at index
         from datetime import timedelta
         recent_deliveries = Delivery.objects.filter(
             created_at__gte=timezone.now() - timedelta(days=7)
         ).count()
         
         return Response({
-            'total_deliveries': total_deliveries,
-            'pending_deliveries': pending_deliveries,
-            'in_transit_deliveries': in_transit_deliveries,
-            'delivered_deliveries': delivered_deliveries,
-            'failed_deliveries': failed_deliveries,
+            'total_deliveries': stats['total_deliveries'],
+            'pending_deliveries': stats['pending_deliveries'],
+            'in_transit_deliveries': stats['in_transit_deliveries'],
+            'delivered_deliveries': stats['delivered_deliveries'],
+            'failed_deliveries': stats['failed_deliveries'],
+            'status_counts': stats['status_counts'],
             'recent_deliveries': recent_deliveries,
         })
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class DailyStatusCountsAPIView(APIView):
+    """Daily counts of deliveries entering each status, for charts"""
+    
+    permission_classes = [IsStaffUser]
+    max_days = 365
+    
+    def get(self, request):
+        try:
+            days = int(request.query_params.get('days', 30))
+        except (TypeError, ValueError):
+            return Response({'error': 'days must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        days = max(1, min(days, self.max_days))
+        
+        return Response({
+            'days': days,
+            'results': delivery_stats.get_daily_counts(days)
+        })
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class EmailTestView(APIView):
     """Test email configuration endpoint for production"""